@@ -0,0 +1,151 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from chat.choices import MemberShipStatusChoices
+
+from shared.cache_key import (
+    get_chat_room_access_cache_key,
+    get_chat_room_member_cache_key,
+)
+
+# Fields of the cached chat rooms and memberships, the others are loaded on
+# first access
+CHAT_ROOM_FIELDS = ["id", "uid", "name", "group_name", "is_group_chat", "status"]
+MEMBERSHIP_FIELDS = [
+    "id",
+    "uid",
+    "user_id",
+    "chat_room_id",
+    "role",
+    "member_status",
+    "has_write_access",
+]
+
+
+def get_chat_room_access(user_id, chat_room_name):
+    """
+    Return the access of a user to the chat room with the given name, as a
+    dict with the room id and whether the user is an active member with
+    write access, or None when the room does not exist.
+
+    The access is cached until the membership is saved or deleted or the
+    room is renamed or deleted, non members included so repeated connection
+    attempts stay cheap.
+    """
+    from chat.models import ChatRoom, ChatRoomMembership
+
+    cache_key = get_chat_room_access_cache_key(chat_room_name, user_id)
+    access = cache.get(cache_key)
+    if access is not None:
+        return access
+
+    # Unknown rooms are not cached as the name could be taken at any time
+    chat_room = ChatRoom.objects.filter(name=chat_room_name).values("id", "uid").first()
+    if chat_room is None:
+        return None
+
+    membership = (
+        ChatRoomMembership.objects.filter(
+            user_id=user_id,
+            chat_room_id=chat_room["id"],
+            member_status=MemberShipStatusChoices.ACTIVE,
+        )
+        .values("has_write_access")
+        .first()
+    )
+    access = {
+        "chat_room_id": chat_room["id"],
+        "chat_room_uid": str(chat_room["uid"]),
+        "is_member": membership is not None,
+        "has_write_access": bool(membership and membership["has_write_access"]),
+    }
+
+    cache.set(cache_key, access, getattr(settings, "CACHE_TTL", 60 * 15))
+    return access
+
+
+def clear_chat_room_access(chat_room_name, user_ids):
+    """Drop the cached access of the given users to a chat room."""
+    cache.delete_many(
+        [
+            get_chat_room_access_cache_key(chat_room_name, user_id)
+            for user_id in user_ids
+        ]
+    )
+
+
+def to_instance(model, values):
+    """Build a saved instance of a model from some of its field values."""
+    field_names = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(
+        "default", field_names, [values[field_name] for field_name in field_names]
+    )
+
+
+def get_chat_room_member(user_id, chat_room_uid):
+    """
+    Return the chat room with the given uid and the membership of the user
+    in it, None if the user is not a member, or (None, None) when the room
+    does not exist.
+
+    Both are cached until the membership or the room is saved or deleted,
+    non members included.
+    """
+    from chat.models import ChatRoom, ChatRoomMembership
+
+    cache_key = get_chat_room_member_cache_key(chat_room_uid, user_id)
+    member = cache.get(cache_key)
+    if member is None:
+        # Unknown rooms are not cached as the uid could be created later
+        chat_room = ChatRoom.objects.filter(uid=chat_room_uid).values(
+            *CHAT_ROOM_FIELDS
+        )
+        chat_room = chat_room.first()
+        if chat_room is None:
+            return None, None
+
+        membership = (
+            ChatRoomMembership.objects.filter(
+                user_id=user_id, chat_room_id=chat_room["id"]
+            )
+            .values(*MEMBERSHIP_FIELDS)
+            .first()
+        )
+        member = {"chat_room": chat_room, "membership": membership}
+        cache.set(cache_key, member, getattr(settings, "CACHE_TTL", 60 * 15))
+
+    chat_room = to_instance(ChatRoom, member["chat_room"])
+    membership = None
+    if member["membership"] is not None:
+        membership = to_instance(ChatRoomMembership, member["membership"])
+        membership.chat_room = chat_room
+    return chat_room, membership
+
+
+def resolve_chat_room_member(request, chat_room_uid):
+    """
+    Return the chat room and the membership of the requesting user, loaded
+    once per request and shared by the permissions, views and serializers.
+    """
+    members = request.__dict__.setdefault("chat_room_members", {})
+    chat_room_uid = str(chat_room_uid)
+    if chat_room_uid not in members:
+        chat_room, membership = get_chat_room_member(request.user.id, chat_room_uid)
+        if membership is not None:
+            membership.user = request.user
+        members[chat_room_uid] = chat_room, membership
+    return members[chat_room_uid]
+
+
+def clear_chat_room_member(chat_room_uid, user_ids):
+    """Drop the cached membership of the given users in a chat room."""
+    cache.delete_many(
+        [
+            get_chat_room_member_cache_key(chat_room_uid, user_id)
+            for user_id in user_ids
+        ]
+    )
@@ -0,0 +1,70 @@
+import time
+import random
+
+from django.conf import settings
+
+
+class HandshakeAdmission:
+    """
+    Per worker admission control for websocket handshakes.
+
+    Handshakes take a token from a bucket refilled at `rate` per second up
+    to `burst`, and at most `max_concurrency` of them resolve their chat
+    room at once. A rejected handshake is told when to retry, spread with
+    some jitter so that clients of a mass reconnect do not come back
+    together.
+    """
+
+    def __init__(self, rate=None, burst=None, max_concurrency=None):
+        self.rate = rate or getattr(settings, "HANDSHAKE_RATE", 200)
+        self.burst = burst or getattr(settings, "HANDSHAKE_BURST", 400)
+        self.max_concurrency = max_concurrency or getattr(
+            settings, "HANDSHAKE_MAX_CONCURRENCY", 50
+        )
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def refill(self):
+        now = time.monotonic()
+        refilled = (now - self.refilled_at) * self.rate
+        self.tokens = min(self.burst, self.tokens + refilled)
+        self.refilled_at = now
+
+    def acquire(self):
+        """
+        Admit a handshake. Return None when it is admitted, in which case
+        `release` must be called once it is done, or the number of seconds
+        after which the client should retry.
+        """
+        self.refill()
+
+        if self.tokens >= 1 and self.in_flight < self.max_concurrency:
+            self.tokens -= 1
+            self.in_flight += 1
+            return None
+
+        self.rejected += 1
+        # Wait for the missing token, or for the running handshakes to drain
+        backlog = max(1 - self.tokens, self.in_flight - self.max_concurrency + 1)
+        retry_after = max(backlog / self.rate, 1)
+        return round(retry_after * random.uniform(1, 2), 1)
+
+    def release(self):
+        self.in_flight -= 1
+
+    def get_metrics(self):
+        """Counters of the worker since it started."""
+        return {"rejected": self.rejected, "in_flight": self.in_flight}
+
+
+_handshake_admission = None
+
+
+def get_handshake_admission():
+    """Return the handshake admission of the worker."""
+    global _handshake_admission
+    if _handshake_admission is None:
+        _handshake_admission = HandshakeAdmission()
+    return _handshake_admission
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.db.models import Q
+
+from shared.services import ExpiringLRUCache, get_redis_client
+from shared.cache_key import (
+    get_user_blocks_cache_key,
+    get_user_blocked_by_cache_key,
+    get_user_blocks_generation_cache_key,
+)
+
+# Every loaded set holds this member, so a user without blocks is still cached
+LOADED = 0
+
+# Blocked and blocked by sets of the users seen by this worker, kept shortly
+# as the changes made on other workers only reach redis
+LOCAL_BLOCKS = ExpiringLRUCache(
+    max_size=getattr(settings, "BLOCK_LOCAL_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "BLOCK_LOCAL_CACHE_TTL", 30),
+)
+
+# Store the loaded sets only if the generation read before loading them is
+# still current, i.e. the blocks were not cleared meanwhile
+STORE_BLOCKS_LUA = """
+    if (redis.call('GET', KEYS[3]) or '') ~= ARGV[1] then
+        return 0
+    end
+    local ttl = ARGV[2]
+    local blocked_count = tonumber(ARGV[3])
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('SADD', KEYS[1], unpack(ARGV, 4, 3 + blocked_count))
+    redis.call('SADD', KEYS[2], unpack(ARGV, 4 + blocked_count))
+    redis.call('EXPIRE', KEYS[1], ttl)
+    redis.call('EXPIRE', KEYS[2], ttl)
+    return 1
+"""
+
+
+def get_cached_blocks(user_id):
+    """Return the blocks of a user held by this worker, or None."""
+    return LOCAL_BLOCKS.get(user_id)
+
+
+def get_blocks(user_ids):
+    """
+    Map each of the given user ids to the (blocked, blocked by) sets of the
+    users it blocked and of the users who blocked it.
+
+    The sets are read from this worker first, then from redis with one
+    round trip and only the users missing in both are loaded with a query.
+    """
+    user_ids = set(user_ids)
+    blocks = {}
+    for user_id in user_ids:
+        cached = LOCAL_BLOCKS.get(user_id)
+        if cached is not None:
+            blocks[user_id] = cached
+
+    missing = list(user_ids - blocks.keys())
+    if not missing:
+        return blocks
+
+    client = get_redis_client()
+    pipeline = client.pipeline(transaction=False)
+    for user_id in missing:
+        pipeline.smembers(get_user_blocks_cache_key(user_id))
+        pipeline.smembers(get_user_blocked_by_cache_key(user_id))
+        pipeline.get(get_user_blocks_generation_cache_key(user_id))
+    members = pipeline.execute()
+
+    generations = {}
+    for index, user_id in enumerate(missing):
+        blocked, blocked_by, generation = members[index * 3 : index * 3 + 3]
+        if not blocked or not blocked_by:
+            generations[user_id] = generation or b""
+            continue
+        blocks[user_id] = (
+            frozenset(int(member) for member in blocked) - {LOADED},
+            frozenset(int(member) for member in blocked_by) - {LOADED},
+        )
+
+    stored = set(missing) - generations.keys()
+    if generations:
+        loaded = load_blocks(generations)
+        store_blocks = client.register_script(STORE_BLOCKS_LUA)
+        ttl = getattr(settings, "BLOCK_CACHE_TTL", 60 * 60 * 24)
+        pipeline = client.pipeline(transaction=False)
+        for user_id, (blocked, blocked_by) in loaded.items():
+            store_blocks(
+                keys=[
+                    get_user_blocks_cache_key(user_id),
+                    get_user_blocked_by_cache_key(user_id),
+                    get_user_blocks_generation_cache_key(user_id),
+                ],
+                args=[
+                    generations[user_id],
+                    ttl,
+                    len(blocked) + 1,
+                    LOADED,
+                    *blocked,
+                    LOADED,
+                    *blocked_by,
+                ],
+                client=pipeline,
+            )
+            blocks[user_id] = (frozenset(blocked), frozenset(blocked_by))
+        for user_id, is_stored in zip(loaded, pipeline.execute()):
+            if is_stored:
+                stored.add(user_id)
+
+    # Blocks cleared while they were loaded are used for this call only
+    for user_id in stored:
+        LOCAL_BLOCKS.set(user_id, blocks[user_id])
+    return blocks
+
+
+def load_blocks(user_ids):
+    """Read the (blocked, blocked by) sets of the given users from the database."""
+    from chat.models import BlockList
+
+    blocks = {user_id: (set(), set()) for user_id in user_ids}
+    block_list = BlockList.objects.filter(
+        Q(blocked_by_id__in=blocks) | Q(user_id__in=blocks),
+        member_ship__isnull=True,
+    ).values_list("blocked_by_id", "user_id")
+    for blocked_by_id, user_id in block_list:
+        if blocked_by_id in blocks:
+            blocks[blocked_by_id][0].add(user_id)
+        if user_id in blocks:
+            blocks[user_id][1].add(blocked_by_id)
+    return blocks
+
+
+def get_blocked_user_ids(user_id, other_ids):
+    """
+    Return the given users that the user blocked or that blocked the user,
+    checked against the cached sets of the user only.
+    """
+    blocked, blocked_by = get_blocks([user_id])[user_id]
+    return {
+        other_id
+        for other_id in other_ids
+        if other_id in blocked or other_id in blocked_by
+    }
+
+
+def is_blocked(user_id, other_id):
+    """Whether one of the two users blocked the other."""
+    return bool(get_blocked_user_ids(user_id, [other_id]))
+
+
+def clear_blocks(user_ids):
+    """Drop the cached blocks of the given users, they are loaded on next use."""
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    for user_id in user_ids:
+        LOCAL_BLOCKS.delete(user_id)
+
+    if not user_ids:
+        return
+
+    # A new generation fails the loads that started before the change
+    ttl = getattr(settings, "BLOCK_CACHE_TTL", 60 * 60 * 24)
+    pipeline = get_redis_client().pipeline(transaction=True)
+    for user_id in user_ids:
+        generation_key = get_user_blocks_generation_cache_key(user_id)
+        pipeline.incr(generation_key)
+        pipeline.expire(generation_key, ttl)
+    pipeline.delete(
+        *[get_user_blocks_cache_key(user_id) for user_id in user_ids],
+        *[get_user_blocked_by_cache_key(user_id) for user_id in user_ids],
+    )
+    pipeline.execute()
@@ -0,0 +1,162 @@
+import json
+import zlib
+import logging
+
+import msgpack
+
+from django.conf import settings
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from chat.metrics import start_metrics_publisher
+from chat.consumers.outbox import Outbox
+
+
+logger = logging.getLogger(__name__)
+
+BINARY_SUBPROTOCOL = "chat.msgpack"
+# Frames of an event are cached on the event itself, which the channel
+# layer hands to every member channel of the worker
+FRAMES_KEY = "__frames__"
+
+
+def encode_event(data, event_type="chat_message"):
+    """
+    Encode a group event once for every member.
+
+    The payload travels as its JSON frame, compressed when it is larger than
+    the compression threshold.
+    """
+    message = json.dumps(data)
+    threshold = getattr(settings, "BROADCAST_COMPRESSION_THRESHOLD", 4096)
+    if threshold and len(message) >= threshold:
+        return {
+            "type": event_type,
+            "compressed_message": zlib.compress(message.encode("utf-8"), 1),
+        }
+    return {"type": event_type, "message": message}
+
+
+def get_frame(event, binary=False):
+    """
+    Return the websocket frame of a group event, decompressed and encoded
+    at most once per worker whatever the number of members.
+    """
+    frames = event.setdefault(FRAMES_KEY, {})
+
+    if "text" not in frames:
+        if "compressed_message" in event:
+            frames["text"] = zlib.decompress(event["compressed_message"]).decode()
+        else:
+            frames["text"] = event["message"]
+
+    if binary and "bytes" not in frames:
+        frames["bytes"] = msgpack.packb(json.loads(frames["text"]), use_bin_type=True)
+
+    return frames["bytes"] if binary else frames["text"]
+
+
+def broadcast_saved_message(message):
+    """
+    Send a message saved outside of the websockets, e.g. through the REST
+    API, to the members connected to its room, then its sequence number so
+    they resume after it.
+    """
+    channel_layer = get_channel_layer()
+    group_name = message.chat_room.name
+    data = {
+        "message": message.content,
+        "message_uid": str(message.uid),
+        "sender": message.sender.username,
+        "room": group_name,
+        "seq": message.seq,
+    }
+    try:
+        async_to_sync(channel_layer.group_send)(group_name, encode_event(data))
+        async_to_sync(channel_layer.group_send)(
+            group_name, {"type": "message_sequence", "last_seq": message.seq}
+        )
+    except Exception:
+        # Members still get it from the history or when they resume
+        logger.exception("Message %s could not be broadcast.", message.uid)
+
+
+class BroadcastMixin:
+    """
+    Sends and receives frames as JSON text or, for the clients negotiating
+    the `chat.msgpack` subprotocol, as msgpack binary frames, and fans out
+    group events encoded once.
+
+    Group events go through the bounded outbox of the connection, so a slow
+    client cannot make the worker buffer its frames without limit. Every
+    frame sent is counted, for the clients acknowledging what they received.
+    """
+
+    binary = False
+    outbox = None
+
+    async def accept_connection(self):
+        start_metrics_publisher()
+        if BINARY_SUBPROTOCOL in self.scope.get("subprotocols", []):
+            self.binary = True
+            await self.accept(subprotocol=BINARY_SUBPROTOCOL)
+        else:
+            await self.accept()
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if text_data is not None or bytes_data is not None:
+            self.get_outbox().sent_frames += 1
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def send_frame(self, data):
+        if self.binary:
+            await self.send(bytes_data=msgpack.packb(data, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(data))
+
+    def decode_frame(self, text_data=None, bytes_data=None):
+        """Return the received frame as a dict, or None if it is not valid."""
+        try:
+            if bytes_data is not None:
+                data = msgpack.unpackb(bytes_data, raw=False)
+            else:
+                data = json.loads(text_data)
+        except (TypeError, ValueError, msgpack.UnpackException):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def is_frame_ack(self, data):
+        return data is not None and data.get("type") == "received"
+
+    async def receive_frame_ack(self, data):
+        frames = data.get("frames")
+        if not isinstance(frames, int) or isinstance(frames, bool) or frames < 0:
+            await self.send_frame({"error": "Invalid received frames count."})
+            return
+        self.get_outbox().acknowledge(frames)
+
+    def get_outbox(self):
+        if self.outbox is None:
+            self.outbox = Outbox(self.write_frame, self.close)
+        return self.outbox
+
+    async def write_frame(self, frame):
+        if isinstance(frame, dict):
+            await self.send_frame(frame)
+        elif isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+
+    async def websocket_disconnect(self, message):
+        if self.outbox is not None:
+            self.outbox.shutdown()
+        await super().websocket_disconnect(message)
+
+    async def broadcast(self, group_name, data):
+        await self.channel_layer.group_send(group_name, encode_event(data))
+
+    async def chat_message(self, event):
+        """Send the message to WebSocket"""
+        self.get_outbox().push(get_frame(event, binary=self.binary))
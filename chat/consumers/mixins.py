@@ -0,0 +1,334 @@
+import time
+import uuid
+import asyncio
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+from rest_framework.fields import DateTimeField
+
+from asgiref.sync import sync_to_async
+
+from channels.db import database_sync_to_async
+
+from chat.models import Message
+
+from chat.presence import touch_connection, remove_connection, get_presence_fanout
+from chat.message_buffer import get_message_buffer
+from chat.utils import get_user_group_name
+from chat.ephemeral import (
+    EPHEMERAL_TYPES,
+    RateLimiter,
+    EphemeralCoalescer,
+    merge_ephemeral,
+    parse_ephemeral_event,
+    get_ephemeral_coalescer,
+)
+
+
+def merge_presence(queued, presence):
+    users = {**queued["users"], **presence["users"]}
+    return {"type": "presence", "users": users}
+
+
+class PresenceConsumerMixin:
+    """
+    Keeps the presence of the connected user up to date while the websocket
+    is open and forwards the presence changes of its friends.
+
+    Expects the consumer to use the `BroadcastMixin`.
+    """
+
+    presence_user = None
+    presence_heartbeat = None
+
+    async def start_presence(self, user):
+        self.presence_user = user
+        await self.channel_layer.group_add(
+            get_user_group_name(user.id), self.channel_name
+        )
+        await self.touch_presence()
+        self.presence_heartbeat = asyncio.ensure_future(self.send_heartbeats())
+
+    async def stop_presence(self):
+        if self.presence_user is None:
+            return
+
+        user, self.presence_user = self.presence_user, None
+        self.presence_heartbeat.cancel()
+        await self.channel_layer.group_discard(
+            get_user_group_name(user.id), self.channel_name
+        )
+        if await sync_to_async(remove_connection)(user.id, self.channel_name):
+            get_presence_fanout().add(user.id, user.username)
+
+    async def touch_presence(self):
+        user = self.presence_user
+        if await sync_to_async(touch_connection)(user.id, self.channel_name):
+            get_presence_fanout().add(user.id, user.username)
+
+    async def send_heartbeats(self):
+        interval = getattr(settings, "PRESENCE_HEARTBEAT_INTERVAL", 30)
+        while True:
+            await asyncio.sleep(interval)
+            await self.touch_presence()
+
+    async def presence_update(self, event):
+        """Send the presence changes of friends to WebSocket"""
+        presence = {"type": "presence", "users": event["users"]}
+        # Changes still waiting in the outbox are sent as one frame
+        self.get_outbox().push(presence, key="presence", merge=merge_presence)
+
+
+class BufferedMessageMixin:
+    """
+    Saves the received messages through the write-behind buffer and
+    acknowledges them to the sender once they are saved.
+
+    Expects the consumer to use the `BroadcastMixin`.
+    """
+
+    is_disconnected = False
+
+    def get_message_uid(self, data):
+        """Use the uid generated by the client if it is valid."""
+        try:
+            return uuid.UUID(str(data.get("message_uid")))
+        except ValueError:
+            return uuid.uuid4()
+
+    def save_message(self, message, read_by_user_ids=()):
+        saved = get_message_buffer().add(message, read_by_user_ids, self.group_name)
+        asyncio.ensure_future(self.acknowledge(saved, str(message.uid)))
+
+    async def acknowledge(self, saved, message_uid):
+        """Tell the sender whether the message was saved."""
+        ack = {"type": "ack", "message_uid": message_uid}
+        try:
+            message = await saved
+            ack["status"] = "saved"
+            ack["seq"] = message.seq
+        except Exception:
+            ack["status"] = "failed"
+            ack["error"] = "The message could not be saved."
+
+        # Queued like the other frames, so a client that stops reading holds
+        # no more of them than its outbox allows
+        if not self.is_disconnected:
+            self.get_outbox().push(ack)
+
+
+class EphemeralConsumerMixin:
+    """
+    Lane for the typing states and read cursor moves of the connected user.
+
+    The events are never saved, they are rate limited per connection and
+    merged into at most one broadcast per room and interval, so they do not
+    compete with the messages for the database or the channel layer.
+
+    Expects the consumer to use the `BufferedMessageMixin` and the
+    `BroadcastMixin`.
+    """
+
+    ephemeral_limiter = None
+    deferred_ephemeral = None
+    deferred_ephemeral_handle = None
+
+    def is_ephemeral(self, data):
+        return data is not None and data.get("type") in EPHEMERAL_TYPES
+
+    async def receive_ephemeral(self, data):
+        event = parse_ephemeral_event(data)
+        if event is None:
+            await self.send_frame({"error": "Invalid ephemeral event."})
+            return
+        if not self.group_name:
+            return
+
+        if self.ephemeral_limiter is None:
+            self.ephemeral_limiter = RateLimiter(
+                rate=getattr(settings, "EPHEMERAL_RATE", 5),
+                burst=getattr(settings, "EPHEMERAL_BURST", 10),
+            )
+            self.deferred_ephemeral = {}
+
+        event_type, value = event
+        if self.ephemeral_limiter.allow():
+            self.deferred_ephemeral.pop(event_type, None)
+            self.add_ephemeral(event_type, value)
+            return
+
+        # Only the newest state of a limited connection is sent, once it may
+        # send again, so that a final "stopped typing" is never lost
+        EphemeralCoalescer.metrics["rate_limited_events"] += 1
+        self.deferred_ephemeral[event_type] = value
+        if self.deferred_ephemeral_handle is None:
+            loop = asyncio.get_running_loop()
+            self.deferred_ephemeral_handle = loop.call_later(
+                self.ephemeral_limiter.get_wait_time(), self.send_deferred_ephemeral
+            )
+
+    def send_deferred_ephemeral(self):
+        self.deferred_ephemeral_handle = None
+        deferred, self.deferred_ephemeral = self.deferred_ephemeral, {}
+        if self.is_disconnected:
+            return
+
+        self.ephemeral_limiter.allow()
+        for event_type, value in deferred.items():
+            self.add_ephemeral(event_type, value)
+
+    def add_ephemeral(self, event_type, value):
+        get_ephemeral_coalescer().add(
+            self.group_name, event_type, self.scope["user"].username, value
+        )
+
+    async def ephemeral_update(self, event):
+        """Send the typing states and read cursors of the room to WebSocket"""
+        update = {"type": "ephemeral", **event["events"]}
+        self.get_outbox().push(update, key="ephemeral", merge=merge_ephemeral)
+
+
+def merge_sequence(queued, sequence):
+    return max(queued, sequence, key=lambda frame: frame["last_seq"])
+
+
+class ResumableConsumerMixin:
+    """
+    Sends a client reconnecting with `?resume_from=<seq>` the messages of
+    the room it missed, in batches read straight from the sequence index,
+    and keeps its members told of the sequence number to resume from.
+
+    Messages are broadcast before they are saved, so one broadcast while
+    the connection was joining the group may only be saved after the
+    missed messages were read. Sequence numbers ahead of the resumed ones
+    are held back for `RESUME_CATCH_UP_DELAY` seconds after the resume,
+    then the messages saved meanwhile are sent in one more `resume` frame
+    before the sequence number. That frame may repeat messages the client
+    already received live, which it drops by their `message_uid`.
+
+    Expects the consumer to use the `BufferedMessageMixin` and the
+    `BroadcastMixin`.
+    """
+
+    resumed_chat_room_id = None
+    resumed_seq = None
+    resumed_at = None
+    held_last_seq = None
+    catch_up_handle = None
+
+    def get_resume_from(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            return int(query["resume_from"][0])
+        except (KeyError, ValueError):
+            return None
+
+    async def resume(self, chat_room_id):
+        """
+        Send the missed messages, once the connection joined the group and
+        before any group event is dispatched to it. Clients missing more
+        than `RESUME_MAX_MESSAGES` get told to reload the history instead.
+        """
+        seq = self.get_resume_from()
+        if seq is None:
+            return
+
+        seq, reload = await self.send_messages_after(chat_room_id, seq)
+        if not reload:
+            self.resumed_chat_room_id = chat_room_id
+            self.resumed_seq = seq
+            self.resumed_at = time.monotonic()
+
+    async def send_messages_after(self, chat_room_id, seq):
+        """
+        Send the messages saved after `seq` in `resume` frames. Return the
+        sequence number of the last message sent and whether the client was
+        told to reload the history.
+        """
+        batch_size = getattr(settings, "RESUME_BATCH_SIZE", 200)
+        remaining = getattr(settings, "RESUME_MAX_MESSAGES", 1000)
+        created_at_field = DateTimeField()
+        while True:
+            # One extra message tells whether another batch follows
+            limit = min(batch_size, remaining)
+            messages = await database_sync_to_async(Message.get_messages_after)(
+                chat_room_id, seq, limit + 1
+            )
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            if messages:
+                seq = messages[-1][0]
+                remaining -= len(messages)
+
+            done = not has_more or not remaining
+            reload = has_more and not remaining
+            await self.send_frame(
+                {
+                    "type": "resume",
+                    "messages": [
+                        {
+                            "seq": message_seq,
+                            "message_uid": str(uid),
+                            "sender": sender,
+                            "message": content,
+                            "created_at": created_at_field.to_representation(
+                                created_at
+                            ),
+                        }
+                        for message_seq, uid, sender, content, created_at in messages
+                    ],
+                    "last_seq": seq,
+                    "done": done,
+                    "reload": reload,
+                }
+            )
+            if done:
+                return seq, reload
+
+    def hold_sequence(self, last_seq):
+        """
+        Hold back a sequence number ahead of the resumed messages while the
+        messages broadcast before the connection joined may still be saved.
+        Return False once the catch up delay is over.
+        """
+        if self.resumed_seq is None:
+            return False
+
+        delay = getattr(settings, "RESUME_CATCH_UP_DELAY", 1)
+        remaining = self.resumed_at + delay - time.monotonic()
+        if self.held_last_seq is None and (
+            remaining <= 0 or last_seq <= self.resumed_seq
+        ):
+            if remaining <= 0:
+                self.resumed_seq = None
+            return False
+
+        self.held_last_seq = max(self.held_last_seq or 0, last_seq)
+        if self.catch_up_handle is None:
+            loop = asyncio.get_running_loop()
+            self.catch_up_handle = loop.call_later(
+                max(remaining, 0), lambda: asyncio.ensure_future(self.catch_up())
+            )
+        return True
+
+    async def catch_up(self):
+        """Send the messages saved since the resume, then the held sequence."""
+        self.catch_up_handle = None
+        last_seq, self.held_last_seq = self.held_last_seq, None
+        seq, self.resumed_seq = self.resumed_seq, None
+        if self.is_disconnected:
+            return
+
+        seq, reload = await self.send_messages_after(self.resumed_chat_room_id, seq)
+        if not reload:
+            self.push_sequence(max(seq, last_seq))
+
+    async def message_sequence(self, event):
+        """Send the sequence number of the newest saved message to WebSocket"""
+        if not self.hold_sequence(event["last_seq"]):
+            self.push_sequence(event["last_seq"])
+
+    def push_sequence(self, last_seq):
+        sequence = {"type": "sequence", "last_seq": last_seq}
+        self.get_outbox().push(sequence, key="sequence", merge=merge_sequence)
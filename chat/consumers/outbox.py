@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import collections
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+logger = logging.getLogger(__name__)
+
+COALESCE = "coalesce"
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+POLICIES = (COALESCE, DROP_OLDEST, DISCONNECT)
+# Close code of the connections disconnected for being too slow
+SLOW_CONSUMER_CLOSE_CODE = 1008
+# Close code of the connections that stopped acknowledging their frames
+ACK_TIMEOUT_CLOSE_CODE = 4008
+
+
+class Outbox:
+    """
+    Bounded queue of the frames waiting to be written to one websocket.
+
+    Frames are written by a single task, so a slow client no longer holds
+    the consumer and the channel layer keeps being drained. Frames pushed
+    with a key replace the queued frame of the same key. Once the queue is
+    full the policy decides what happens to the next frame:
+
+    - `coalesce` drops the oldest frame and queues a single frame telling
+      the client how many messages it missed, so it can fetch them again.
+    - `drop_oldest` drops the oldest frame.
+    - `disconnect` closes the connection.
+
+    Writing to the websocket never blocks under an ASGI server, so a slow
+    client is only seen through its acknowledgements. Every client sends
+    `{"type": "received", "frames": <frames received so far>}` and gets at
+    most the ack window of frames ahead of it, the frames it did not
+    acknowledge count in the queue depth. A client whose window stays full
+    for the ack timeout is disconnected, so one that never acknowledges
+    holds at most a window of frames on the wire and a queue in memory.
+    """
+
+    metrics = {
+        "connections": 0,
+        "queued_frames": 0,
+        "max_depth": 0,
+        "sent_frames": 0,
+        "dropped_frames": 0,
+        "coalesced_frames": 0,
+        "slow_disconnects": 0,
+        "window_waits": 0,
+        "ack_timeouts": 0,
+    }
+
+    def __init__(
+        self, write, close, max_size=None, policy=None, window=None, ack_timeout=None
+    ):
+        self.write = write
+        self.close = close
+        self.max_size = max_size or getattr(settings, "OUTBOX_MAX_SIZE", 100)
+        self.window = window or getattr(settings, "OUTBOX_ACK_WINDOW", 50)
+        self.ack_timeout = ack_timeout or getattr(settings, "OUTBOX_ACK_TIMEOUT", 30)
+        self.policy = policy or getattr(settings, "OUTBOX_POLICY", COALESCE)
+        if self.policy not in POLICIES:
+            raise ImproperlyConfigured(
+                f"OUTBOX_POLICY must be one of {', '.join(POLICIES)}."
+            )
+
+        self.entries = collections.deque()
+        self.keyed_entries = {}
+        self.writer = None
+        self.closed = False
+        # Every frame sent to the websocket, and the frames the client said it
+        # received
+        self.sent_frames = 0
+        self.received_frames = 0
+        self.window_open = asyncio.Event()
+        self.metrics["connections"] += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def unacknowledged(self):
+        return self.sent_frames - self.received_frames
+
+    @property
+    def depth(self):
+        return len(self.entries) + self.unacknowledged
+
+    def acknowledge(self, received_frames):
+        """Record the number of frames the client received so far."""
+        if received_frames > self.sent_frames:
+            return
+        self.received_frames = max(self.received_frames, received_frames)
+        self.window_open.set()
+
+    def push(self, frame, key=None, merge=None):
+        """
+        Queue a frame, return False if it was not queued because the
+        connection is closed.
+
+        A keyed frame replaces the queued frame of the same key, or is
+        merged into it with `merge(queued_frame, frame)`.
+        """
+        if self.closed:
+            return False
+
+        entry = self.keyed_entries.get(key) if key is not None else None
+        if entry is not None:
+            entry[1] = merge(entry[1], frame) if merge else frame
+            self.metrics["coalesced_frames"] += 1
+            return True
+
+        if self.entries and self.depth >= self.max_size and not self.make_room():
+            return False
+
+        self.append([key, frame])
+        self.metrics["max_depth"] = max(self.metrics["max_depth"], self.depth)
+        if self.writer is None or self.writer.done():
+            self.writer = asyncio.ensure_future(self.write_entries())
+        return True
+
+    def append(self, entry, left=False):
+        if left:
+            self.entries.appendleft(entry)
+        else:
+            self.entries.append(entry)
+        if entry[0] is not None:
+            self.keyed_entries[entry[0]] = entry
+        self.metrics["queued_frames"] += 1
+
+    def make_room(self):
+        if self.policy == DISCONNECT:
+            logger.warning("Disconnecting a slow consumer")
+            self.metrics["slow_disconnects"] += 1
+            self.shutdown()
+            asyncio.ensure_future(self.close(code=SLOW_CONSUMER_CLOSE_CODE))
+            return False
+
+        # Keyed frames are already coalesced, the oldest other frame goes
+        index = next(
+            (index for index, entry in enumerate(self.entries) if entry[0] is None),
+            0,
+        )
+        key, _ = self.entries[index]
+        del self.entries[index]
+        if key is not None:
+            del self.keyed_entries[key]
+        self.metrics["queued_frames"] -= 1
+        self.metrics["dropped_frames"] += 1
+
+        if self.policy == COALESCE:
+            entry = self.keyed_entries.get("missed_messages")
+            if entry is None:
+                # Sent first, the missed messages are older than the queue
+                missed = {"type": "missed_messages", "count": 0}
+                self.append(["missed_messages", missed], left=True)
+                entry = self.keyed_entries["missed_messages"]
+            entry[1]["count"] += 1
+        return True
+
+    async def write_entries(self):
+        while self.entries:
+            if self.unacknowledged >= self.window:
+                # The queued frames wait for the client to catch up, so the
+                # policy applies to them once the queue is full
+                self.metrics["window_waits"] += 1
+                self.window_open.clear()
+                try:
+                    await asyncio.wait_for(self.window_open.wait(), self.ack_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Disconnecting a consumer not acknowledging")
+                    self.metrics["ack_timeouts"] += 1
+                    self.shutdown()
+                    await self.close(code=ACK_TIMEOUT_CLOSE_CODE)
+                    return
+                continue
+
+            key, frame = self.entries.popleft()
+            if key is not None:
+                del self.keyed_entries[key]
+            self.metrics["queued_frames"] -= 1
+
+            try:
+                await self.write(frame)
+            except Exception:
+                logger.exception("Cannot write to the websocket")
+                self.shutdown()
+                return
+            self.metrics["sent_frames"] += 1
+
+    def shutdown(self):
+        """Drop the queued frames and stop writing, once for good."""
+        if self.closed:
+            return
+
+        self.closed = True
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        self.metrics["queued_frames"] -= len(self.entries)
+        self.metrics["connections"] -= 1
+        self.entries.clear()
+        self.keyed_entries.clear()
+
+    @classmethod
+    def get_metrics(cls):
+        """Counters of the worker since it started."""
+        metrics = dict(cls.metrics)
+        connections = metrics["connections"]
+        metrics["average_depth"] = (
+            metrics["queued_frames"] / connections if connections else 0
+        )
+        return metrics
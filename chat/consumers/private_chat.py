@@ -1,10 +1,24 @@
-import json
 import logging
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
 from chat.models import ChatRoom, Message, ChatRoomMembership
 from chat.utils import generate_private_room_name
+from chat.presence import is_online
+from chat.admission import get_handshake_admission
+from chat.blocks import get_blocks, get_cached_blocks, is_blocked
+from chat.consumers.mixins import (
+    PresenceConsumerMixin,
+    BufferedMessageMixin,
+    EphemeralConsumerMixin,
+    ResumableConsumerMixin,
+)
+from chat.consumers.broadcast import BroadcastMixin
+
+from shared.services import ExpiringLRUCache
+
+from asgiref.sync import sync_to_async
 
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
@@ -12,26 +26,60 @@ from channels.db import database_sync_to_async
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
-CONNECTED_USERS = set()
+# Receiver and room of each private chat opened on this worker
+PRIVATE_CHATS = ExpiringLRUCache(
+    max_size=getattr(settings, "PRIVATE_CHAT_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "PRIVATE_CHAT_CACHE_TTL", 60 * 5),
+)
+
+
+class PrivateChatConsumer(
+    PresenceConsumerMixin,
+    BufferedMessageMixin,
+    EphemeralConsumerMixin,
+    ResumableConsumerMixin,
+    BroadcastMixin,
+    AsyncWebsocketConsumer,
+):
+    group_name = None
 
-
-class PrivateChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         # Accept connection
-        await self.accept()
+        await self.accept_connection()
         # Check if error exists during connection
         if self.is_error_exists():
             error = {"error": str(self.scope["error"])}
-            await self.send(text_data=json.dumps(error))
+            await self.send_frame(error)
             await self.close()
             return
 
-        # Get the sender, receiver and the room
-        self.sender = await self.get_user(user_id=self.scope["user_id"])
-        self.receiver = await self.get_user(
-            username=self.scope["url_route"]["kwargs"]["username"]
-        )
-        self.room = await self.get_or_create_private_chat(self.sender, self.receiver)
+        # Shed load during reconnect storms instead of queueing database work
+        admission = get_handshake_admission()
+        retry_after = admission.acquire()
+        if retry_after is not None:
+            error = {
+                "error": "Server is busy, retry later.",
+                "retry_after": retry_after,
+            }
+            await self.send_frame(error)
+            await self.close(code=1013)
+            return
+
+        try:
+            # Get the sender, receiver and the room
+            # The middleware already loaded the user of the token
+            self.sender = self.scope["user"]
+            username = self.scope["url_route"]["kwargs"]["username"]
+            private_chat = await self.resolve_private_chat(username)
+        finally:
+            admission.release()
+
+        if private_chat is None:
+            error_message = f"{username} username not found in the database."
+            await self.send_frame({"error": error_message})
+            await self.close()
+            return
+        self.receiver, self.room = private_chat
 
         # Add to the group
         self.group_name = self.room.name
@@ -39,25 +87,46 @@ class PrivateChatConsumer(AsyncWebsocketConsumer):
             self.group_name,
             self.channel_name,
         )
+        # Send the messages missed since the last connection
+        await self.resume(self.room.id)
 
-        # Add to connected user
-        CONNECTED_USERS.add(self.sender.id)
+        # Mark the user online across every worker
+        await self.start_presence(self.sender)
 
     async def disconnect(self, close_code):
+        self.is_disconnected = True
+
         # Remove user from the group
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name,
-        )
+        if self.group_name:
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name,
+            )
         logger.warning(f"disconnected {close_code}")
 
-        # Remove user from connected user
-        CONNECTED_USERS.remove(self.sender.id)
+        # Mark the user offline once its last connection is closed
+        await self.stop_presence()
 
         await self.close()
 
-    async def receive(self, text_data):
-        data = await self.validate_message(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        # Parse the received JSON text or msgpack bytes
+        data = self.decode_frame(text_data, bytes_data)
+        # Acknowledged frames only move the window of the outbox
+        if self.is_frame_ack(data):
+            await self.receive_frame_ack(data)
+            return
+        # Nothing is delivered between users who blocked one another
+        if await self.is_receiver_blocked():
+            await self.send_frame({"error": "You cannot send messages to this user."})
+            return
+
+        # Typing states and read cursors never reach the database
+        if self.is_ephemeral(data):
+            await self.receive_ephemeral(data)
+            return
+
+        data = await self.validate_message(data)
         # Close the connection if data is not valid
         if not data:
             await self.close()
@@ -68,75 +137,80 @@ class PrivateChatConsumer(AsyncWebsocketConsumer):
         data["receiver"] = self.receiver.username
         data["room"] = self.room.name
 
-        # Create message instance
-        self.message_instance = await database_sync_to_async(Message.objects.create)(
-            content=data["message"], sender=self.sender, chat_room=self.room
+        # Broadcast right away and save the message with the next batch, the
+        # uid is allocated here so clients can match the acknowledgement
+        message_uid = self.get_message_uid(data)
+        message = Message(
+            uid=message_uid,
+            content=data["message"],
+            sender=self.sender,
+            chat_room=self.room,
         )
-        data["message_uid"] = str(self.message_instance.uid)
+        data["message_uid"] = str(message_uid)
 
         # Update real time message read by funtionality
-        if self.sender.id in CONNECTED_USERS and self.receiver.id in CONNECTED_USERS:
-            await database_sync_to_async(self.message_instance.read_by.add)(
-                self.sender, self.receiver
-            )
+        # The sender read watermark moves when the message is saved
+        read_by_user_ids = []
+        online = await sync_to_async(is_online)([self.receiver.id])
+        if online[self.receiver.id]:
+            read_by_user_ids.append(self.receiver.id)
             data["read_by"] = [self.sender.username, self.receiver.username]
         else:
-            await database_sync_to_async(self.message_instance.read_by.add)(self.sender)
             data["read_by"] = [self.sender.username]
 
-        # Broadcast data to the group
-        await self.channel_layer.group_send(
-            self.group_name,
-            {
-                "type": "chat_message",
-                "message": json.dumps(data),
-            },
+        self.save_message(message, read_by_user_ids)
+
+        # Broadcast data to the group, encoded once for every member
+        await self.broadcast(self.group_name, data)
+
+    async def is_receiver_blocked(self):
+        """Whether the sender or the receiver blocked the other one."""
+        # The blocks of the sender are loaded off the event loop once per TTL
+        if get_cached_blocks(self.sender.id) is None:
+            await database_sync_to_async(get_blocks)([self.sender.id])
+        return is_blocked(self.sender.id, self.receiver.id)
+
+    async def resolve_private_chat(self, username):
+        """Get the receiver and the private chat room, cached per worker."""
+        cache_key = (self.sender.id, username)
+        private_chat = PRIVATE_CHATS.get(cache_key)
+        if private_chat is None:
+            private_chat = await database_sync_to_async(self.get_private_chat)(username)
+            if private_chat is not None:
+                PRIVATE_CHATS.set(cache_key, private_chat)
+        return private_chat
+
+    def get_private_chat(self, username):
+        """Get the receiver and the private chat room with one query."""
+        membership = ChatRoomMembership.get_private_chat_membership(
+            self.sender, username
         )
+        if membership:
+            return membership.user, membership.chat_room
+
+        # First conversation of the two users
+        receiver = User.objects.filter(username=username).first()
+        if receiver is None:
+            return None
+        return receiver, self.get_or_create_private_chat(self.sender, receiver)
 
-    async def get_user(self, username=None, user_id=None):
-        if user_id:
-            # As we are validating the user_id from the token, we can safely assume that the user exists
-            return await database_sync_to_async(User.objects.get)(id=user_id)
-
-        if username:
-            # We handle error only for the username since we are using it in the URL
-            try:
-                return await database_sync_to_async(User.objects.get)(username=username)
-            except User.DoesNotExist:
-                error_message = f"{username} username not found in the database."
-                await self.send(text_data=json.dumps({"error": error_message}))
-                await self.close()
-                return
-
-    async def chat_message(self, event):
-        """Send the message to WebSocket"""
-        await self.send(text_data=event["message"])
-
-    async def get_or_create_private_chat(self, sender, receiver):
+    def get_or_create_private_chat(self, sender, receiver):
         """Get or create a private chat room between two users."""
         room_name = generate_private_room_name(sender, receiver)
-        room, created = await database_sync_to_async(ChatRoom.objects.get_or_create)(
-            name=room_name
-        )
+        room, created = ChatRoom.objects.get_or_create(name=room_name)
 
         if created:
             for obj in [sender, receiver]:
-                room_membership, created = await database_sync_to_async(
-                    ChatRoomMembership.objects.get_or_create
-                )(chat_room=room, user=obj)
+                ChatRoomMembership.objects.get_or_create(chat_room=room, user=obj)
 
         return room
 
-    async def validate_message(self, text_data):
+    async def validate_message(self, data):
         """Validate the send message"""
-        try:
-            # Parse the received text data as JSON
-            data = json.loads(text_data)
-            return data
-        except json.JSONDecodeError:
+        if data is None:
             error_message = "Message format must be {'message':'your message'} "
-            await self.send(text_data=json.dumps({"error": error_message}))
-            return None
+            await self.send_frame({"error": error_message})
+        return data
 
     def is_error_exists(self):
         """Checks if error exists during websockets"""
@@ -1,68 +1,144 @@
-import json
+import time
 import logging
 
-from django.contrib.auth import get_user_model
+from django.conf import settings
 
-from chat.models import ChatRoom
+from chat.models import Message
+from chat.access import get_chat_room_access
+from chat.consumers.mixins import (
+    BufferedMessageMixin,
+    EphemeralConsumerMixin,
+    ResumableConsumerMixin,
+)
+from chat.consumers.broadcast import BroadcastMixin
 
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
 
-User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
-class RoomChatConsumer(AsyncWebsocketConsumer):
+class RoomChatConsumer(
+    BufferedMessageMixin,
+    EphemeralConsumerMixin,
+    ResumableConsumerMixin,
+    BroadcastMixin,
+    AsyncWebsocketConsumer,
+):
+    group_name = None
+    access = None
+    access_checked_at = None
+
     async def connect(self):
         # Accept connection
-        await self.accept()
+        await self.accept_connection()
         # Check if error exists during connection
         if self.is_error_exists():
             error = {"error": str(self.scope["error"])}
-            await self.send(text_data=json.dumps(error))
+            await self.send_frame(error)
             await self.close()
             return
         # Get the room name from url
+        self.user = self.scope["user"]
         self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
-        # Check room existance under this room name
-        if await self.check_room_existance(self.room_name):
+        # Check room existance and membership under this room name
+        access = await self.get_access()
+        if access is None:
+            error_message = "Invalid room name"
+        elif not access["is_member"]:
+            error_message = "You are not a member of this chat room"
+        else:
             # Add to the group
             self.group_name = self.room_name
             await self.channel_layer.group_add(
                 self.group_name,
                 self.channel_name,
             )
-        else:
-            error_message = "Invalid room name"
-            await self.send(text_data=json.dumps({"error": error_message}))
+            # Send the messages missed since the last connection
+            await self.resume(access["chat_room_id"])
+            return
+
+        await self.send_frame({"error": error_message})
+        await self.close()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Parse the received JSON text or msgpack bytes
+        data = self.decode_frame(text_data, bytes_data)
+        # Acknowledged frames only move the window of the outbox
+        if self.is_frame_ack(data):
+            await self.receive_frame_ack(data)
+            return
+        # Typing states and read cursors never reach the database
+        if self.is_ephemeral(data):
+            await self.receive_ephemeral(data)
+            return
+
+        data = await self.validate_message(data)
+        # Close the connection if data is not valid
+        if not data:
             await self.close()
+            return
+
+        # The access is checked again every few seconds as it may be revoked
+        access = await self.get_access()
+        if not access or not access["is_member"]:
+            await self.send_frame({"error": "Invalid room name"})
+            await self.close()
+            return
+        if not access["has_write_access"]:
+            error_message = "You do not have write access to this chat room"
+            await self.send_frame({"error": error_message})
+            return
 
-    async def receive(self, text_data=None):
-        # Send real time chat message
-        await self.channel_layer.group_send(
-            self.group_name, {"type": "chat_message", "message": text_data}
+        # Broadcast right away and save the message with the next batch
+        message = Message(
+            uid=self.get_message_uid(data),
+            content=data["message"],
+            sender=self.user,
+            chat_room_id=access["chat_room_id"],
         )
+        self.save_message(message)
+
+        # The event is encoded once and sent as is to every member
+        data["message_uid"] = str(message.uid)
+        data["sender"] = self.user.username
+        data["room"] = self.room_name
+        await self.broadcast(self.group_name, data)
 
     async def disconnect(self, close_code):
+        self.is_disconnected = True
+
         # Remove from the group
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name,
-        )
+        if self.group_name:
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name,
+            )
         logger.warning(f"disconnected {close_code}")
 
         await self.close()
 
-    async def check_room_existance(self, room_name: str):
-        """Check room exists in database"""
-        return await database_sync_to_async(
-            ChatRoom.objects.filter(name=room_name).exists
-        )()
+    async def get_access(self):
+        """Cached membership and write access of the user to the room."""
+        recheck_interval = getattr(settings, "ROOM_ACCESS_RECHECK_INTERVAL", 5)
+        if (
+            self.access_checked_at is None
+            or time.monotonic() - self.access_checked_at >= recheck_interval
+        ):
+            self.access = await database_sync_to_async(get_chat_room_access)(
+                self.user.id, self.room_name
+            )
+            self.access_checked_at = time.monotonic()
+        return self.access
 
-    async def chat_message(self, event):
-        """Send the message to WebSocket"""
-        await self.send(text_data=event["message"])
+    async def validate_message(self, data):
+        """Validate the send message"""
+        if data is None or not isinstance(data.get("message"), str):
+            error_message = "Message format must be {'message':'your message'} "
+            await self.send_frame({"error": error_message})
+            return None
+        return data
 
     def is_error_exists(self):
         """Checks if error exists during websockets"""
@@ -0,0 +1,132 @@
+import time
+import uuid
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+
+from channels.layers import get_channel_layer
+
+
+logger = logging.getLogger(__name__)
+
+TYPING = "typing"
+READ = "read"
+EPHEMERAL_TYPES = (TYPING, READ)
+
+
+def parse_ephemeral_event(data):
+    """
+    Return the (type, value) of an ephemeral event sent by a client, or
+    None if it is not valid.
+    """
+    if data.get("type") == TYPING and isinstance(data.get("is_typing"), bool):
+        return TYPING, data["is_typing"]
+
+    if data.get("type") == READ:
+        try:
+            return READ, str(uuid.UUID(str(data.get("message_uid"))))
+        except ValueError:
+            return None
+
+    return None
+
+
+def merge_ephemeral(queued, update):
+    """Merge two ephemeral frames of a room, the newest state of a user wins."""
+    merged = dict(queued)
+    for event_type in EPHEMERAL_TYPES:
+        if event_type in update:
+            merged[event_type] = {**queued.get(event_type, {}), **update[event_type]}
+    return merged
+
+
+class RateLimiter:
+    """Token bucket refilled at `rate` per second up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+
+    def allow(self):
+        now = time.monotonic()
+        refilled = (now - self.refilled_at) * self.rate
+        self.tokens = min(self.burst, self.tokens + refilled)
+        self.refilled_at = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def get_wait_time(self):
+        """Seconds until the next token."""
+        return max(1 - self.tokens, 0) / self.rate
+
+
+class EphemeralCoalescer:
+    """
+    Merges the ephemeral events of every room, typing states and read
+    cursor moves, into at most one broadcast per room and interval.
+
+    The events are never saved, only the newest state of every user is
+    kept and sent with a single `ephemeral_update` event on the room group.
+    """
+
+    metrics = {
+        "received_events": 0,
+        "rate_limited_events": 0,
+        "coalesced_events": 0,
+        "broadcasts": 0,
+    }
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, "EPHEMERAL_INTERVAL", 0.3)
+        self.pending = {}
+        self.flush_handle = None
+
+    def add(self, group_name, event_type, username, value):
+        self.metrics["received_events"] += 1
+        users = self.pending.setdefault(group_name, {}).setdefault(event_type, {})
+        if username in users:
+            self.metrics["coalesced_events"] += 1
+        users[username] = value
+
+        if self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self.flush_handle = loop.call_later(
+                self.interval, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    async def flush(self):
+        self.flush_handle = None
+        pending, self.pending = self.pending, {}
+
+        channel_layer = get_channel_layer()
+        for group_name, events in pending.items():
+            try:
+                await channel_layer.group_send(
+                    group_name, {"type": "ephemeral_update", "events": events}
+                )
+                self.metrics["broadcasts"] += 1
+            except Exception:
+                logger.exception("Ephemeral events could not be sent.")
+
+    @classmethod
+    def get_metrics(cls):
+        """Counters of the worker since it started."""
+        return dict(cls.metrics)
+
+
+_coalescers = weakref.WeakKeyDictionary()
+
+
+def get_ephemeral_coalescer():
+    """Return the ephemeral coalescer of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _coalescers:
+        _coalescers[loop] = EphemeralCoalescer()
+    return _coalescers[loop]
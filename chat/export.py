@@ -0,0 +1,185 @@
+import io
+import csv
+import json
+import zlib
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from asgiref.sync import sync_to_async
+
+from chat.models import Message, MessageReaction
+
+from shared.choices import StatusChoices
+
+
+NDJSON = "ndjson"
+CSV = "csv"
+EXPORT_FORMATS = (NDJSON, CSV)
+CSV_FIELDS = [
+    "uid",
+    "seq",
+    "sender",
+    "content",
+    "reply_to",
+    "created_at",
+    "updated_at",
+    "attachment_uid",
+    "attachment_file",
+    "attachment_image",
+    "attachment_emoji_description",
+    "reactions",
+]
+
+
+def get_export_messages(chat_room, chunk_size=None):
+    """
+    Iterate over the active messages of a chat room in sending order, read
+    in chunks through a server side cursor along with their attachment and
+    reactions, so memory use does not depend on the size of the room.
+    """
+    chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    return (
+        Message.objects.filter(chat_room=chat_room, status=StatusChoices.ACTIVE)
+        .select_related("sender", "attachment", "reply_to")
+        .only(
+            "uid",
+            "seq",
+            "content",
+            "created_at",
+            "updated_at",
+            "sender__username",
+            "reply_to__uid",
+            "attachment__uid",
+            "attachment__attachment",
+            "attachment__image",
+            "attachment__emoji_description",
+        )
+        .prefetch_related(
+            Prefetch(
+                "message_reactions",
+                queryset=MessageReaction.objects.select_related("user").only(
+                    "message_id", "reaction_type", "user__username"
+                ),
+            )
+        )
+        .order_by("seq", "id")
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def get_export_row(message):
+    attachment = None
+    if message.attachment:
+        attachment = {
+            "uid": message.attachment.uid,
+            "file": message.attachment.attachment.name or None,
+            "image": message.attachment.image.name or None,
+            "emoji_description": message.attachment.emoji_description,
+        }
+
+    return {
+        "uid": message.uid,
+        "seq": message.seq,
+        "sender": message.sender.username,
+        "content": message.content,
+        "reply_to": message.reply_to.uid if message.reply_to else None,
+        "created_at": message.created_at,
+        "updated_at": message.updated_at,
+        "attachment": attachment,
+        "reactions": [
+            {"user": reaction.user.username, "reaction_type": reaction.reaction_type}
+            for reaction in message.message_reactions.all()
+        ],
+    }
+
+
+def iter_ndjson(messages):
+    encoder = JSONEncoder()
+    for message in messages:
+        yield encoder.encode(get_export_row(message)) + "\n"
+
+
+def iter_csv(messages):
+    # The writer renders every row into a reused buffer
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def render(row):
+        writer.writerow(row)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    yield render(CSV_FIELDS)
+    for message in messages:
+        row = get_export_row(message)
+        attachment = row.pop("attachment") or {}
+        row["attachment_uid"] = attachment.get("uid")
+        row["attachment_file"] = attachment.get("file")
+        row["attachment_image"] = attachment.get("image")
+        row["attachment_emoji_description"] = attachment.get("emoji_description")
+        row["reactions"] = json.dumps(row["reactions"]) if row["reactions"] else ""
+        # Dates are written like in the NDJSON export
+        yield render(
+            [
+                value.isoformat().replace("+00:00", "Z")
+                if hasattr(value, "isoformat")
+                else value
+                for value in (row[field] for field in CSV_FIELDS)
+            ]
+        )
+
+
+def iter_gzip(lines, buffer_size=64 * 1024):
+    """Compress text lines into gzip chunks of about `buffer_size` bytes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    pending, pending_size = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= buffer_size:
+            chunk = compressor.compress(b"".join(pending))
+            pending, pending_size = [], 0
+            if chunk:
+                yield chunk
+
+    yield compressor.compress(b"".join(pending)) + compressor.flush()
+
+
+def export_chat_room(chat_room, export_format=NDJSON, compress=True, chunk_size=None):
+    """Stream the history of a chat room as NDJSON or CSV, gzipped by default."""
+    messages = get_export_messages(chat_room, chunk_size)
+    lines = iter_csv(messages) if export_format == CSV else iter_ndjson(messages)
+    return iter_gzip(lines) if compress else (line.encode("utf-8") for line in lines)
+
+
+async def aexport_chat_room(
+    chat_room, export_format=NDJSON, compress=True, chunk_size=None
+):
+    """
+    Asynchronous `export_chat_room` for ASGI responses, which would read a
+    synchronous iterator into a list before sending it. The chunks are read
+    one at a time, all in the thread of the synchronous code so the server
+    side cursor stays on its connection.
+    """
+    chunks = export_chat_room(chat_room, export_format, compress, chunk_size)
+    next_chunk = sync_to_async(next)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # Also closes the cursor when the client goes away mid download
+        await sync_to_async(chunks.close)()
+
+
+def get_export_filename(chat_room, export_format=NDJSON, compress=True):
+    filename = f"{chat_room.name or chat_room.uid}.{export_format}"
+    return f"{filename}.gz" if compress else filename
@@ -0,0 +1,174 @@
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from chat.rest.serializers.compiled import CompiledSerializer
+
+from shared.services import get_redis_client
+from shared.cache_key import (
+    get_user_chat_room_cache_key,
+    get_user_chat_room_summaries_cache_key,
+    get_user_chat_room_built_cache_key,
+)
+
+
+class UserInbox:
+    """
+    Redis copy of the chat room list of a user.
+
+    Rooms are kept in a sorted set scored by last activity and their
+    serialized summaries in a hash, so a page of the inbox is one range read
+    plus one multi-get. The inbox is built from the database on the first
+    read and then updated in place by `refresh_inboxes`.
+
+    It behaves like a sequence so it can be handed to the DRF paginators.
+    """
+
+    def __init__(self, user_id, client=None):
+        self.user_id = user_id
+        self.client = client or get_redis_client()
+        self.rooms_key = get_user_chat_room_cache_key(user_id)
+        self.summaries_key = get_user_chat_room_summaries_cache_key(user_id)
+        self.built_key = get_user_chat_room_built_cache_key(user_id)
+
+    @staticmethod
+    def get_member(membership_id):
+        # Zero padded ids sort like the database "-id" tie breaker
+        return f"{membership_id:020d}"
+
+    @staticmethod
+    def get_score(last_message_at):
+        if not last_message_at:
+            return 0
+        return last_message_at.timestamp()
+
+    @staticmethod
+    def get_summary_rows(memberships, *extra_fields):
+        """Render the memberships summaries with the compiled list serializer."""
+        from chat.rest.serializers.chat_rooms import ChatRoomMembershipListSerializer
+
+        compiled = CompiledSerializer(ChatRoomMembershipListSerializer)
+        rows = list(
+            compiled.get_queryset(
+                memberships, "user_id", "last_message_at", *extra_fields
+            )
+        )
+        return zip(rows, compiled.serialize_rows(rows))
+
+    def is_built(self):
+        return bool(self.client.exists(self.built_key))
+
+    def build(self, memberships):
+        """Replace the inbox with the given memberships."""
+        timeout = getattr(settings, "CACHE_TTL", 60 * 15)
+        rooms, summaries = {}, {}
+        for row, summary in self.get_summary_rows(memberships):
+            member = self.get_member(row["pk"])
+            rooms[member] = self.get_score(row["last_message_at"])
+            summaries[member] = json.dumps(summary, cls=JSONEncoder)
+
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.delete(self.rooms_key, self.summaries_key)
+        if rooms:
+            pipeline.zadd(self.rooms_key, rooms)
+            pipeline.hset(self.summaries_key, mapping=summaries)
+            pipeline.expire(self.rooms_key, timeout)
+            pipeline.expire(self.summaries_key, timeout)
+        pipeline.set(self.built_key, 1, ex=timeout)
+        pipeline.execute()
+
+    def upsert(self, row, summary, pipeline):
+        member = self.get_member(row["pk"])
+        score = self.get_score(row["last_message_at"])
+        pipeline.zadd(self.rooms_key, {member: score})
+        pipeline.hset(
+            self.summaries_key, member, json.dumps(summary, cls=JSONEncoder)
+        )
+
+    def remove(self, membership_id, pipeline):
+        member = self.get_member(membership_id)
+        pipeline.zrem(self.rooms_key, member)
+        pipeline.hdel(self.summaries_key, member)
+
+    def count(self):
+        return self.client.zcard(self.rooms_key)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step:
+            raise TypeError("UserInbox only supports slicing without a step.")
+
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else 0
+        if stop <= start:
+            return []
+
+        members = self.client.zrevrange(self.rooms_key, start, stop - 1)
+        if not members:
+            return []
+
+        summaries = self.client.hmget(self.summaries_key, members)
+        return [json.loads(summary) for summary in summaries if summary]
+
+
+def refresh_inboxes(memberships):
+    """
+    Update the inbox entries of the given memberships once the current
+    transaction commits. Only inboxes that are already built are touched,
+    the others are built on their next read. Private chats hidden by a
+    block are removed instead.
+    """
+    from chat.models import ChatRoomMembership
+
+    def refresh():
+        client = get_redis_client()
+        summary_rows = list(
+            UserInbox.get_summary_rows(
+                memberships.annotate(
+                    is_hidden=ChatRoomMembership.get_blocked_chat_filter()
+                ),
+                "is_hidden",
+            )
+        )
+        if not summary_rows:
+            return
+
+        inboxes = [
+            UserInbox(row["user_id"], client=client) for row, _ in summary_rows
+        ]
+        pipeline = client.pipeline(transaction=False)
+        for inbox in inboxes:
+            pipeline.exists(inbox.built_key)
+        is_built = pipeline.execute()
+
+        pipeline = client.pipeline(transaction=False)
+        for (row, summary), inbox, built in zip(summary_rows, inboxes, is_built):
+            if built and row["is_hidden"]:
+                inbox.remove(row["pk"], pipeline)
+            elif built:
+                inbox.upsert(row, summary, pipeline)
+        pipeline.execute()
+
+    transaction.on_commit(refresh)
+
+
+def remove_from_inboxes(memberships):
+    """
+    Remove the given (membership id, user id) pairs from the inboxes of
+    their users once the current transaction commits.
+    """
+
+    def remove():
+        client = get_redis_client()
+        pipeline = client.pipeline(transaction=False)
+        for membership_id, user_id in memberships:
+            UserInbox(user_id, client=client).remove(membership_id, pipeline)
+        pipeline.execute()
+
+    if memberships:
+        transaction.on_commit(remove)
@@ -1,24 +1,145 @@
-from .utils import validate_token, get_token_from_scope
+import time
+import asyncio
+import weakref
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .utils import get_token_claims, get_token_from_scope
+
+from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
 
+from shared.services import ExpiringLRUCache
+
+
+User = get_user_model()
+
+
+class TokenCache(ExpiringLRUCache):
+    """
+    LRU cache of the user ids of verified tokens.
+
+    Entries are dropped when the token expires or after the TTL, whichever
+    comes first, so a cached token is never accepted past its expiry.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        super().__init__(
+            max_size=max_size or getattr(settings, "JWT_TOKEN_CACHE_SIZE", 10000),
+            ttl=ttl or getattr(settings, "JWT_TOKEN_CACHE_TTL", 60 * 5),
+        )
+
+
+class UserLoader:
+    """
+    Loads the users of concurrent handshakes with one query.
+
+    Users requested while a query runs are collected and loaded together
+    by the next one.
+    """
+
+    def __init__(self):
+        self.pending = {}
+
+    async def load(self, user_id):
+        if user_id not in self.pending:
+            loop = asyncio.get_running_loop()
+            if not self.pending:
+                loop.call_soon(lambda: asyncio.ensure_future(self.flush()))
+            self.pending[user_id] = loop.create_future()
+
+        return await asyncio.shield(self.pending[user_id])
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        try:
+            users = await database_sync_to_async(User.objects.in_bulk)(list(pending))
+        except Exception as error:
+            for future in pending.values():
+                future.set_exception(error)
+            return
+
+        for user_id, future in pending.items():
+            future.set_result(users.get(user_id))
+
+
+_user_loaders = weakref.WeakKeyDictionary()
+
+
+def get_user_loader():
+    """Return the user loader of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _user_loaders:
+        _user_loaders[loop] = UserLoader()
+    return _user_loaders[loop]
+
 
 class JWTAuthMiddleware(BaseMiddleware):
+    token_cache = TokenCache()
+    metrics = {
+        "token_cache_hits": 0,
+        "token_cache_misses": 0,
+        "handshakes": 0,
+        "handshake_seconds": 0.0,
+        "handshake_max_seconds": 0.0,
+    }
 
     async def __call__(self, scope, receive, send):
+        started_at = time.perf_counter()
 
         token = get_token_from_scope(scope)
 
         if token:
             # Validate the token
-            user_id = validate_token(token)
+            user_id = self.get_user_id(token)
 
             if user_id:
-                scope["user_id"] = user_id
+                user = await get_user_loader().load(user_id)
+                if user:
+                    scope["user_id"] = user_id
+                    scope["user"] = user
+                else:
+                    scope["error"] = "User not found."
             else:
                 scope["error"] = "Token is invalid or expired"
 
         else:
             scope["error"] = "Provide an access token in the headers."
 
+        self.record_handshake(time.perf_counter() - started_at)
+
         return await super().__call__(scope, receive, send)
+
+    def get_user_id(self, token):
+        # Only the signature check of unseen tokens is paid for
+        user_id = self.token_cache.get(token)
+        if user_id:
+            self.metrics["token_cache_hits"] += 1
+            return user_id
+
+        self.metrics["token_cache_misses"] += 1
+        claims = get_token_claims(token)
+        if not claims or not claims.get("user_id"):
+            return None
+
+        self.token_cache.set(token, claims["user_id"], expires_at=claims["exp"])
+        return claims["user_id"]
+
+    @classmethod
+    def record_handshake(cls, seconds):
+        cls.metrics["handshakes"] += 1
+        cls.metrics["handshake_seconds"] += seconds
+        cls.metrics["handshake_max_seconds"] = max(
+            cls.metrics["handshake_max_seconds"], seconds
+        )
+
+    @classmethod
+    def get_metrics(cls):
+        """Counters of the worker since it started."""
+        metrics = dict(cls.metrics)
+        handshakes = metrics["handshakes"]
+        metrics["handshake_average_seconds"] = (
+            metrics["handshake_seconds"] / handshakes if handshakes else 0
+        )
+        return metrics
@@ -0,0 +1,322 @@
+import json
+import time
+import bisect
+import logging
+import asyncio
+import hashlib
+import contextlib
+
+from channels_redis.core import RedisChannelLayer
+
+
+logger = logging.getLogger(__name__)
+
+
+class HashRing:
+    """
+    Consistent hash ring over the given nodes.
+
+    Every node is placed on the ring many times, so values are spread
+    evenly and adding or removing a node only moves the values of its
+    own arcs instead of reshuffling every value as a modulo would.
+    """
+
+    def __init__(self, nodes, replicas=160):
+        points = sorted(
+            (self.hash(f"{node}:{replica}"), index)
+            for index, node in enumerate(nodes)
+            for replica in range(replicas)
+        )
+        self.points = [point for point, _ in points]
+        self.indexes = [index for _, index in points]
+
+    @staticmethod
+    def hash(value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        return int.from_bytes(hashlib.md5(value).digest()[:8], "big")
+
+    def get_index(self, value):
+        """Return the index of the node owning the value."""
+        position = bisect.bisect(self.points, self.hash(value))
+        return self.indexes[position % len(self.points)]
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """
+    Redis channel layer spreading groups and process channels over its
+    hosts with a consistent hash ring.
+
+    The ring is keyed by the host itself rather than its position in the
+    list, so hosts can be added or reordered and only the groups of the
+    affected arcs move, which `rebalance` then copies to their new shard.
+    Each shard keeps operation, error and latency counters.
+    """
+
+    def __init__(self, *args, ring_replicas=160, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ring = HashRing(
+            [json.dumps(host, sort_keys=True, default=str) for host in self.hosts],
+            replicas=ring_replicas,
+        )
+        self.shard_metrics = [
+            {"operations": 0, "errors": 0, "seconds": 0.0, "last_error": None}
+            for _ in self.hosts
+        ]
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        return self.ring.get_index(value)
+
+    @contextlib.contextmanager
+    def record(self, index):
+        metrics = self.shard_metrics[index]
+        started_at = time.perf_counter()
+        try:
+            yield
+        except Exception as error:
+            metrics["errors"] += 1
+            metrics["last_error"] = repr(error)
+            raise
+        finally:
+            metrics["operations"] += 1
+            metrics["seconds"] += time.perf_counter() - started_at
+
+    async def group_add(self, group, channel):
+        with self.record(self.consistent_hash(group)):
+            await super().group_add(group, channel)
+
+    async def group_discard(self, group, channel):
+        with self.record(self.consistent_hash(group)):
+            await super().group_discard(group, channel)
+
+    async def group_send(self, group, message):
+        with self.record(self.consistent_hash(group)):
+            await super().group_send(group, message)
+
+    def get_host_name(self, index):
+        host = self.hosts[index]
+        return host.get("address", str(host)) if isinstance(host, dict) else str(host)
+
+    def get_shard_metrics(self):
+        """Counters of the operations this process ran on every shard."""
+        return [
+            {
+                "host": self.get_host_name(index),
+                "operations": metrics["operations"],
+                "errors": metrics["errors"],
+                "seconds": metrics["seconds"],
+            }
+            for index, metrics in enumerate(self.shard_metrics)
+        ]
+
+    async def get_shard_health(self, timeout=1):
+        """Ping every shard and return its health along with its counters."""
+        health = []
+        for index in range(len(self.hosts)):
+            started_at = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.connection(index).ping(), timeout)
+                healthy, error = True, None
+            except Exception as exception:
+                healthy, error = False, repr(exception)
+
+            metrics = self.shard_metrics[index]
+            health.append(
+                {
+                    "host": self.get_host_name(index),
+                    "healthy": healthy,
+                    "ping_seconds": time.perf_counter() - started_at,
+                    "error": error,
+                    **metrics,
+                    "average_seconds": (
+                        metrics["seconds"] / metrics["operations"]
+                        if metrics["operations"]
+                        else 0
+                    ),
+                }
+            )
+        return health
+
+    async def rebalance(self, batch_size=500):
+        """
+        Move every group stored on a shard that no longer owns it, after
+        hosts were added or removed. Return the number of groups moved.
+        """
+        group_prefix = self._group_key("")
+        moved = 0
+        for index in range(self.ring_size):
+            connection = self.connection(index)
+            async for key in connection.scan_iter(
+                match=group_prefix + b"*", count=batch_size
+            ):
+                group = key[len(group_prefix) :].decode("utf-8")
+                owner = self.consistent_hash(group)
+                if owner == index:
+                    continue
+
+                channels = await connection.zrange(key, 0, -1, withscores=True)
+                if channels:
+                    target = self.connection(owner)
+                    await target.zadd(key, dict(channels))
+                    await target.expire(key, self.group_expiry)
+                await connection.delete(key)
+                moved += 1
+
+        return moved
+
+
+class HybridChannelLayer(ShardedRedisChannelLayer):
+    """
+    Sharded Redis channel layer that hands messages for channels of the
+    current process straight to their receive buffer.
+
+    Group membership still lives in Redis so other processes can reach
+    the local channels, but a group message is only pushed to Redis for
+    the members attached to other processes. On a single process
+    deployment a group send costs one membership read and no writes.
+    """
+
+    group_send_lua = """
+        local over_capacity = 0
+        local current_time = ARGV[#ARGV - 1]
+        local expiry = ARGV[#ARGV]
+        for i=1,#KEYS do
+            local capacity = tonumber(ARGV[i + #KEYS])
+            if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < capacity then
+                redis.call('ZADD', KEYS[i], current_time, ARGV[i])
+                redis.call('EXPIRE', KEYS[i], expiry)
+            else
+                over_capacity = over_capacity + 1
+            end
+        end
+        return over_capacity
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # One task per process channel reads it from Redis into the receive
+        # buffers, so local deliveries never wait behind a blocked BRPOP
+        self.pumps = {}
+        self.delivery_metrics = {
+            "local_deliveries": 0,
+            "remote_deliveries": 0,
+            "local_group_sends": 0,
+            "remote_group_sends": 0,
+        }
+
+    def is_local(self, channel):
+        return f".{self.client_prefix}!" in channel
+
+    def deliver_locally(self, channels, message):
+        # One copy for every local member, like a message read from Redis
+        message = dict(message)
+        for channel in channels:
+            self.receive_buffer[channel].put_nowait(message)
+        self.delivery_metrics["local_deliveries"] += len(channels)
+
+    async def send(self, channel, message):
+        if self.is_local(channel):
+            self.deliver_locally([channel], message)
+            return
+        self.delivery_metrics["remote_deliveries"] += 1
+        await super().send(channel, message)
+
+    async def receive(self, channel):
+        if not self.is_local(channel):
+            return await super().receive(channel)
+
+        self.start_pump(self.non_local_name(channel))
+        receive_buffer = self.receive_buffer[channel]
+        try:
+            return await receive_buffer.get()
+        finally:
+            if receive_buffer.empty():
+                self.receive_buffer.pop(channel, None)
+
+    def start_pump(self, real_channel):
+        pump = self.pumps.get(real_channel)
+        if pump is None or pump.done():
+            self.pumps[real_channel] = asyncio.ensure_future(self.pump(real_channel))
+
+    async def pump(self, real_channel):
+        """Read the messages of a process channel into the receive buffers."""
+        while True:
+            try:
+                message_channel, message = await self.receive_single(real_channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cannot read the channel %s", real_channel)
+                await asyncio.sleep(1)
+                continue
+
+            if isinstance(message_channel, list):
+                for channel in message_channel:
+                    self.receive_buffer[channel].put_nowait(message)
+            else:
+                self.receive_buffer[message_channel].put_nowait(message)
+
+    async def close_pools(self):
+        for pump in self.pumps.values():
+            pump.cancel()
+        self.pumps.clear()
+        await super().close_pools()
+
+    async def group_send(self, group, message):
+        assert self.valid_group_name(group), "Group name not valid"
+        index = self.consistent_hash(group)
+
+        with self.record(index):
+            # Drop the expired members and read the others in one round trip
+            key = self._group_key(group)
+            pipeline = self.connection(index).pipeline(transaction=False)
+            pipeline.zremrangebyscore(
+                key, min=0, max=int(time.time()) - self.group_expiry
+            )
+            pipeline.zrange(key, 0, -1)
+            _, members = await pipeline.execute()
+
+            local_channels, remote_channels = [], []
+            for member in members:
+                channel = member.decode("utf8")
+                if self.is_local(channel):
+                    local_channels.append(channel)
+                else:
+                    remote_channels.append(channel)
+
+            if remote_channels:
+                self.delivery_metrics["remote_group_sends"] += 1
+                await self.send_to_channels(remote_channels, message)
+            else:
+                self.delivery_metrics["local_group_sends"] += 1
+
+            self.deliver_locally(local_channels, message)
+
+    async def send_to_channels(self, channels, message):
+        """Push a message to channels of other processes, one script per shard."""
+        (
+            connection_to_channel_keys,
+            channel_keys_to_message,
+            channel_keys_to_capacity,
+        ) = self._map_channel_keys_to_connection(channels, message)
+
+        for index, channel_keys in connection_to_channel_keys.items():
+            args = [channel_keys_to_message[key] for key in channel_keys]
+            args += [channel_keys_to_capacity[key] for key in channel_keys]
+            args += [time.time(), self.expiry]
+            await self.connection(index).eval(
+                self.group_send_lua, len(channel_keys), *channel_keys, *args
+            )
+
+        self.delivery_metrics["remote_deliveries"] += len(channels)
+
+    def get_delivery_metrics(self):
+        """Deliveries made in process and through Redis since the start."""
+        metrics = dict(self.delivery_metrics)
+        deliveries = metrics["local_deliveries"] + metrics["remote_deliveries"]
+        metrics["local_ratio"] = (
+            metrics["local_deliveries"] / deliveries if deliveries else 0
+        )
+        return metrics
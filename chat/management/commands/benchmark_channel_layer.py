@@ -0,0 +1,158 @@
+import os
+import time
+import uuid
+import asyncio
+import multiprocessing
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.layers import ShardedRedisChannelLayer
+
+
+def publish(hosts, prefix, groups, messages, concurrency, barrier):
+    """Send group messages from a publisher process once every one is ready."""
+
+    async def run():
+        channel_layer = ShardedRedisChannelLayer(
+            hosts=hosts, prefix=prefix, capacity=10**6
+        )
+        semaphore = asyncio.Semaphore(concurrency)
+        event = {"type": "chat_message", "message": "x" * 200}
+
+        async def send(index):
+            async with semaphore:
+                await channel_layer.group_send(groups[index % len(groups)], event)
+
+        # Connect to every shard before the clock starts
+        for index in range(channel_layer.ring_size):
+            await channel_layer.connection(index).ping()
+        await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+        await asyncio.gather(*(send(index) for index in range(messages)))
+        await channel_layer.close_pools()
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the group fan-out throughput of the sharded channel layer "
+        "with 1 to N of the given hosts, sending from one publisher process "
+        "per shard unless --processes is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hosts",
+            default=",".join(settings.CHANNEL_LAYER_HOSTS),
+            help="Comma separated redis URLs, defaults to CHANNEL_LAYER_HOSTS.",
+        )
+        parser.add_argument("--groups", type=int, default=200)
+        parser.add_argument("--members", type=int, default=20)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument(
+            "--messages", type=int, default=5000, help="Messages per process."
+        )
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument(
+            "--processes",
+            type=int,
+            help="Publisher processes, defaults to the number of shards.",
+        )
+
+    def handle(self, *args, **options):
+        hosts = options["hosts"].split(",")
+        cpus = os.cpu_count()
+        self.stdout.write(f"{cpus} CPU(s) shared with the redis servers")
+        if cpus < 2 * len(hosts):
+            self.stdout.write(
+                self.style.WARNING(
+                    "Fewer CPUs than publishers and shards, the throughput "
+                    "cannot grow with the shards on this machine."
+                )
+            )
+
+        baseline = None
+        for shards in range(1, len(hosts) + 1):
+            processes = options["processes"] or shards
+            deliveries_per_second, shard_seconds = self.run(
+                hosts[:shards], processes, options
+            )
+            baseline = baseline or deliveries_per_second
+            self.stdout.write(
+                f"{shards} shard(s), {processes} process(es): "
+                f"{deliveries_per_second:,.0f} deliveries/s "
+                f"({deliveries_per_second / baseline:.2f}x), redis time per shard "
+                f"{', '.join(f'{seconds:.3f}s' for seconds in shard_seconds)}"
+            )
+
+    def run(self, hosts, processes, options):
+        prefix = f"benchmark_{uuid.uuid4().hex}"
+        groups = [f"benchmark_room_{index}" for index in range(options["groups"])]
+        redis_seconds = async_to_sync(self.setup)(hosts, prefix, groups, options)
+
+        # Forked publishers share nothing but the barrier releasing them
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(processes + 1)
+        publishers = [
+            context.Process(
+                target=publish,
+                args=(
+                    hosts,
+                    prefix,
+                    groups,
+                    options["messages"],
+                    options["concurrency"],
+                    barrier,
+                ),
+            )
+            for _ in range(processes)
+        ]
+        for publisher in publishers:
+            publisher.start()
+        barrier.wait()
+        started_at = time.perf_counter()
+        for publisher in publishers:
+            publisher.join()
+        elapsed = time.perf_counter() - started_at
+
+        shard_seconds = [
+            after - before
+            for before, after in zip(
+                redis_seconds, async_to_sync(self.teardown)(hosts, prefix)
+            )
+        ]
+        deliveries = processes * options["messages"] * options["members"]
+        return deliveries / elapsed, shard_seconds
+
+    async def get_redis_seconds(self, channel_layer):
+        """Seconds every shard spent running commands since it started."""
+        seconds = []
+        for index in range(channel_layer.ring_size):
+            stats = await channel_layer.connection(index).info("commandstats")
+            seconds.append(sum(stat["usec"] for stat in stats.values()) / 10**6)
+        return seconds
+
+    async def setup(self, hosts, prefix, groups, options):
+        channel_layer = ShardedRedisChannelLayer(hosts=hosts, prefix=prefix)
+
+        # Members of every room are spread over the process channels of the
+        # workers, each worker receives one copy of a group message
+        workers = [uuid.uuid4().hex for _ in range(options["workers"])]
+        for group in groups:
+            for index in range(options["members"]):
+                worker = workers[index % len(workers)]
+                channel = f"specific.{worker}!{uuid.uuid4().hex}"
+                await channel_layer.group_add(group, channel)
+
+        redis_seconds = await self.get_redis_seconds(channel_layer)
+        await channel_layer.close_pools()
+        return redis_seconds
+
+    async def teardown(self, hosts, prefix):
+        channel_layer = ShardedRedisChannelLayer(hosts=hosts, prefix=prefix)
+        redis_seconds = await self.get_redis_seconds(channel_layer)
+        await channel_layer.flush()
+        await channel_layer.close_pools()
+        return redis_seconds
@@ -0,0 +1,158 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from chat.models import (
+    Attachment,
+    ChatRoom,
+    ChatRoomInvitation,
+    ChatRoomMembership,
+    Message,
+    MessageReaction,
+)
+from chat.rest.serializers.compiled import CompiledSerializer
+from chat.rest.serializers.messages import MessageSerializer
+from chat.rest.serializers.chat_rooms import (
+    ChatRoomInvitationSerializer,
+    ChatRoomMembershipListSerializer,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of the DRF serializers and their compiled form "
+        "on pages of rows. Rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        repeat = options["repeat"]
+
+        with transaction.atomic():
+            querysets = self.create_rows(rows)
+
+            for serializer_class, queryset in querysets:
+                drf_seconds, drf_json = self.measure(
+                    repeat, lambda: self.render_drf(serializer_class, queryset)
+                )
+                compiled_seconds, compiled_json = self.measure(
+                    repeat, lambda: self.render_compiled(serializer_class, queryset)
+                )
+                if drf_json != compiled_json:
+                    raise CommandError(
+                        f"{serializer_class.__name__} compiled output differs."
+                    )
+
+                self.stdout.write(
+                    f"{serializer_class.__name__}: "
+                    f"DRF {rows / drf_seconds:,.0f} rows/s, "
+                    f"compiled {rows / compiled_seconds:,.0f} rows/s "
+                    f"({drf_seconds / compiled_seconds:.1f}x) per {rows} row page"
+                )
+
+            transaction.set_rollback(True)
+
+    def measure(self, repeat, render):
+        best, output = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = render()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
+
+    def render_drf(self, serializer_class, queryset):
+        queryset = self.get_drf_queryset(serializer_class, queryset)
+        data = serializers.ListSerializer(
+            list(queryset), child=serializer_class(), context={}
+        ).data
+        if serializer_class is MessageSerializer:
+            # read_by is filled in from the watermarks after the compiled render
+            for item in data:
+                item["read_by"] = None
+        return JSONRenderer().render(data)
+
+    def render_compiled(self, serializer_class, queryset):
+        return JSONRenderer().render(
+            CompiledSerializer(serializer_class).serialize(queryset)
+        )
+
+    def get_drf_queryset(self, serializer_class, queryset):
+        if serializer_class is MessageSerializer:
+            return queryset.select_related(
+                "sender", "attachment", "reply_to__sender", "reply_to__attachment"
+            ).prefetch_related("message_reactions__user")
+        if serializer_class is ChatRoomMembershipListSerializer:
+            return queryset.select_related(
+                "user", "chat_room__creator", "chat_room__last_message__sender"
+            )
+        return queryset.select_related("sender", "receiver", "chat_room__creator")
+
+    def create_rows(self, rows):
+        suffix = time.time_ns()
+        users = User.objects.bulk_create(
+            User(
+                username=f"benchmark_{suffix}_{index}",
+                email=f"benchmark_{suffix}_{index}@example.com",
+                first_name="Benchmark",
+                last_name=str(index),
+            )
+            for index in range(rows + 1)
+        )
+        owner, others = users[0], users[1:]
+
+        chat_room = ChatRoom.objects.create(
+            name=f"benchmark_{suffix}", is_group_chat=True, creator=owner
+        )
+        attachment = Attachment.objects.create(emoji_description="benchmark")
+        messages = Message.objects.bulk_create(
+            Message(
+                chat_room=chat_room,
+                sender=others[index],
+                content=f"Benchmark message {index}",
+                attachment=attachment if index % 10 == 0 else None,
+            )
+            for index in range(rows)
+        )
+        MessageReaction.objects.bulk_create(
+            MessageReaction(user=owner, message=message, reaction_type="LIKE")
+            for message in messages[::5]
+        )
+
+        chat_rooms = ChatRoom.objects.bulk_create(
+            ChatRoom(name=f"benchmark_{suffix}_{index}", creator=others[index])
+            for index in range(rows)
+        )
+        ChatRoomMembership.objects.bulk_create(
+            ChatRoomMembership(user=owner, chat_room=room) for room in chat_rooms
+        )
+        ChatRoomInvitation.objects.bulk_create(
+            ChatRoomInvitation(chat_room=room, sender=others[index], receiver=owner)
+            for index, room in enumerate(chat_rooms)
+        )
+
+        return [
+            (
+                MessageSerializer,
+                Message.objects.filter(chat_room=chat_room).order_by("id"),
+            ),
+            (
+                ChatRoomMembershipListSerializer,
+                ChatRoomMembership.objects.filter(user=owner).order_by("id"),
+            ),
+            (
+                ChatRoomInvitationSerializer,
+                ChatRoomInvitation.objects.filter(receiver=owner).order_by("id"),
+            ),
+        ]
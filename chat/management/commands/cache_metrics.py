@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from chat.rest.views.messages import MessageList
+
+
+class Command(BaseCommand):
+    help = "Show the cache hits and misses of the cached list views."
+
+    views = [MessageList]
+
+    def handle(self, *args, **options):
+        for view in self.views:
+            metrics = view.get_cache_metrics()
+            requests = metrics["hits"] + metrics["misses"]
+            hit_ratio = metrics["hits"] / requests if requests else 0
+            self.stdout.write(
+                f"{view.__name__}: {metrics['hits']} hits, "
+                f"{metrics['misses']} misses ({hit_ratio:.1%} hit ratio)"
+            )
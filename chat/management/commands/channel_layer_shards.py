@@ -0,0 +1,57 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.layers import ShardedRedisChannelLayer
+from chat.metrics import get_worker_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the health of every shard of the channel layer and the operations "
+        "the websocket workers ran on it, optionally after moving the groups to "
+        "the shards that own them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebalance",
+            action="store_true",
+            help="Move the groups left on a previous shard after a host change.",
+        )
+
+    def handle(self, *args, **options):
+        channel_layer = get_channel_layer()
+        if not isinstance(channel_layer, ShardedRedisChannelLayer):
+            raise CommandError("The default channel layer is not sharded.")
+
+        async_to_sync(self.run)(channel_layer, options["rebalance"])
+
+    async def run(self, channel_layer, rebalance):
+        if rebalance:
+            moved = await channel_layer.rebalance()
+            self.stdout.write(self.style.SUCCESS(f"Moved {moved} groups."))
+
+        # The counters are kept by every worker, this process has none
+        workers = await sync_to_async(get_worker_metrics)()
+        totals = {}
+        for metrics in workers.values():
+            for shard in metrics.get("channel_layer_shards", []):
+                total = totals.setdefault(
+                    shard["host"], {"operations": 0, "errors": 0, "seconds": 0.0}
+                )
+                for name in total:
+                    total[name] += shard[name]
+
+        for shard in await channel_layer.get_shard_health():
+            status = "healthy" if shard["healthy"] else f"down ({shard['error']})"
+            total = totals.get(shard["host"], {"operations": 0, "errors": 0})
+            average = (
+                total["seconds"] / total["operations"] if total["operations"] else 0
+            )
+            self.stdout.write(
+                f"{shard['host']}: {status}, "
+                f"ping {shard['ping_seconds'] * 1000:.1f}ms, "
+                f"{total['operations']} operations from {len(workers)} worker(s), "
+                f"{total['errors']} errors, {average * 1000:.2f}ms average"
+            )
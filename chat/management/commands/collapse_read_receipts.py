@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from chat.models import Message, ChatRoomMembership
+
+
+class Command(BaseCommand):
+    help = (
+        "Collapse the legacy Message.read_by rows into the read watermark of "
+        "each chat room member."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of watermarks moved or receipts deleted per query.",
+        )
+        parser.add_argument(
+            "--purge",
+            action="store_true",
+            help="Delete the read_by rows once they are collapsed.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        read_by = Message.read_by.through
+
+        newest_read_messages = (
+            read_by.objects.values("user_id", "message__chat_room_id")
+            .annotate(newest_message_id=Max("message_id"))
+            .iterator()
+        )
+
+        read_receipts = []
+        collapsed = 0
+        for newest_read in newest_read_messages:
+            read_receipts.append(
+                (
+                    newest_read["user_id"],
+                    newest_read["message__chat_room_id"],
+                    newest_read["newest_message_id"],
+                )
+            )
+            if len(read_receipts) >= batch_size:
+                collapsed += ChatRoomMembership.bulk_mark_as_read(read_receipts)
+                read_receipts = []
+        collapsed += ChatRoomMembership.bulk_mark_as_read(read_receipts)
+
+        self.stdout.write(f"Moved {collapsed} read watermarks.")
+
+        if not options["purge"]:
+            return
+
+        purged = 0
+        while True:
+            with transaction.atomic():
+                receipt_ids = list(
+                    read_by.objects.values_list("id", flat=True)[:batch_size]
+                )
+                if not receipt_ids:
+                    break
+                purged += read_by.objects.filter(id__in=receipt_ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {purged} read_by rows."))
@@ -0,0 +1,64 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.models import ChatRoom
+from chat.export import NDJSON, EXPORT_FORMATS, export_chat_room
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the history of a chat room as NDJSON or CSV, gzipped unless "
+        "--no-compress is given, with a constant memory use."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("chat_room", help="Uid or name of the chat room.")
+        parser.add_argument("--file-format", choices=EXPORT_FORMATS, default=NDJSON)
+        parser.add_argument(
+            "--output", help="File to write to, defaults to the standard output."
+        )
+        parser.add_argument("--no-compress", action="store_true")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            help="Messages read per query, defaults to EXPORT_CHUNK_SIZE.",
+        )
+
+    def handle(self, *args, **options):
+        chat_room = self.get_chat_room(options["chat_room"])
+        chunks = export_chat_room(
+            chat_room,
+            options["file_format"],
+            compress=not options["no_compress"],
+            chunk_size=options["chunk_size"],
+        )
+
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                size = self.write(chunks, output)
+            self.stderr.write(
+                self.style.SUCCESS(f"Wrote {size} bytes to {options['output']}.")
+            )
+        else:
+            self.write(chunks, sys.stdout.buffer)
+
+    def get_chat_room(self, value):
+        chat_room = ChatRoom.objects.filter(name=value).first()
+        if chat_room is None:
+            try:
+                chat_room = ChatRoom.objects.filter(uid=value).first()
+            except ValidationError:
+                chat_room = None
+        if chat_room is None:
+            raise CommandError(f"Chat room {value} not found.")
+        return chat_room
+
+    def write(self, chunks, output):
+        size = 0
+        for chunk in chunks:
+            output.write(chunk)
+            size += len(chunk)
+        output.flush()
+        return size
@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand
+
+from chat.metrics import get_worker_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the channel layer deliveries, the websocket outboxes, the "
+        "handshake authentication and admission and the ephemeral events "
+        "published by every websocket worker."
+    )
+
+    def handle(self, *args, **options):
+        workers = get_worker_metrics()
+        if not workers:
+            self.stdout.write("No worker published its metrics recently.")
+            return
+
+        deliveries = {"local_deliveries": 0, "remote_deliveries": 0}
+        outbox = {
+            "connections": 0,
+            "queued_frames": 0,
+            "max_depth": 0,
+            "dropped_frames": 0,
+            "slow_disconnects": 0,
+        }
+        authentication = {
+            "token_cache_hits": 0,
+            "token_cache_misses": 0,
+            "handshakes": 0,
+            "handshake_seconds": 0.0,
+            "handshake_max_seconds": 0.0,
+        }
+        admission = {"rejected": 0, "in_flight": 0}
+        ephemeral = {
+            "received_events": 0,
+            "rate_limited_events": 0,
+            "coalesced_events": 0,
+            "broadcasts": 0,
+        }
+        for worker, metrics in sorted(workers.items()):
+            if "channel_layer" in metrics:
+                for name in deliveries:
+                    deliveries[name] += metrics["channel_layer"][name]
+                self.write_deliveries(worker, metrics["channel_layer"])
+            if "outbox" in metrics:
+                for name in outbox:
+                    if name == "max_depth":
+                        outbox[name] = max(outbox[name], metrics["outbox"][name])
+                    else:
+                        outbox[name] += metrics["outbox"][name]
+                self.write_outbox(worker, metrics["outbox"])
+            if "authentication" in metrics:
+                for name in authentication:
+                    if name == "handshake_max_seconds":
+                        authentication[name] = max(
+                            authentication[name], metrics["authentication"][name]
+                        )
+                    else:
+                        authentication[name] += metrics["authentication"][name]
+                self.write_authentication(worker, metrics["authentication"])
+            if "admission" in metrics:
+                for name in admission:
+                    admission[name] += metrics["admission"][name]
+                self.write_admission(worker, metrics["admission"])
+            if "ephemeral" in metrics:
+                for name in ephemeral:
+                    ephemeral[name] += metrics["ephemeral"][name]
+                self.write_ephemeral(worker, metrics["ephemeral"])
+
+        self.write_deliveries("total", deliveries)
+        self.write_outbox("total", outbox)
+        self.write_authentication("total", authentication)
+        self.write_admission("total", admission)
+        self.write_ephemeral("total", ephemeral)
+
+    def write_deliveries(self, name, deliveries):
+        local, remote = deliveries["local_deliveries"], deliveries["remote_deliveries"]
+        local_ratio = local / (local + remote) if local + remote else 0
+        self.stdout.write(
+            f"{name}: {local} local deliveries, {remote} through redis "
+            f"({local_ratio:.1%} local)"
+        )
+
+    def write_outbox(self, name, outbox):
+        self.stdout.write(
+            f"{name}: {outbox['queued_frames']} frames queued for "
+            f"{outbox['connections']} connections (deepest {outbox['max_depth']}), "
+            f"{outbox['dropped_frames']} dropped frames, "
+            f"{outbox['slow_disconnects']} slow disconnects"
+        )
+
+    def write_authentication(self, name, authentication):
+        handshakes = authentication["handshakes"]
+        average = authentication["handshake_seconds"] / handshakes if handshakes else 0
+        hits = authentication["token_cache_hits"]
+        lookups = hits + authentication["token_cache_misses"]
+        self.stdout.write(
+            f"{name}: {handshakes} handshakes, {average * 1000:.2f}ms average "
+            f"(slowest {authentication['handshake_max_seconds'] * 1000:.2f}ms), "
+            f"{hits / lookups if lookups else 0:.1%} token cache hits"
+        )
+
+    def write_admission(self, name, admission):
+        self.stdout.write(
+            f"{name}: {admission['rejected']} handshakes rejected, "
+            f"{admission['in_flight']} in flight"
+        )
+
+    def write_ephemeral(self, name, ephemeral):
+        self.stdout.write(
+            f"{name}: {ephemeral['received_events']} ephemeral events, "
+            f"{ephemeral['coalesced_events']} coalesced, "
+            f"{ephemeral['rate_limited_events']} dropped by the rate limit, "
+            f"{ephemeral['broadcasts']} broadcasts"
+        )
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+
+from chat.models import Message, ChatRoomMembership
+
+
+logger = logging.getLogger(__name__)
+
+
+class PendingMessage:
+    def __init__(self, message, read_by_user_ids, group_name, future):
+        self.message = message
+        self.read_by_user_ids = read_by_user_ids
+        self.group_name = group_name
+        self.future = future
+
+
+class MessageWriteBuffer:
+    """
+    Write-behind buffer for the messages received over websockets.
+
+    Consumers broadcast a message as soon as it is received and hand it to
+    the buffer, which saves every message received within the flush
+    interval, or up to the max size, with one bulk insert. The future
+    returned by `add` resolves once the message is saved, so consumers can
+    acknowledge it to the sender.
+    """
+
+    def __init__(self, flush_interval=None, max_size=None):
+        self.flush_interval = flush_interval or getattr(
+            settings, "MESSAGE_BUFFER_FLUSH_INTERVAL", 0.005
+        )
+        self.max_size = max_size or getattr(settings, "MESSAGE_BUFFER_MAX_SIZE", 100)
+        self.pending = []
+        self.flush_handle = None
+
+    def add(self, message, read_by_user_ids=(), group_name=None):
+        """
+        Queue an unsaved message, along with the users who already read it
+        and the group it was broadcast to.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append(
+            PendingMessage(message, list(read_by_user_ids), group_name, future)
+        )
+
+        if len(self.pending) >= self.max_size:
+            self.schedule_flush(delay=0)
+        elif self.flush_handle is None:
+            self.schedule_flush(delay=self.flush_interval)
+
+        return future
+
+    def schedule_flush(self, delay):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self.flush_handle = loop.call_later(
+            delay, lambda: asyncio.ensure_future(self.flush())
+        )
+
+    async def flush(self):
+        self.flush_handle = None
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+
+        try:
+            results = await database_sync_to_async(self.persist)(pending)
+        except Exception as error:
+            logger.exception("Message batch could not be saved.")
+            results = [error] * len(pending)
+
+        for item, result in zip(pending, results):
+            if item.future.done():
+                continue
+            if isinstance(result, Exception):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+        await self.send_sequences(pending, results)
+
+    async def send_sequences(self, pending, results):
+        """
+        Tell every group the sequence number of its newest saved message,
+        which its members resume from after a reconnect. Messages are
+        broadcast before they are saved, so they do not carry it themselves.
+        """
+        last_seqs = {}
+        for item, result in zip(pending, results):
+            if item.group_name and not isinstance(result, Exception):
+                last_seq = last_seqs.get(item.group_name, 0)
+                last_seqs[item.group_name] = max(last_seq, result.seq)
+
+        channel_layer = get_channel_layer()
+        for group_name, last_seq in last_seqs.items():
+            try:
+                await channel_layer.group_send(
+                    group_name, {"type": "message_sequence", "last_seq": last_seq}
+                )
+            except Exception:
+                logger.exception("Sequence of %s could not be sent.", group_name)
+
+    @classmethod
+    def persist(cls, pending):
+        """
+        Save the pending messages and their read receipts in one transaction,
+        falling back to one transaction per message when the batch fails so a
+        single bad message does not fail the others.
+
+        Return the saved message or the error for each pending message.
+        """
+        try:
+            return cls.persist_batch(pending)
+        except IntegrityError:
+            logger.warning("Message batch failed, saving messages one by one.")
+
+        results = []
+        for item in pending:
+            try:
+                results.extend(cls.persist_batch([item]))
+            except Exception as error:
+                logger.exception("Message %s could not be saved.", item.message.uid)
+                results.append(error)
+        return results
+
+    @staticmethod
+    def persist_batch(pending):
+        with transaction.atomic():
+            messages = Message.create_messages([item.message for item in pending])
+
+            # Keep the newest message read by each user in each chat room
+            read_receipts = {}
+            for item, message in zip(pending, messages):
+                for user_id in item.read_by_user_ids:
+                    read_receipts[(user_id, message.chat_room_id)] = message.id
+
+            if read_receipts:
+                ChatRoomMembership.bulk_mark_as_read(
+                    [
+                        (user_id, chat_room_id, message_id)
+                        for (user_id, chat_room_id), message_id in read_receipts.items()
+                    ]
+                )
+
+        return messages
+
+
+_buffers = weakref.WeakKeyDictionary()
+
+
+def get_message_buffer():
+    """Return the write buffer of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _buffers:
+        _buffers[loop] = MessageWriteBuffer()
+    return _buffers[loop]
@@ -0,0 +1,60 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from chat.models import Message
+from chat.rest.serializers.compiled import CompiledSerializer
+
+from shared.cache_key import get_message_payload_cache_key
+
+
+def render_messages(messages, serializer):
+    """
+    Render messages from their cached JSON payloads.
+
+    The payload of a message is cached under its uid and version, so it is
+    only serialized again after an edit, a reaction or an attachment change
+    bumped the version. Payloads are fetched with one multi-get and only the
+    missing ones are rendered, through the compiled form of the serializer.
+    `read_by` is derived from the read watermarks and is filled in on every
+    render.
+
+    `messages` only need their id, uid, version and chat room loaded.
+    """
+    cache_keys = {
+        message.id: get_message_payload_cache_key(message.uid, message.version)
+        for message in messages
+    }
+    payloads = cache.get_many(cache_keys.values())
+
+    missing_ids = [
+        message_id
+        for message_id, cache_key in cache_keys.items()
+        if cache_key not in payloads
+    ]
+    if missing_ids:
+        compiled = CompiledSerializer(serializer.__class__, serializer.context)
+        rows = list(compiled.get_queryset(Message.objects.filter(id__in=missing_ids)))
+        rendered = {
+            cache_keys[row["pk"]]: json.dumps(payload, cls=JSONEncoder)
+            for row, payload in zip(rows, compiled.serialize_rows(rows))
+        }
+
+        cache.set_many(rendered, timeout=getattr(settings, "CACHE_TTL", 60 * 15))
+        payloads.update(rendered)
+
+    data = []
+    for message in messages:
+        # Messages deleted since the page was read have nothing to render
+        payload = payloads.get(cache_keys[message.id])
+        if payload is None:
+            continue
+
+        payload = json.loads(payload)
+        payload["read_by"] = serializer.get_read_by(message)
+        data.append(payload)
+
+    return data
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+
+from chat.admission import get_handshake_admission
+from chat.ephemeral import EphemeralCoalescer
+from chat.jwt_middleware import JWTAuthMiddleware
+from chat.consumers.outbox import Outbox
+
+from shared.services import get_redis_client
+from shared.cache_key import get_worker_metrics_cache_key
+
+
+logger = logging.getLogger(__name__)
+
+# Field of the worker in the metrics hash shared by every worker
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_metrics_interval():
+    return getattr(settings, "WORKER_METRICS_INTERVAL", 10)
+
+
+def collect_metrics():
+    """Counters of the current worker, by the component they come from."""
+    metrics = {
+        "outbox": Outbox.get_metrics(),
+        "authentication": JWTAuthMiddleware.get_metrics(),
+        "admission": get_handshake_admission().get_metrics(),
+        "ephemeral": EphemeralCoalescer.get_metrics(),
+    }
+    channel_layer = get_channel_layer()
+    if hasattr(channel_layer, "get_delivery_metrics"):
+        metrics["channel_layer"] = channel_layer.get_delivery_metrics()
+    if hasattr(channel_layer, "get_shard_metrics"):
+        metrics["channel_layer_shards"] = channel_layer.get_shard_metrics()
+    return metrics
+
+
+def publish_metrics(metrics):
+    """
+    Write the counters of the current worker to the metrics hash, where
+    they are kept for a few intervals after the worker stopped.
+    """
+    cache_key = get_worker_metrics_cache_key()
+    metrics = {**metrics, "published_at": time.time()}
+
+    pipeline = get_redis_client().pipeline(transaction=False)
+    pipeline.hset(cache_key, WORKER_ID, json.dumps(metrics))
+    pipeline.expire(cache_key, get_metrics_interval() * 3)
+    pipeline.execute()
+
+
+def get_worker_metrics():
+    """Map every worker that published recently to its counters."""
+    cache_key = get_worker_metrics_cache_key()
+    max_age = get_metrics_interval() * 3
+    now = time.time()
+
+    workers, stale_workers = {}, []
+    for worker, metrics in get_redis_client().hgetall(cache_key).items():
+        metrics = json.loads(metrics)
+        if now - metrics["published_at"] > max_age:
+            stale_workers.append(worker)
+        else:
+            workers[worker.decode("utf-8")] = metrics
+
+    if stale_workers:
+        get_redis_client().hdel(cache_key, *stale_workers)
+    return workers
+
+
+async def publish_metrics_forever():
+    interval = get_metrics_interval()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sync_to_async(publish_metrics)(collect_metrics())
+        except Exception:
+            logger.exception("The worker metrics could not be published.")
+
+
+_publishers = weakref.WeakKeyDictionary()
+
+
+def start_metrics_publisher():
+    """Publish the metrics of the worker every interval, once per event loop."""
+    loop = asyncio.get_running_loop()
+    publisher = _publishers.get(loop)
+    if publisher is None or publisher.done():
+        _publishers[loop] = asyncio.ensure_future(publish_metrics_forever())
@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-17 10:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chatroommembership_has_write_access'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat_room', 'status', 'created_at', 'id'], name='message_room_history_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1 on 2026-10-17 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Q
+from django.utils import timezone
+
+
+def backfill_read_watermarks(apps, schema_editor):
+    """Collapse the read_by rows into the read watermark of each member."""
+    Message = apps.get_model("chat", "Message")
+    ChatRoomMembership = apps.get_model("chat", "ChatRoomMembership")
+
+    newest_read_messages = (
+        Message.read_by.through.objects.values("user_id", "message__chat_room_id")
+        .annotate(newest_message_id=Max("message_id"))
+        .iterator()
+    )
+    for newest_read in newest_read_messages:
+        ChatRoomMembership.objects.filter(
+            user_id=newest_read["user_id"],
+            chat_room_id=newest_read["message__chat_room_id"],
+        ).filter(
+            Q(last_read_message__isnull=True)
+            | Q(last_read_message_id__lt=newest_read["newest_message_id"])
+        ).update(
+            last_read_message_id=newest_read["newest_message_id"],
+            last_read_at=timezone.now(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_room_history_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroommembership',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, help_text='Timestamp indicating when the member last read the chat room.', null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroommembership',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, help_text='Newest message of the chat room read by the member.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.RunPython(backfill_read_watermarks, migrations.RunPython.noop),
+    ]
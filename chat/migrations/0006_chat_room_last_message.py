@@ -0,0 +1,65 @@
+# Generated by Django 5.1 on 2026-10-17 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_last_message(apps, schema_editor):
+    """Fill the last message and unread counters of existing chat rooms."""
+    ChatRoom = apps.get_model("chat", "ChatRoom")
+    ChatRoomMembership = apps.get_model("chat", "ChatRoomMembership")
+    Message = apps.get_model("chat", "Message")
+
+    for chat_room in ChatRoom.objects.iterator():
+        messages = Message.objects.filter(chat_room=chat_room, status="ACTIVE")
+        last_message = messages.order_by("-id").first()
+        if not last_message:
+            continue
+
+        chat_room.last_message = last_message
+        chat_room.last_message_at = last_message.created_at
+        chat_room.save(update_fields=["last_message", "last_message_at"])
+
+        for membership in ChatRoomMembership.objects.filter(chat_room=chat_room):
+            membership.last_message_at = last_message.created_at
+            membership.unread_count = messages.filter(
+                id__gt=membership.last_read_message_id or 0
+            ).count()
+            membership.save(update_fields=["last_message_at", "unread_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_chatroommembership_read_watermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, help_text='Newest message sent in the chat room.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Timestamp of the newest message sent in the chat room.', null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroommembership',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, help_text='Copy of the chat room last message timestamp to sort the inbox.', null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroommembership',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of messages in the chat room the member has not read.'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroommembership',
+            index=models.Index(fields=['user', '-last_message_at'], name='membership_inbox_idx'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
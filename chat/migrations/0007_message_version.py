@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-17 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_chat_room_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='version',
+            field=models.PositiveIntegerField(default=1, help_text='Incremented whenever the rendered message changes, keys its cached payload.'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1 on 2026-10-17 10:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_seq(apps, schema_editor):
+    """Number the existing messages of every chat room in sending order."""
+    ChatRoom = apps.get_model("chat", "ChatRoom")
+    Message = apps.get_model("chat", "Message")
+
+    for chat_room in ChatRoom.objects.iterator():
+        messages = []
+        for seq, message in enumerate(
+            Message.objects.filter(chat_room=chat_room).order_by("id").only("id"),
+            start=1,
+        ):
+            message.seq = seq
+            messages.append(message)
+        if not messages:
+            continue
+
+        Message.objects.bulk_update(messages, ["seq"], batch_size=1000)
+        chat_room.last_seq = len(messages)
+        chat_room.save(update_fields=["last_seq"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_seq',
+            field=models.PositiveBigIntegerField(default=0, help_text='Sequence number of the newest message sent in the chat room.'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Position of the message in its chat room, assigned when saved.', null=True),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('chat_room', 'seq'), name='unique_chat_room_message_seq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-17 10:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_message_seq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatroominvitation',
+            index=models.Index(fields=['sender', 'invitation_status', 'receiver'], name='invitation_sender_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroominvitation',
+            index=models.Index(fields=['receiver', 'invitation_status', 'sender'], name='invitation_receiver_status_idx'),
+        ),
+    ]
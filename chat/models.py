@@ -1,4 +1,18 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import (
+    Q,
+    F,
+    Case,
+    When,
+    Value,
+    Count,
+    Exists,
+    OuterRef,
+    Subquery,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 
@@ -11,8 +25,12 @@ from chat.choices import (
 
 from shared.choices import StatusChoices
 from shared.base_model import BaseModel
-from shared.services import CacheMethod
-from shared.cache_key import get_user_chat_room_cache_key
+from chat.inbox import refresh_inboxes, remove_from_inboxes
+from chat.access import clear_chat_room_access, clear_chat_room_member
+from chat.blocks import clear_blocks
+
+from shared.services import bump_cache_version
+from shared.cache_key import get_chat_room_messages_cache_key
 
 
 from versatileimagefield.fields import VersatileImageField
@@ -51,10 +69,98 @@ class ChatRoom(BaseModel):
         related_name="creator_of_chat_rooms",
         help_text="User who created this chat room.",
     )
+    last_message = models.ForeignKey(
+        "Message",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text="Newest message sent in the chat room.",
+    )
+    last_message_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Timestamp of the newest message sent in the chat room.",
+    )
+    last_seq = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Sequence number of the newest message sent in the chat room.",
+    )
 
     def __str__(self):
         return self.name or self.group_name
 
+    def save(self, *args, **kwargs):
+        is_update = bool(self.pk)
+        previous_name = self.get_dirty_fields().get("name") if is_update else None
+
+        super().save(*args, **kwargs)
+
+        # Update the room summary in the inbox of every member
+        if is_update:
+            refresh_inboxes(ChatRoomMembership.objects.filter(chat_room=self))
+
+        # The access of members is cached by room name and by room uid
+        if is_update:
+            uid = self.uid
+            member_ids = list(self.memberships.values_list("user_id", flat=True))
+            transaction.on_commit(lambda: clear_chat_room_member(uid, member_ids))
+            if previous_name:
+                transaction.on_commit(
+                    lambda: clear_chat_room_access(previous_name, member_ids)
+                )
+
+    def delete(self, *args, **kwargs):
+        name, uid = self.name, self.uid
+        memberships = list(self.memberships.values_list("id", "user_id"))
+        member_ids = [user_id for _, user_id in memberships]
+
+        result = super().delete(*args, **kwargs)
+
+        # The memberships are deleted along with the room
+        remove_from_inboxes(memberships)
+        transaction.on_commit(lambda: clear_chat_room_access(name, member_ids))
+        transaction.on_commit(lambda: clear_chat_room_member(uid, member_ids))
+        return result
+
+    @classmethod
+    def allocate_sequences(cls, chat_room_id, count):
+        """
+        Reserve the next `count` sequence numbers of a chat room and return
+        the first one. The row stays locked until the transaction ends, so
+        concurrent writers get consecutive ranges in commit order.
+        """
+        cls.objects.filter(id=chat_room_id).update(last_seq=F("last_seq") + count)
+        last_seq = cls.objects.filter(id=chat_room_id).values_list(
+            "last_seq", flat=True
+        )[0]
+        return last_seq - count + 1
+
+    @classmethod
+    def record_new_messages(cls, messages):
+        """Update the denormalized last message state for new messages."""
+        messages_by_chat_room = {}
+        for message in sorted(messages, key=lambda message: message.id):
+            messages_by_chat_room.setdefault(message.chat_room_id, []).append(message)
+
+        for chat_room_id, chat_room_messages in messages_by_chat_room.items():
+            last_message = chat_room_messages[-1]
+            cls.objects.filter(id=chat_room_id).update(
+                last_message=last_message, last_message_at=last_message.created_at
+            )
+            ChatRoomMembership.record_new_messages(chat_room_id, chat_room_messages)
+
+            # Invalidate the cached history pages of the room
+            bump_cache_version(
+                get_chat_room_messages_cache_key(last_message.chat_room.uid)
+            )
+
+        # Move the rooms to the top of the members inbox
+        refresh_inboxes(
+            ChatRoomMembership.objects.filter(chat_room_id__in=messages_by_chat_room)
+        )
+
 
 class ChatRoomMembership(BaseModel):
     """Model to store membership of users in chat rooms."""
@@ -87,6 +193,28 @@ class ChatRoomMembership(BaseModel):
         default=True,
         help_text="Indicates whether the user has write access in the chat room.",
     )
+    last_read_message = models.ForeignKey(
+        "Message",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text="Newest message of the chat room read by the member.",
+    )
+    last_read_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Timestamp indicating when the member last read the chat room.",
+    )
+    unread_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of messages in the chat room the member has not read.",
+    )
+    last_message_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Copy of the chat room last message timestamp to sort the inbox.",
+    )
 
     class Meta:
         constraints = [
@@ -94,6 +222,13 @@ class ChatRoomMembership(BaseModel):
                 fields=["user", "chat_room"], name="unique_user_chat_room_membership"
             )
         ]
+        indexes = [
+            # The user inbox is a scan of this index by last activity
+            models.Index(
+                fields=["user", "-last_message_at"],
+                name="membership_inbox_idx",
+            )
+        ]
 
     def clean(self) -> None:
         super().clean()
@@ -129,16 +264,181 @@ class ChatRoomMembership(BaseModel):
         # Call clean to perform validations
         self.clean()
 
-        # Remove cache for the user chat room list
-        if self.pk:
-            cache_key = get_user_chat_room_cache_key(user_id=self.user.id)
-            CacheMethod().clear_cache(cache_key)
-
         super().save(*args, **kwargs)
 
+        # Update the room entry in the user inbox
+        refresh_inboxes(self.__class__.objects.filter(pk=self.pk))
+        self.clear_access()
+
+    def delete(self, *args, **kwargs):
+        membership_id = self.pk
+        result = super().delete(*args, **kwargs)
+
+        # The room leaves the inbox of the user
+        remove_from_inboxes([(membership_id, self.user_id)])
+        self.clear_access()
+        return result
+
+    def clear_access(self):
+        """Drop the cached access of the member once committed."""
+        chat_room, user_id = self.chat_room, self.user_id
+        transaction.on_commit(lambda: clear_chat_room_access(chat_room.name, [user_id]))
+        transaction.on_commit(lambda: clear_chat_room_member(chat_room.uid, [user_id]))
+
     def __str__(self):
         return f"{self.user} in {self.chat_room}"
 
+    def has_read(self, message):
+        """Check if the member has read the given message."""
+        return bool(self.last_read_message_id) and message.id <= self.last_read_message_id
+
+    def has_unread_messages(self):
+        """Check if the chat room has messages newer than the read watermark."""
+        return self.unread_count > 0
+
+    @classmethod
+    def get_blocked_chat_filter(cls):
+        """Filter the private chats of members who blocked the other member."""
+        return Q(
+            Exists(
+                cls.objects.filter(
+                    chat_room=OuterRef("chat_room"),
+                    user__blocked_users__blocked_by=OuterRef("user"),
+                    user__blocked_users__member_ship__isnull=True,
+                )
+            ),
+            chat_room__is_group_chat=False,
+        )
+
+    @classmethod
+    def get_inbox_memberships(cls, user):
+        """Memberships listed in the inbox of a user."""
+        return cls.objects.filter(user=user).exclude(cls.get_blocked_chat_filter())
+
+    @classmethod
+    def get_read_watermark_filter(cls, message_id):
+        """Filter memberships whose watermark is behind the given message."""
+        return Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=message_id)
+
+    @classmethod
+    def get_unread_count_subquery(cls, message_id):
+        """Count the active messages of the member chat room newer than a message."""
+        unread_messages = (
+            Message.get_active_instance()
+            .filter(chat_room_id=OuterRef("chat_room_id"), id__gt=message_id)
+            .order_by()
+            .values("chat_room_id")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return Coalesce(Subquery(unread_messages), 0)
+
+    @classmethod
+    def mark_as_read(cls, user_id, chat_room_id, message_id):
+        """Move the read watermark of a member forward to the given message."""
+        return cls.bulk_mark_as_read([(user_id, chat_room_id, message_id)])
+
+    @classmethod
+    def bulk_mark_as_read(cls, read_receipts):
+        """
+        Move the read watermark of many members forward with one update.
+
+        `read_receipts` is a list of (user_id, chat_room_id, message_id).
+        """
+        if not read_receipts:
+            return 0
+
+        members_filter = Q()
+        behind_filter = Q()
+        watermark_cases = []
+        unread_count_cases = []
+        for user_id, chat_room_id, message_id in read_receipts:
+            member_filter = Q(user_id=user_id, chat_room_id=chat_room_id)
+            members_filter |= member_filter
+            # Only members whose watermark is behind the message are updated
+            member_behind_filter = member_filter & cls.get_read_watermark_filter(
+                message_id
+            )
+            behind_filter |= member_behind_filter
+            watermark_cases.append(When(member_behind_filter, then=Value(message_id)))
+            unread_count_cases.append(
+                When(
+                    member_behind_filter,
+                    then=cls.get_unread_count_subquery(message_id),
+                )
+            )
+
+        updated = cls.objects.filter(behind_filter).update(
+            last_read_message_id=Case(
+                *watermark_cases,
+                default=F("last_read_message_id"),
+                output_field=models.BigIntegerField(),
+            ),
+            unread_count=Case(
+                *unread_count_cases,
+                default=F("unread_count"),
+                output_field=models.PositiveIntegerField(),
+            ),
+            last_read_at=timezone.now(),
+        )
+
+        if updated:
+            # Unread counters are shown in the members inbox
+            refresh_inboxes(cls.objects.filter(members_filter))
+
+        return updated
+
+    @classmethod
+    def record_new_messages(cls, chat_room_id, messages):
+        """
+        Update the unread counters of the chat room members for new messages.
+
+        `messages` are the new messages of the chat room ordered by id.
+        """
+        last_message = messages[-1]
+        members = cls.objects.filter(chat_room_id=chat_room_id)
+
+        # Newest own message of every sender, senders have read up to it
+        own_last_messages = {message.sender_id: message for message in messages}
+
+        members.exclude(user_id__in=own_last_messages).update(
+            unread_count=F("unread_count") + len(messages),
+            last_message_at=last_message.created_at,
+        )
+        for sender_id, own_last_message in own_last_messages.items():
+            members.filter(user_id=sender_id).update(
+                unread_count=sum(
+                    1 for message in messages if message.id > own_last_message.id
+                ),
+                last_read_message=own_last_message,
+                last_read_at=timezone.now(),
+                last_message_at=last_message.created_at,
+            )
+
+    @classmethod
+    def get_read_watermarks(cls, chat_room_id):
+        """Get the members of a chat room who have read at least one message."""
+        return cls.objects.filter(
+            chat_room_id=chat_room_id, last_read_message__isnull=False
+        ).select_related("user")
+
+    @classmethod
+    def get_private_chat_membership(cls, user, username):
+        """
+        Get the membership of the user with the given username in its private
+        chat room with the given user, along with the user and the room.
+        """
+        return (
+            cls.objects.filter(
+                user__username=username,
+                chat_room__is_group_chat=False,
+                chat_room__memberships__user=user,
+            )
+            .exclude(user=user)
+            .select_related("user", "chat_room")
+            .first()
+        )
+
 
 class ChatRoomInvitation(BaseModel):
     """Model to store chat room invitations."""
@@ -175,6 +475,17 @@ class ChatRoomInvitation(BaseModel):
                 name="unique_chat_room_invitation",
             )
         ]
+        indexes = [
+            # The friends of a user are read from both sides of its invitations
+            models.Index(
+                fields=["sender", "invitation_status", "receiver"],
+                name="invitation_sender_status_idx",
+            ),
+            models.Index(
+                fields=["receiver", "invitation_status", "sender"],
+                name="invitation_receiver_status_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.receiver.username} invited to {self.chat_room.name}"
@@ -230,6 +541,53 @@ class ChatRoomInvitation(BaseModel):
 
         return invitation
 
+    @classmethod
+    def send_group_chat_invitations(cls, chat_room, sender, receiver_ids):
+        """
+        Invite many users to a group chat room at once and return the number
+        of invitations created.
+
+        The access of the sender is checked once, users already invited by
+        the sender or already active members are skipped with one query and
+        the rest is inserted in batches. The sender itself is skipped, the
+        requests inviting their sender are rejected before reaching here.
+        """
+        if not cls().send_request_access(sender=sender, chat_room=chat_room):
+            raise ValidationError(
+                "You do not have permission to send invitation for this chat room."
+            )
+
+        invited = cls.objects.filter(
+            chat_room=chat_room, sender=sender, receiver=OuterRef("pk")
+        )
+        members = ChatRoomMembership.objects.filter(
+            chat_room=chat_room,
+            user=OuterRef("pk"),
+            member_status=MemberShipStatusChoices.ACTIVE,
+        )
+        receiver_ids = (
+            User.objects.filter(pk__in=set(receiver_ids) - {sender.pk})
+            .exclude(Exists(invited))
+            .exclude(Exists(members))
+            .values_list("pk", flat=True)
+        )
+
+        # Invitations sent meanwhile by the same sender are left as they are,
+        # the rows inserted are counted by the uids generated here
+        invitations = cls.objects.bulk_create(
+            [
+                cls(chat_room=chat_room, sender=sender, receiver_id=receiver_id)
+                for receiver_id in receiver_ids
+            ],
+            batch_size=getattr(settings, "INVITATION_BATCH_SIZE", 500),
+            ignore_conflicts=True,
+        )
+        if not invitations:
+            return 0
+        return cls.objects.filter(
+            uid__in=[invitation.uid for invitation in invitations]
+        ).count()
+
     def send_private_chat_invitation(self, receiver, sender):
         """Send invitation to a user for a private chat room."""
         from chat.utils import get_or_create_private_chat
@@ -265,44 +623,132 @@ class ChatRoomInvitation(BaseModel):
         ).select_related("sender")
 
     @classmethod
-    def get_user_friend_list(self, user):
-        """Get the list of friends of a user."""
-        # Get the list of accepted sent and received invitations
-        sent_invitations = self.get_user_accepted_sent_invitation(user)
-        received_invitations = self.get_user_accepted_received_invitation(user)
-
-        # Find the user who blocked the current user
-        blocked_users = BlockList().get_user_blocked_by_list(user)
+    def get_user_friend_ids(cls, user):
+        """Subquery of the ids of the users with an accepted private invitation."""
+        return cls.objects.filter(
+            Q(sender=user) | Q(receiver=user),
+            invitation_status=InvitationStatusChoices.ACCEPTED,
+            chat_room__is_group_chat=False,
+        ).values(
+            friend_id=Case(
+                When(sender=user, then=F("receiver_id")), default=F("sender_id")
+            )
+        )
 
-        # Collect friends from sent invitations and update the list with received invitations
-        friends = set(invitation.receiver for invitation in sent_invitations)
-        friends.update(invitation.sender for invitation in received_invitations)
+    @classmethod
+    def get_user_friend_list(cls, user):
+        """
+        Get the friends of a user, as a queryset ordered by username so it is
+        paginated by the database.
+        """
+        # Users who blocked the current user are not listed
+        blocked_by = BlockList.objects.filter(
+            user=user, blocked_by=OuterRef("pk"), member_ship__isnull=True
+        )
 
-        # Remove blocked users from the list
-        friends.difference_update(User.objects.filter(id__in=blocked_users))
+        return (
+            User.objects.filter(pk__in=cls.get_user_friend_ids(user))
+            .exclude(Exists(blocked_by))
+            .order_by("username")
+        )
 
-        return list(friends)
+    @classmethod
+    def get_friend_ids(cls, user_ids):
+        """Map each of the given user ids to the ids of their friends."""
+        user_ids = list(user_ids)
+        friend_ids = {user_id: set() for user_id in user_ids}
+        invitations = cls.objects.filter(
+            Q(sender_id__in=user_ids) | Q(receiver_id__in=user_ids),
+            invitation_status=InvitationStatusChoices.ACCEPTED,
+            chat_room__is_group_chat=False,
+        ).values_list("sender_id", "receiver_id")
+        for sender_id, receiver_id in invitations:
+            if sender_id in friend_ids:
+                friend_ids[sender_id].add(receiver_id)
+            if receiver_id in friend_ids:
+                friend_ids[receiver_id].add(sender_id)
+
+        # Users blocked by a user are not part of its friends
+        blocked_users = BlockList.objects.filter(
+            blocked_by_id__in=user_ids, member_ship__isnull=True
+        ).values_list("blocked_by_id", "user_id")
+        for blocked_by_id, user_id in blocked_users:
+            friend_ids[blocked_by_id].discard(user_id)
+
+        return friend_ids
 
     @classmethod
-    def get_user_add_friend_list(self, user):
-        """Get the list of users who can be added as friends by a user."""
+    def get_user_add_friend_list(cls, user, search=None):
+        """
+        Get the users who can be added as friends by a user, ordered by
+        username. Friends and users who blocked the current user are left out
+        with anti-joins, so the query does not grow with the friend count.
+        """
+        friendships = cls.objects.filter(
+            invitation_status=InvitationStatusChoices.ACCEPTED,
+            chat_room__is_group_chat=False,
+        )
+        blocked_by = BlockList.objects.filter(
+            user=user, blocked_by=OuterRef("pk"), member_ship__isnull=True
+        )
 
-        # Get the list of accepted sent and received invitations
-        sent_invitations = [
-            ele.receiver.id for ele in self.get_user_accepted_sent_invitation(user)
-        ]
-        received_invitations = [
-            ele.sender.id for ele in self.get_user_accepted_received_invitation(user)
-        ]
+        users = (
+            User.objects.exclude(pk=user.pk)
+            .exclude(Exists(friendships.filter(sender=user, receiver=OuterRef("pk"))))
+            .exclude(Exists(friendships.filter(receiver=user, sender=OuterRef("pk"))))
+            .exclude(Exists(blocked_by))
+        )
+        if search:
+            # Prefixes are matched regardless of case, on the upper-cased
+            # username and email that the user indexes hold
+            users = users.filter(
+                Q(username__istartswith=search) | Q(email__istartswith=search)
+            )
+
+        return users.order_by("username")
 
-        # Find the user who blocked the current user
-        blocked_users = [ele for ele in BlockList().get_user_blocked_by_list(user)]
-        # Arrange the exclude users list for current user
-        exclude_users = set(
-            sent_invitations + received_invitations + blocked_users + [user.id]
+    @classmethod
+    def get_user_friend_suggestions(cls, user):
+        """
+        Get the friends of the friends of a user who can be added as friends,
+        ranked by the number of their mutual friends.
+        """
+        friend_ids = cls.get_user_friend_ids(user)
+        friendships = cls.objects.filter(
+            invitation_status=InvitationStatusChoices.ACCEPTED,
+            chat_room__is_group_chat=False,
         )
 
-        return User.objects.exclude(id__in=exclude_users)
+        # Only the two hop neighbourhood of the user is counted
+        candidate_ids = (
+            friendships.filter(
+                Q(sender_id__in=friend_ids) | Q(receiver_id__in=friend_ids)
+            )
+            .annotate(
+                candidate_id=Case(
+                    When(sender_id__in=friend_ids, then=F("receiver_id")),
+                    default=F("sender_id"),
+                )
+            )
+            .values("candidate_id")
+        )
+        mutual_friends = (
+            friendships.filter(
+                Q(sender=OuterRef("pk"), receiver_id__in=friend_ids)
+                | Q(receiver=OuterRef("pk"), sender_id__in=friend_ids)
+            )
+            .order_by()
+            .values(group=Value(1))
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+
+        return (
+            cls.get_user_add_friend_list(user)
+            .filter(pk__in=candidate_ids)
+            .annotate(mutual_friends=Subquery(mutual_friends))
+            .order_by("-mutual_friends", "username")
+        )
 
     @classmethod
     def get_user_friend_request(self, user):
@@ -351,6 +797,19 @@ class Attachment(BaseModel):
     def __str__(self):
         return f"Uid: {self.uid}"
 
+    def save(self, *args, **kwargs):
+        is_update = bool(self.pk)
+
+        super().save(*args, **kwargs)
+
+        # Messages render the attachment, directly or through their reply
+        if is_update:
+            Message.bump_versions(
+                Message.objects.filter(
+                    Q(attachment=self) | Q(reply_to__attachment=self)
+                )
+            )
+
 
 class Message(BaseModel):
     """Model to store messages exchanged between users."""
@@ -380,6 +839,8 @@ class Message(BaseModel):
         blank=True,
         help_text="Attachment associated with the message, if any.",
     )
+    # Legacy per message receipts, superseded by the read watermark of
+    # ChatRoomMembership and kept until the collapse_read_receipts command runs
     read_by = models.ManyToManyField(
         User,
         related_name="read_messages",
@@ -394,10 +855,102 @@ class Message(BaseModel):
         related_name="replies",
         help_text="The message to which this message is a reply, if any.",
     )
+    version = models.PositiveIntegerField(
+        default=1,
+        help_text="Incremented whenever the rendered message changes, keys its cached payload.",
+    )
+    seq = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Position of the message in its chat room, assigned when saved.",
+    )
+
+    class Meta:
+        constraints = [
+            # Also the index of the catch-up reads after a reconnect
+            models.UniqueConstraint(
+                fields=["chat_room", "seq"], name="unique_chat_room_message_seq"
+            )
+        ]
+        indexes = [
+            # Keyset pagination of a room history walks this index
+            models.Index(
+                fields=["chat_room", "status", "created_at", "id"],
+                name="message_room_history_idx",
+            )
+        ]
 
     def __str__(self):
         return self.content[:50] if self.content else "No Content"
 
+    def save(self, *args, **kwargs):
+        is_edit = bool(self.pk) and self.is_dirty()
+
+        # Edits change the rendered message
+        if is_edit:
+            self.version = F("version") + 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = list(kwargs["update_fields"]) + ["version"]
+
+        super().save(*args, **kwargs)
+
+        if is_edit:
+            self.refresh_from_db(fields=["version"])
+
+            # Replies render the message they reply to
+            self.__class__.bump_versions(self.__class__.objects.filter(reply_to=self))
+            bump_cache_version(get_chat_room_messages_cache_key(self.chat_room.uid))
+
+    @classmethod
+    def bump_versions(cls, messages):
+        """Invalidate the cached payloads and history pages of the messages."""
+        chat_room_uids = set(messages.values_list("chat_room__uid", flat=True))
+        if not chat_room_uids:
+            return
+
+        messages.update(version=F("version") + 1)
+        for chat_room_uid in chat_room_uids:
+            bump_cache_version(get_chat_room_messages_cache_key(chat_room_uid))
+
+    @classmethod
+    def create_messages(cls, messages):
+        """Save new messages and update the denormalized chat room state."""
+        messages_by_chat_room = {}
+        for message in messages:
+            messages_by_chat_room.setdefault(message.chat_room_id, []).append(message)
+
+        with transaction.atomic():
+            # Number the messages of every chat room in the given order
+            for chat_room_id, chat_room_messages in messages_by_chat_room.items():
+                seq = ChatRoom.allocate_sequences(chat_room_id, len(chat_room_messages))
+                for message in chat_room_messages:
+                    message.seq = seq
+                    seq += 1
+
+            messages = cls.objects.bulk_create(messages)
+            ChatRoom.record_new_messages(messages)
+
+        return messages
+
+    @classmethod
+    def create_message(cls, **kwargs):
+        """Save a new message and update the denormalized chat room state."""
+        return cls.create_messages([cls(**kwargs)])[0]
+
+    @classmethod
+    def get_messages_after(cls, chat_room_id, seq, limit):
+        """Compact form of the messages of a chat room sent after `seq`."""
+        return list(
+            cls.objects.filter(
+                chat_room_id=chat_room_id, seq__gt=seq, status=StatusChoices.ACTIVE
+            )
+            .order_by("seq")
+            .values_list(
+                "seq", "uid", "sender__username", "content", "created_at"
+            )[:limit]
+        )
+
 
 class MessageReaction(BaseModel):
     """Model to store reactions to messages."""
@@ -431,6 +984,21 @@ class MessageReaction(BaseModel):
     def __str__(self):
         return f"{self.user} reacted {self.reaction_type} on {self.message}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        # Reactions are rendered with the message
+        Message.bump_versions(Message.objects.filter(pk=self.message_id))
+
+    def delete(self, *args, **kwargs):
+        message_id = self.message_id
+        deleted = super().delete(*args, **kwargs)
+
+        # Reactions are rendered with the message
+        Message.bump_versions(Message.objects.filter(pk=message_id))
+
+        return deleted
+
 
 class BlockList(BaseModel):
     """Model to store blocked users."""
@@ -479,8 +1047,41 @@ class BlockList(BaseModel):
         # Call clean to perform validations
         self.clean()
 
+        # Blocks are cached for both users, before and after the change
+        dirty_fields = self.get_dirty_fields(check_relationship=True)
+        user_ids = {self.user_id, self.blocked_by_id}
+        user_ids.update(dirty_fields.get(name) for name in ("user", "blocked_by"))
+
         super().save(*args, **kwargs)
 
+        transaction.on_commit(lambda: clear_blocks(user_ids))
+        refresh_inboxes(self.get_blocked_memberships(user_ids))
+
+    def delete(self, *args, **kwargs):
+        user_ids = {self.user_id, self.blocked_by_id}
+
+        result = super().delete(*args, **kwargs)
+
+        transaction.on_commit(lambda: clear_blocks(user_ids))
+        refresh_inboxes(self.get_blocked_memberships(user_ids))
+        return result
+
+    def get_blocked_memberships(self, user_ids):
+        """
+        Memberships whose inbox entry depends on the block, the private chats
+        between the given users or the chat room membership that is blocked.
+        """
+        if self.member_ship_id:
+            return ChatRoomMembership.objects.filter(pk=self.member_ship_id)
+
+        user_ids = [user_id for user_id in user_ids if user_id is not None]
+        other_members = ChatRoomMembership.objects.filter(
+            chat_room=OuterRef("chat_room"), user_id__in=user_ids
+        ).exclude(user=OuterRef("user"))
+        return ChatRoomMembership.objects.filter(
+            Exists(other_members), user_id__in=user_ids, chat_room__is_group_chat=False
+        )
+
     @classmethod
     def get_user_blocked_list(self, user):
         """Get the list of blocked users by a user."""
@@ -0,0 +1,225 @@
+import uuid
+
+from django.db.models import Q
+
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Keyset pagination for chat room history.
+
+    Messages are ordered newest first by (created_at, id) and every page is
+    anchored on a message uid instead of an offset, so fetching an old page
+    costs the same index range scan as fetching the latest one:
+
+    - no anchor: the latest messages of the room
+    - ``before=<uid>``: messages older than the given message
+    - ``after=<uid>``: messages newer than the given message
+    - ``around=<uid>``: a page centred on the given message (jump to message)
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    before_query_param = "before"
+    after_query_param = "after"
+    around_query_param = "around"
+    cursor_field = "uid"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        anchors = {
+            param: request.query_params.get(param)
+            for param in (
+                self.before_query_param,
+                self.after_query_param,
+                self.around_query_param,
+            )
+            if request.query_params.get(param)
+        }
+        if len(anchors) > 1:
+            raise ValidationError(
+                "Only one of before, after or around can be provided at a time."
+            )
+
+        if not anchors:
+            page = list(queryset.order_by("-created_at", "-id")[: self.page_size + 1])
+            self.has_older = len(page) > self.page_size
+            self.has_newer = False
+            self.page = page[: self.page_size]
+            return self.page
+
+        param, value = anchors.popitem()
+        anchor = self.get_anchor(queryset, value)
+
+        if param == self.before_query_param:
+            page = list(
+                queryset.filter(self.older_than(anchor)).order_by(
+                    "-created_at", "-id"
+                )[: self.page_size + 1]
+            )
+            self.has_older = len(page) > self.page_size
+            self.has_newer = True
+            self.page = page[: self.page_size]
+
+        elif param == self.after_query_param:
+            page = list(
+                queryset.filter(self.newer_than(anchor)).order_by("created_at", "id")[
+                    : self.page_size + 1
+                ]
+            )
+            self.has_newer = len(page) > self.page_size
+            self.has_older = True
+            self.page = page[: self.page_size][::-1]
+
+        else:
+            # Half of the page is filled with newer messages, the rest with the
+            # anchor message itself and the messages older than it
+            newer_size = self.page_size // 2
+            older_size = self.page_size - newer_size
+            newer = list(
+                queryset.filter(self.newer_than(anchor)).order_by("created_at", "id")[
+                    : newer_size + 1
+                ]
+            )
+            older = list(
+                queryset.filter(self.older_than(anchor, inclusive=True)).order_by(
+                    "-created_at", "-id"
+                )[: older_size + 1]
+            )
+            self.has_newer = len(newer) > newer_size
+            self.has_older = len(older) > older_size
+            self.page = newer[:newer_size][::-1] + older[:older_size]
+
+        return self.page
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if not page_size:
+            return self.page_size
+
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError("page_size must be a positive integer.")
+
+        if page_size < 1:
+            raise ValidationError("page_size must be a positive integer.")
+
+        return min(page_size, self.max_page_size)
+
+    def get_anchor(self, queryset, value):
+        """Resolve the anchor message uid into its (created_at, id) position."""
+        try:
+            uuid.UUID(str(value))
+        except ValueError:
+            raise ValidationError("Cursor must be a valid message uid.")
+
+        anchor = queryset.filter(**{self.cursor_field: value}).values(
+            "created_at", "id"
+        ).first()
+        if not anchor:
+            raise NotFound("Message not found with the given uid")
+
+        return anchor
+
+    def older_than(self, anchor, inclusive=False):
+        lookup = "id__lte" if inclusive else "id__lt"
+        return Q(created_at__lt=anchor["created_at"]) | Q(
+            created_at=anchor["created_at"], **{lookup: anchor["id"]}
+        )
+
+    def newer_than(self, anchor):
+        return Q(created_at__gt=anchor["created_at"]) | Q(
+            created_at=anchor["created_at"], id__gt=anchor["id"]
+        )
+
+    def get_cursor_value(self, instance):
+        return str(getattr(instance, self.cursor_field))
+
+    def get_next_link(self):
+        """Link to the page of older messages."""
+        if not self.has_older or not self.page:
+            return None
+
+        url = remove_query_param(self.base_url, self.after_query_param)
+        url = remove_query_param(url, self.around_query_param)
+        return replace_query_param(
+            url, self.before_query_param, self.get_cursor_value(self.page[-1])
+        )
+
+    def get_previous_link(self):
+        """Link to the page of newer messages."""
+        if not self.has_newer or not self.page:
+            return None
+
+        url = remove_query_param(self.base_url, self.before_query_param)
+        url = remove_query_param(url, self.around_query_param)
+        return replace_query_param(
+            url, self.after_query_param, self.get_cursor_value(self.page[0])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [
+            {
+                "name": param,
+                "required": False,
+                "in": "query",
+                "description": description,
+                "schema": {"type": "string", "format": "uuid"},
+            }
+            for param, description in (
+                (self.before_query_param, "Return messages older than this uid."),
+                (self.after_query_param, "Return messages newer than this uid."),
+                (self.around_query_param, "Return messages around this uid."),
+            )
+        ]
+        parameters.append(
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of messages to return per page.",
+                "schema": {"type": "integer"},
+            }
+        )
+        return parameters
+
+
+class UserCursorPagination(CursorPagination):
+    """
+    Keyset pagination of user lists on the unique username, every page is a
+    range scan of the username index whatever its depth.
+    """
+
+    ordering = "username"
+    page_size_query_param = "page_size"
+    max_page_size = 100
@@ -1,6 +1,18 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS, IsAuthenticated
 
-from chat.models import ChatRoomMembership, ChatRoom, ChatRoomInvitation
+from chat.models import ALLOWED_MEMBER_TO_SEND_INVITATION
+from chat.choices import MemberShipStatusChoices
+from chat.access import resolve_chat_room_member
+
+
+def get_active_membership(request, view):
+    """Active membership of the user in the chat room of the view, or None."""
+    chat_room_uid = view.kwargs.get("chat_room_uid")
+    _, membership = resolve_chat_room_member(request, chat_room_uid)
+
+    if membership and membership.member_status == MemberShipStatusChoices.ACTIVE:
+        return membership
+    return None
 
 
 class IsChatRoomActiveMember(IsAuthenticated):
@@ -10,10 +22,7 @@ class IsChatRoomActiveMember(IsAuthenticated):
         if not super().has_permission(request, view):
             return False
 
-        chat_room_uid = view.kwargs.get("chat_room_uid")
-        return ChatRoomMembership.objects.filter(
-            user=request.user, chat_room__uid=chat_room_uid, member_status="ACTIVE"
-        ).exists()
+        return get_active_membership(request, view) is not None
 
 
 class HasWriteAccessToChatRoom(IsAuthenticated):
@@ -23,10 +32,7 @@ class HasWriteAccessToChatRoom(IsAuthenticated):
         if not super().has_permission(request, view):
             return False
 
-        chat_room_uid = view.kwargs.get("chat_room_uid")
-        member_ship = ChatRoomMembership.objects.filter(
-            user=request.user, chat_room__uid=chat_room_uid, member_status="ACTIVE"
-        ).first()
+        member_ship = get_active_membership(request, view)
 
         if member_ship:
             if not member_ship.has_write_access:
@@ -44,10 +50,10 @@ class IsMemberHasInvitationAccess(IsAuthenticated):
             return False
 
         chat_room_uid = view.kwargs.get("chat_room_uid")
-        chat_room = ChatRoom.objects.filter(uid=chat_room_uid).first()
+        _, member_ship = resolve_chat_room_member(request, chat_room_uid)
 
-        return ChatRoomInvitation().send_request_access(
-            chat_room=chat_room, sender=request.user
+        return bool(
+            member_ship and member_ship.role in ALLOWED_MEMBER_TO_SEND_INVITATION
         )
 
 
@@ -59,18 +65,14 @@ class HasUpdateAccessToRoomMembership(IsAuthenticated):
             return False
 
         chat_room_uid = view.kwargs.get("chat_room_uid")
-        chat_room = ChatRoom.objects.filter(uid=chat_room_uid).first()
+        chat_room, room_member = resolve_chat_room_member(request, chat_room_uid)
 
         if not chat_room:
             return False
 
-        room_member = ChatRoomMembership.objects.filter(
-            user=request.user, chat_room=chat_room
-        ).first()
-
         if (
             not room_member
-            or obj.user == request.user
+            or obj.user_id == request.user.id
             or (obj.role == "ADMIN" and room_member.role != "ADMIN")
         ):
             return False
@@ -0,0 +1,162 @@
+import time
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+
+from chat.models import ChatRoomInvitation
+from chat.utils import get_user_group_name
+
+from shared.services import get_redis_client
+from shared.cache_key import (
+    get_user_presence_cache_key,
+    get_user_presence_connections_cache_key,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_presence_ttl():
+    return getattr(settings, "PRESENCE_TTL", 90)
+
+
+def touch_connection(user_id, channel_name):
+    """
+    Register or refresh a websocket connection of a user.
+
+    Every connection is kept in a redis sorted set scored by the time its
+    heartbeat expires, so connections of crashed workers expire on their
+    own. Return True when the user had no other live connection, i.e. the
+    user just came online.
+    """
+    now = time.time()
+    ttl = get_presence_ttl()
+    connections_key = get_user_presence_connections_cache_key(user_id)
+
+    pipeline = get_redis_client().pipeline(transaction=True)
+    pipeline.zremrangebyscore(connections_key, "-inf", now)
+    pipeline.zcard(connections_key)
+    pipeline.zadd(connections_key, {channel_name: now + ttl})
+    pipeline.expire(connections_key, ttl)
+    pipeline.set(get_user_presence_cache_key(user_id), 1, ex=ttl)
+    _, live_connections, *_ = pipeline.execute()
+
+    return live_connections == 0
+
+
+def remove_connection(user_id, channel_name):
+    """
+    Remove a websocket connection of a user. Return True when it was the
+    last live connection, i.e. the user just went offline.
+    """
+    connections_key = get_user_presence_connections_cache_key(user_id)
+
+    def remove(pipeline):
+        # Reads run before MULTI, the connections key is watched meanwhile
+        now = time.time()
+        live_connections = pipeline.zcount(connections_key, now, "+inf")
+        is_live = (pipeline.zscore(connections_key, channel_name) or 0) > now
+
+        pipeline.multi()
+        if live_connections - is_live > 0:
+            pipeline.zrem(connections_key, channel_name)
+            return False
+
+        pipeline.delete(connections_key, get_user_presence_cache_key(user_id))
+        return is_live
+
+    return get_redis_client().transaction(
+        remove, connections_key, value_from_callable=True
+    )
+
+
+def get_connection_count(user_id):
+    """Number of live websocket connections of a user across every worker."""
+    return get_redis_client().zcount(
+        get_user_presence_connections_cache_key(user_id), time.time(), "+inf"
+    )
+
+
+def is_online(user_ids):
+    """Map each of the given user ids to whether the user is online."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+
+    flags = get_redis_client().mget(
+        [get_user_presence_cache_key(user_id) for user_id in user_ids]
+    )
+    return {user_id: flag is not None for user_id, flag in zip(user_ids, flags)}
+
+
+class PresenceFanout:
+    """
+    Batches the presence changes sent to friends.
+
+    Changes made within the fanout delay are merged, the friends of every
+    changed user are read with one query and each online friend receives
+    a single `presence_update` event on its user group.
+    """
+
+    def __init__(self, delay=None):
+        self.delay = delay or getattr(settings, "PRESENCE_FANOUT_DELAY", 0.5)
+        self.pending = {}
+        self.flush_handle = None
+
+    def add(self, user_id, username):
+        self.pending[user_id] = username
+        if self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self.flush_handle = loop.call_later(
+                self.delay, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    async def flush(self):
+        self.flush_handle = None
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        try:
+            await self.send(pending)
+        except Exception:
+            logger.exception("Presence changes could not be sent.")
+
+    async def send(self, pending):
+        # The current state is read back so a quick reconnect is not missed
+        friend_ids = await database_sync_to_async(ChatRoomInvitation.get_friend_ids)(
+            pending.keys()
+        )
+        online = await sync_to_async(is_online)(
+            set(pending).union(*friend_ids.values())
+        )
+
+        updates = {}
+        for user_id, username in pending.items():
+            for friend_id in friend_ids[user_id]:
+                if online[friend_id]:
+                    updates.setdefault(friend_id, {})[username] = online[user_id]
+
+        channel_layer = get_channel_layer()
+        for friend_id, users in updates.items():
+            await channel_layer.group_send(
+                get_user_group_name(friend_id),
+                {"type": "presence_update", "users": users},
+            )
+
+
+_fanouts = weakref.WeakKeyDictionary()
+
+
+def get_presence_fanout():
+    """Return the presence fanout of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _fanouts:
+        _fanouts[loop] = PresenceFanout()
+    return _fanouts[loop]
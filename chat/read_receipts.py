@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from chat.models import ChatRoomMembership
+
+from shared.services import get_redis_client
+from shared.cache_key import (
+    get_pending_read_receipts_cache_key,
+    get_read_receipts_flush_lock_cache_key,
+)
+
+
+def mark_chat_room_as_read(user_id, chat_room_id, up_to_message_id):
+    """Mark every message of the chat room up to the given one as read."""
+    return ChatRoomMembership.mark_as_read(
+        user_id=user_id, chat_room_id=chat_room_id, message_id=up_to_message_id
+    )
+
+
+def queue_read_receipt(user_id, chat_room_id, up_to_message_id):
+    """
+    Queue a "read up to" receipt to be flushed by the celery batcher.
+
+    Receipts are merged per user and chat room in a redis sorted set, so
+    only the newest message read by a user in a room is kept until the
+    next flush.
+    """
+    from chat.tasks import flush_read_receipts
+
+    get_redis_client().zadd(
+        get_pending_read_receipts_cache_key(),
+        {f"{user_id}:{chat_room_id}": up_to_message_id},
+        gt=True,
+    )
+
+    # Schedule a single flush for every receipt queued within the delay
+    flush_delay = getattr(settings, "READ_RECEIPTS_FLUSH_DELAY", 2)
+    if cache.add(get_read_receipts_flush_lock_cache_key(), True, flush_delay * 10):
+        flush_read_receipts.apply_async(countdown=flush_delay)
+
+
+def pop_pending_read_receipts():
+    """Atomically take every queued receipt out of redis."""
+    cache_key = get_pending_read_receipts_cache_key()
+    pipeline = get_redis_client().pipeline(transaction=True)
+    pipeline.zrange(cache_key, 0, -1, withscores=True)
+    pipeline.delete(cache_key)
+    pending, _ = pipeline.execute()
+
+    read_receipts = []
+    for member, up_to_message_id in pending:
+        user_id, chat_room_id = member.decode().split(":")
+        read_receipts.append((int(user_id), int(chat_room_id), int(up_to_message_id)))
+
+    return read_receipts
+
+
+def flush_pending_read_receipts():
+    """Move the read watermark of every queued receipt with one update."""
+    # Release the lock first so receipts queued during the flush get a new one
+    cache.delete(get_read_receipts_flush_lock_cache_key())
+
+    read_receipts = pop_pending_read_receipts()
+    for start in range(0, len(read_receipts), 500):
+        ChatRoomMembership.bulk_mark_as_read(read_receipts[start : start + 500])
+
+    return len(read_receipts)
@@ -2,10 +2,11 @@ from django.contrib.auth import get_user_model
 
 from rest_framework import serializers
 
-from chat.models import BlockList, ChatRoom, ChatRoomMembership
+from chat.models import BlockList, ChatRoomMembership
 from chat.rest.serializers.friends import UserSerializer
 from chat.rest.serializers.chat_rooms import ChatRoomMembershipSerializer
 from chat.choices import MemberShipStatusChoices
+from chat.access import resolve_chat_room_member
 
 
 User = get_user_model()
@@ -62,7 +63,7 @@ class BlockRoomMemberSerializer(serializers.ModelSerializer):
 
     def get_chat_room_instance(self, obj):
         room_uid = self.context["view"].kwargs.get("room_uid")
-        chat_room = ChatRoom.objects.filter(uid=room_uid).first()
+        chat_room, _ = resolve_chat_room_member(self.context["request"], room_uid)
 
         if not chat_room:
             raise serializers.ValidationError("Chat room does not exist.")
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 
 from rest_framework import serializers
@@ -5,6 +7,10 @@ from rest_framework import serializers
 from chat.models import ChatRoomMembership, ChatRoom, Message, ChatRoomInvitation
 from chat.rest.serializers.friends import UserSerializer
 from chat.choices import UserRoleChoices
+from chat.access import resolve_chat_room_member
+from chat.tasks import send_group_chat_invitations
+
+from shared.cache_key import get_invitation_task_cache_key
 
 User = get_user_model()
 
@@ -88,47 +94,81 @@ class ChatRoomMembershipSerializer(serializers.ModelSerializer):
 
 
 class ChatRoomMembershipListSerializer(ChatRoomMembershipSerializer):
-    last_message_by = serializers.CharField()
-    last_message_content = serializers.CharField()
+    last_message_by = serializers.CharField(
+        source="chat_room.last_message.sender.username", allow_null=True
+    )
+    last_message_content = serializers.CharField(
+        source="chat_room.last_message.content", allow_null=True
+    )
 
     class Meta(ChatRoomMembershipSerializer.Meta):
         fields = ChatRoomMembershipSerializer.Meta.fields + [
             "last_message_by",
             "last_message_content",
+            "last_message_at",
+            "unread_count",
         ]
         read_only_fields = fields
 
 
 class GroupChatMemberInviteSerializer(serializers.Serializer):
-    users = serializers.SlugRelatedField(
-        queryset=User.objects.all(),
-        many=True,
-        slug_field="email",
-        required=True,
-        write_only=True,
+    users = serializers.ListField(
+        child=serializers.EmailField(), required=True, write_only=True
     )
     message = serializers.CharField(required=False, read_only=True)
+    task_id = serializers.CharField(required=False, read_only=True)
+
+    def validate_users(self, value):
+        # Every email is resolved with a single query
+        emails = set(value)
+        user_ids = dict(
+            User.objects.filter(email__in=emails).values_list("email", "id")
+        )
+        missing = sorted(emails - user_ids.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f"Object with email={missing[0]} does not exist."
+            )
+        if self.context["request"].user.id in user_ids.values():
+            raise serializers.ValidationError(
+                "Sender and receiver cannot be the same user."
+            )
+        return list(user_ids.values())
 
     def create(self, validated_data):
         chat_room_uid = self.context["view"].kwargs.get("chat_room_uid")
         sender = self.context["request"].user
 
-        try:
-            chat_room = ChatRoom.objects.get(uid=chat_room_uid)
-        except ChatRoom.DoesNotExist:
+        chat_room, _ = resolve_chat_room_member(self.context["request"], chat_room_uid)
+        if chat_room is None:
             raise serializers.ValidationError("Chat room not found with the given uid")
 
         if not chat_room.is_group_chat:
             raise serializers.ValidationError("Chat room is not a group chat")
 
-        for user in validated_data["users"]:
-            try:
-                ChatRoomInvitation().send_group_chat_invitation(
-                    chat_room=chat_room, sender=sender, receiver=user
-                )
-            except Exception as e:
-                error_message = str(e).strip("[]'")
-                raise serializers.ValidationError({"detail": error_message})
+        # Large batches are sent by a worker, their progress is polled by task
+        receiver_ids = validated_data["users"]
+        if len(receiver_ids) > getattr(settings, "INVITATION_ASYNC_THRESHOLD", 100):
+            task = send_group_chat_invitations.delay(
+                chat_room.id, sender.id, receiver_ids
+            )
+            # Only the sender may follow the task, from the chat room it is for
+            cache.set(
+                get_invitation_task_cache_key(task.id),
+                (chat_room.id, sender.id),
+                getattr(settings, "INVITATION_TASK_TTL", 60 * 60 * 24),
+            )
+            validated_data["message"] = "Invitations are being sent"
+            validated_data["task_id"] = task.id
+            return validated_data
+
+        try:
+            ChatRoomInvitation.send_group_chat_invitations(
+                chat_room=chat_room, sender=sender, receiver_ids=receiver_ids
+            )
+        except Exception as e:
+            error_message = str(e).strip("[]'")
+            raise serializers.ValidationError({"detail": error_message})
 
         validated_data["message"] = "Invitation sent successfully"
         return validated_data
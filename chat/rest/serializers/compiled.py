@@ -0,0 +1,179 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import ForeignObjectRel
+
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField, SlugRelatedField
+from rest_framework.settings import api_settings
+
+
+class CompiledSerializer:
+    """
+    Read only fast path for a DRF ModelSerializer.
+
+    The field tree of the serializer is walked once into a plan of
+    `.values()` paths, and rows are then turned into exactly the data the
+    serializer would produce for the same objects, without instantiating
+    serializers or resolving attributes per field and per row.
+
+    Supported fields are model fields, nested serializers of forward
+    relations and nested `many=True` serializers of reverse foreign keys
+    at the top level. Method fields are rendered as `None` for the caller
+    to fill in.
+    """
+
+    _plans = {}
+
+    def __init__(self, serializer_class, context=None):
+        self.serializer_class = serializer_class
+        self.context = context or {}
+        if serializer_class not in self._plans:
+            self._plans[serializer_class] = self.compile(serializer_class)
+        self.model, self.plan, self.many = self._plans[serializer_class]
+
+    @classmethod
+    def compile(cls, serializer_class):
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        plan = cls.compile_fields(serializer, model, prefix="")
+
+        many = []
+        for name, field in serializer.fields.items():
+            if field.write_only or not isinstance(field, serializers.ListSerializer):
+                continue
+
+            relation = model._meta.get_field(field.source)
+            if not isinstance(relation, ForeignObjectRel) or relation.many_to_many:
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{name} must be a reverse "
+                    f"foreign key."
+                )
+            child_plan = cls.compile_fields(
+                field.child, relation.related_model, prefix=""
+            )
+            many.append((name, relation, child_plan))
+
+        return model, plan, many
+
+    @classmethod
+    def compile_fields(cls, serializer, model, prefix):
+        """Return a list of (field name, kind, path, field or nested plan)."""
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            path = prefix + field.source.replace(".", "__")
+
+            if isinstance(field, serializers.ListSerializer):
+                if prefix:
+                    raise ImproperlyConfigured(
+                        f"Nested many fields are only supported at the top level, "
+                        f"{serializer.__class__.__name__}.{name} is not."
+                    )
+                plan.append((name, "many", None, None))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested_model = field.Meta.model
+                nested_plan = cls.compile_fields(field, nested_model, path + "__")
+                plan.append((name, "nested", path + "__pk", nested_plan))
+            elif isinstance(field, serializers.SerializerMethodField):
+                plan.append((name, "method", None, None))
+            elif isinstance(field, PrimaryKeyRelatedField):
+                plan.append((name, "value", path, None))
+            elif isinstance(field, SlugRelatedField):
+                plan.append((name, "field", f"{path}__{field.slug_field}", field))
+            elif isinstance(field, serializers.FileField):
+                model_field = cls.get_model_field(model, field.source)
+                plan.append((name, "file", path, (field, model_field)))
+            else:
+                plan.append((name, "field", path, field))
+
+        return plan
+
+    @staticmethod
+    def get_model_field(model, source):
+        *relations, field_name = source.split(".")
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(field_name)
+
+    def get_values_fields(self, plan=None):
+        """Return every `.values()` path the plan reads."""
+        paths = []
+        for name, kind, path, extra in self.plan if plan is None else plan:
+            if kind == "nested":
+                paths.append(path)
+                paths.extend(self.get_values_fields(extra))
+            elif path is not None:
+                paths.append(path)
+        return paths
+
+    def get_queryset(self, queryset, *extra_fields):
+        """Turn a queryset of the model into the rows the plan reads."""
+        fields = dict.fromkeys(["pk", *extra_fields, *self.get_values_fields()])
+        return queryset.values(*fields)
+
+    def to_file_representation(self, value, field, model_field):
+        if not value:
+            return None
+
+        if not getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+            return value
+
+        url = model_field.storage.url(value)
+        request = self.context.get("request")
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def render(self, row, plan):
+        data = {}
+        for name, kind, path, extra in plan:
+            if kind == "nested":
+                data[name] = None if row[path] is None else self.render(row, extra)
+            elif kind in ("method", "many"):
+                data[name] = None
+            else:
+                value = row[path]
+                if value is None:
+                    data[name] = None
+                elif kind == "file":
+                    data[name] = self.to_file_representation(value, *extra)
+                elif kind == "field":
+                    data[name] = extra.to_representation(value)
+                else:
+                    data[name] = value
+        return data
+
+    def to_representation(self, row):
+        return self.render(row, self.plan)
+
+    def serialize_rows(self, rows):
+        """Render rows read with `get_queryset` into serializer data."""
+        rows = list(rows)
+        data = [self.to_representation(row) for row in rows]
+
+        if not rows:
+            return data
+
+        # Reverse relations are read with one query per relation
+        for name, relation, child_plan in self.many:
+            children = {}
+            related_rows = (
+                relation.related_model.objects.filter(
+                    **{f"{relation.field.name}__in": [row["pk"] for row in rows]}
+                )
+                .order_by("pk")
+                .values(relation.field.attname, *self.get_values_fields(child_plan))
+            )
+            for related_row in related_rows:
+                children.setdefault(related_row[relation.field.attname], []).append(
+                    self.render(related_row, child_plan)
+                )
+            for row, item in zip(rows, data):
+                item[name] = children.get(row["pk"], [])
+
+        return data
+
+    def serialize(self, queryset):
+        """Render a queryset of the model into serializer data."""
+        return self.serialize_rows(self.get_queryset(queryset))
@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 
 from rest_framework import serializers
 
+from chat.presence import is_online
+
 User = get_user_model()
 
 
@@ -19,3 +21,30 @@ class UserSerializer(serializers.ModelSerializer):
             "created_at",
         ]
         read_only_fields = fields
+
+
+class FriendSerializer(UserSerializer):
+    is_online = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["is_online"]
+        read_only_fields = fields
+
+    def get_is_online(self, obj):
+        # Views put the presence of the whole page in the context, otherwise
+        # it is looked up once for the whole list being serialized
+        if "online" not in self.context:
+            if not isinstance(self.parent, serializers.ListSerializer):
+                return is_online([obj.id])[obj.id]
+            self.context["online"] = is_online(
+                user.id for user in self.parent.instance
+            )
+        return self.context["online"].get(obj.id, False)
+
+
+class FriendSuggestionSerializer(UserSerializer):
+    mutual_friends = serializers.IntegerField(read_only=True)
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["mutual_friends"]
+        read_only_fields = fields
@@ -1,7 +1,17 @@
+from django.db import models, transaction
+
 from rest_framework import serializers
 
-from chat.models import Message, Attachment, MessageReaction, ChatRoom
+from chat.models import (
+    Message,
+    Attachment,
+    MessageReaction,
+    ChatRoomMembership,
+)
 from chat.rest.serializers.friends import UserSerializer
+from chat.message_cache import render_messages
+from chat.access import resolve_chat_room_member
+from chat.consumers.broadcast import broadcast_saved_message
 
 
 class AttachmentSerializer(serializers.ModelSerializer):
@@ -50,18 +60,28 @@ class MessageReplySerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class MessageListSerializer(serializers.ListSerializer):
+    """Render a list of messages from their cached payloads."""
+
+    def to_representation(self, data):
+        messages = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return render_messages(list(messages), self.child)
+
+
 class MessageSerializer(serializers.ModelSerializer):
     content = serializers.CharField(required=False)
     sender = UserSerializer(read_only=True)
-    read_by = UserSerializer(read_only=True, many=True)
+    read_by = serializers.SerializerMethodField()
     attachment = AttachmentSerializer(required=False)
     reply_to = MessageReplySerializer(read_only=True)
     message_reactions = MessageReactionSerializer(read_only=True, many=True)
 
     class Meta:
         model = Message
+        list_serializer_class = MessageListSerializer
         fields = [
             "uid",
+            "seq",
             "content",
             "sender",
             "attachment",
@@ -75,6 +95,24 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields.remove("content")
         read_only_fields.remove("attachment")
 
+    def get_read_watermarks(self, chat_room_id):
+        """Get the (last read message id, user) pairs of the chat room members."""
+        # Loaded once per chat room and shared by every message of the page
+        read_watermarks = self.context.setdefault("read_watermarks", {})
+        if chat_room_id not in read_watermarks:
+            read_watermarks[chat_room_id] = [
+                (membership.last_read_message_id, UserSerializer(membership.user).data)
+                for membership in ChatRoomMembership.get_read_watermarks(chat_room_id)
+            ]
+        return read_watermarks[chat_room_id]
+
+    def get_read_by(self, obj):
+        return [
+            user
+            for last_read_message_id, user in self.get_read_watermarks(obj.chat_room_id)
+            if obj.id <= last_read_message_id
+        ]
+
     def validate(self, attrs):
         content = attrs.get("content")
         attachment = attrs.get("attachment")
@@ -93,23 +131,24 @@ class MessageSerializer(serializers.ModelSerializer):
         content = validated_data.get("content")
         attachment = validated_data.get("attachment")
 
-        # Check if the chat room exists
-        try:
-            chat_room = ChatRoom.objects.get(uid=room_uid)
-        except ChatRoom.DoesNotExist:
+        # Check if the chat room exists, loaded once for the request
+        chat_room, _ = resolve_chat_room_member(self.context["request"], room_uid)
+        if chat_room is None:
             raise serializers.ValidationError("Chat room not found with the given uid")
 
-        # Create attachment if provided
-        if attachment:
-            attachment = Attachment.objects.create(**attachment)
-
-        # Create message
-        message = Message.objects.create(
-            chat_room=chat_room,
-            sender=user,
-            content=content if content else None,
-            attachment=attachment if attachment else None,
-        )
-        message.read_by.add(user)
+        with transaction.atomic():
+            # Create attachment if provided
+            if attachment:
+                attachment = Attachment.objects.create(**attachment)
+
+            # Create message, the sender read watermark moves along with it
+            message = Message.create_message(
+                chat_room=chat_room,
+                sender=user,
+                content=content if content else None,
+                attachment=attachment if attachment else None,
+            )
+            # Connected members receive it like a websocket message
+            transaction.on_commit(lambda: broadcast_saved_message(message))
 
         return message
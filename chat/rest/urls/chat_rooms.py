@@ -6,6 +6,7 @@ from chat.rest.views.chat_rooms import (
     GroupChatList,
     GroupChatMember,
     GroupChatMemberDetail,
+    GroupChatInvitationStatus,
 )
 
 urlpatterns = [
@@ -22,5 +23,10 @@ urlpatterns = [
         GroupChatMemberDetail.as_view(),
         name="group-chat-member-detail",
     ),
+    path(
+        "/group-chat/<uuid:chat_room_uid>/invitations/<uuid:task_id>",
+        GroupChatInvitationStatus.as_view(),
+        name="group-chat-invitation-status",
+    ),
     path("/<uuid:chat_room_uid>/messages", include("chat.rest.urls.messages")),
 ]
@@ -1,8 +1,9 @@
 from django.urls import path
 
-from chat.rest.views.messages import MessageList, MessageDetail
+from chat.rest.views.messages import MessageList, MessageDetail, MessageExport
 
 urlpatterns = [
     path("", MessageList.as_view(), name="chat-room-message-list"),
+    path("/export", MessageExport.as_view(), name="chat-room-message-export"),
     path("/<uuid:message_uid>",MessageDetail.as_view(), name="chat-room-message-detail"),
 ]
@@ -1,4 +1,7 @@
-from django.db.models import OuterRef, Subquery
+from django.db.models import F
+from django.core.cache import cache
+
+from celery.result import AsyncResult
 
 from rest_framework.generics import (
     ListAPIView,
@@ -6,18 +9,24 @@ from rest_framework.generics import (
     ListCreateAPIView,
     RetrieveUpdateAPIView,
 )
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.exceptions import NotFound
 
-from chat.models import ChatRoomMembership, Message, ChatRoom
+from chat.models import ChatRoomMembership
 from chat.rest.serializers.chat_rooms import (
     ChatRoomMembershipListSerializer,
     ChatRoomSerializer,
     ChatRoomMembershipSerializer,
     GroupChatMemberInviteSerializer,
 )
+from chat.inbox import UserInbox
+from chat.access import resolve_chat_room_member
 from chat.permissions import IsChatRoomActiveMember, IsMemberHasInvitationAccess, HasUpdateAccessToRoomMembership
 
+from shared.cache_key import get_invitation_task_cache_key
+
 
 class ChatRoomList(ListAPIView):
     """Chat room list for the user"""
@@ -26,29 +35,22 @@ class ChatRoomList(ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        # Subquery to get the last message username and contentin each chat room
-        last_message_username_subquery = (
-            Message.objects.filter(chat_room=OuterRef("chat_room"))
-            .order_by("-created_at")
-            .values("sender__username")[:1]
-        )
-        last_message_content_subquery = (
-            Message.objects.filter(chat_room=OuterRef("chat_room"))
-            .order_by("-created_at")
-            .values("content")[:1]
+        # Last message and unread count are maintained on the rows themselves
+        return ChatRoomMembership.get_inbox_memberships(self.request.user).order_by(
+            F("last_message_at").desc(nulls_last=True), "-id"
         )
 
-        return (
-            ChatRoomMembership.objects.filter(user=self.request.user)
-            .select_related(
-                "user",
-                "chat_room__creator",
-            )
-            .annotate(
-                last_message_by=Subquery(last_message_username_subquery),
-                last_message_content=Subquery(last_message_content_subquery),
-            )
-        )
+    def list(self, request, *args, **kwargs):
+        # Serve the pages from the cached inbox, built on the first read
+        inbox = UserInbox(request.user.id)
+        if not inbox.is_built():
+            inbox.build(self.get_queryset())
+
+        page = self.paginate_queryset(inbox)
+        if page is not None:
+            return self.get_paginated_response(page)
+
+        return Response(inbox[: inbox.count()])
 
 
 class ChatRoomDetail(RetrieveAPIView):
@@ -91,9 +93,10 @@ class GroupChatMember(ListCreateAPIView):
         return [IsMemberHasInvitationAccess()]
 
     def get_queryset(self):
-        try:
-            chat_room = ChatRoom.objects.get(uid=self.kwargs.get("chat_room_uid"))
-        except ChatRoom.DoesNotExist:
+        chat_room, _ = resolve_chat_room_member(
+            self.request, self.kwargs.get("chat_room_uid")
+        )
+        if chat_room is None:
             raise NotFound("Chat room not found with the given uid")
 
         if not chat_room.is_group_chat:
@@ -104,6 +107,23 @@ class GroupChatMember(ListCreateAPIView):
         )
 
 
+class GroupChatInvitationStatus(APIView):
+    """Progress of the invitations of a group chat sent by a worker"""
+
+    permission_classes = [IsMemberHasInvitationAccess]
+
+    def get(self, request, chat_room_uid, task_id):
+        # Tasks are only found by their sender, from their chat room
+        chat_room, _ = resolve_chat_room_member(request, chat_room_uid)
+        owner = cache.get(get_invitation_task_cache_key(task_id))
+        if chat_room is None or owner != (chat_room.id, request.user.id):
+            raise NotFound("Invitation task not found with the given id")
+
+        result = AsyncResult(str(task_id))
+        progress = result.info if isinstance(result.info, dict) else {}
+        return Response({"task_id": result.id, "state": result.state, **progress})
+
+
 class GroupChatMemberDetail(RetrieveUpdateAPIView):
     """Group chat member detail view"""
 
@@ -116,9 +136,10 @@ class GroupChatMemberDetail(RetrieveUpdateAPIView):
         # return [IsAuthenticated()]
 
     def get_object(self):
-        try:
-            chat_room = ChatRoom.objects.get(uid=self.kwargs.get("chat_room_uid"))
-        except ChatRoom.DoesNotExist:
+        chat_room, _ = resolve_chat_room_member(
+            self.request, self.kwargs.get("chat_room_uid")
+        )
+        if chat_room is None:
             raise NotFound("Chat room not found with the given uid")
 
         if not chat_room.is_group_chat:
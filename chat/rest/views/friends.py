@@ -1,9 +1,16 @@
 from rest_framework.generics import ListAPIView, ListCreateAPIView, UpdateAPIView
 from rest_framework.permissions import IsAuthenticated
 
-from chat.rest.serializers.friends import UserSerializer
+from chat.rest.serializers.friends import (
+    UserSerializer,
+    FriendSerializer,
+    FriendSuggestionSerializer,
+)
 from chat.rest.serializers.chat_rooms import ChatRoomInvitationSerializer
+from chat.rest.views.mixins import CompiledListMixin
 from chat.models import ChatRoomInvitation
+from chat.pagination import UserCursorPagination
+from chat.presence import is_online
 
 
 class AddFriendsView(ListAPIView):
@@ -11,22 +18,42 @@ class AddFriendsView(ListAPIView):
 
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = UserCursorPagination
 
     def get_queryset(self):
-        return ChatRoomInvitation().get_user_add_friend_list(user=self.request.user)
+        return ChatRoomInvitation.get_user_add_friend_list(
+            user=self.request.user, search=self.request.query_params.get("search")
+        )
+
+
+class FriendSuggestionListView(ListAPIView):
+    """Friends of friends of the user ranked by their mutual friends"""
+
+    serializer_class = FriendSuggestionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ChatRoomInvitation.get_user_friend_suggestions(user=self.request.user)
 
 
 class FriendListView(ListAPIView):
     """Friend list for the user"""
 
-    serializer_class = UserSerializer
+    serializer_class = FriendSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         return ChatRoomInvitation().get_user_friend_list(user=self.request.user)
 
+    def get_serializer(self, *args, **kwargs):
+        # Look up the presence of every listed friend at once
+        if args and kwargs.get("many"):
+            kwargs["context"] = self.get_serializer_context()
+            kwargs["context"]["online"] = is_online(user.id for user in args[0])
+        return super().get_serializer(*args, **kwargs)
+
 
-class FriendRequestListView(ListCreateAPIView):
+class FriendRequestListView(CompiledListMixin, ListCreateAPIView):
     """Friend request list for the user"""
 
     serializer_class = ChatRoomInvitationSerializer
@@ -36,7 +63,7 @@ class FriendRequestListView(ListCreateAPIView):
         return ChatRoomInvitation().get_user_friend_request(user=self.request.user).filter(chat_room__is_group_chat=False)
 
 
-class GroupChatRequestListView(ListCreateAPIView):
+class GroupChatRequestListView(CompiledListMixin, ListCreateAPIView):
     """Group chat request list for the user"""
 
     serializer_class = ChatRoomInvitationSerializer
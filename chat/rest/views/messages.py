@@ -1,10 +1,24 @@
+from django.http import StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+
+from rest_framework.views import APIView
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 
-from chat.models import Message, ChatRoom
+from chat.models import Message
+from chat.access import resolve_chat_room_member
 from chat.permissions import IsChatRoomActiveMember, HasWriteAccessToChatRoom
+from chat.pagination import MessageCursorPagination
+from chat.read_receipts import queue_read_receipt
 from chat.rest.serializers.messages import MessageSerializer
+from chat.export import (
+    NDJSON,
+    EXPORT_FORMATS,
+    export_chat_room,
+    aexport_chat_room,
+    get_export_filename,
+)
 
 from shared.services import CachedQuerysetMixin
 from shared.cache_key import get_chat_room_messages_cache_key
@@ -14,48 +28,111 @@ class MessageList(CachedQuerysetMixin, ListCreateAPIView):
     """Message list view"""
 
     serializer_class = MessageSerializer
+    pagination_class = MessageCursorPagination
 
     def get_permissions(self):
         if self.request.method in SAFE_METHODS:
             return [IsChatRoomActiveMember()]
         return [HasWriteAccessToChatRoom()]
 
-    def get_cache_key(self):
+    def get_cache_scope(self):
         room_uid = self.kwargs.get("chat_room_uid")
         return get_chat_room_messages_cache_key(room_uid)
 
     def fetch_queryset(self):
-        room_uid = self.kwargs.get("chat_room_uid")
-
-        # Check if the chat room exists
-        try:
-            chat_room = ChatRoom.objects.get(uid=room_uid)
-        except ChatRoom.DoesNotExist:
+        # Loaded along with the membership checked by the permission
+        chat_room, _ = resolve_chat_room_member(
+            self.request, self.kwargs.get("chat_room_uid")
+        )
+        if chat_room is None:
             raise NotFound("Chat room not found with the given uid")
 
+        # Only what the pagination needs, the payloads are rendered from the cache
         messages = (
             Message()
             .get_active_instance()
             .filter(chat_room=chat_room)
-            .select_related(
-                "sender",
-                "attachment",
-                "reply_to__sender",
-                "reply_to__attachment",
-            )
-            .prefetch_related(
-                "read_by",
-                "message_reactions__user",
-            )
-            .order_by("-created_at")
+            .only("id", "uid", "version", "chat_room", "created_at")
+            .order_by("-created_at", "-id")
         )
 
-        # Update the read_by field
-        for message in messages:
-            if self.request.user not in message.read_by.all():
-                message.read_by.add(self.request.user)
-
         return messages
 
+    def get_cacheable_data(self, data):
+        # Read by lists move with every read, they are derived on each request
+        # from the read watermarks and only the message ids are cached, by uid
+        # since messages deleted meanwhile are left out of the results
+        results = [
+            {key: value for key, value in message.items() if key != "read_by"}
+            for message in data["results"]
+        ]
+        message_ids = {str(message.uid): message.id for message in self.paginator.page}
+        return {**data, "results": results, "message_ids": message_ids}
+
+    def finalize_list(self, data):
+        chat_room, _ = resolve_chat_room_member(
+            self.request, self.kwargs.get("chat_room_uid")
+        )
+        read_watermarks = self.get_serializer().get_read_watermarks(chat_room.id)
+
+        data = dict(data)
+        self.message_ids = data.pop("message_ids")
+        for message in data["results"]:
+            message_id = self.message_ids[str(message["uid"])]
+            message["read_by"] = [
+                user
+                for last_read_message_id, user in read_watermarks
+                if message_id <= last_read_message_id
+            ]
+        return data
+
+    def after_list(self, data):
+        # Mark the returned page as read, the receipt is flushed in batches.
+        # The ids come with the cached page, a hit does not query the messages
+        if not data.get("results"):
+            return
+
+        chat_room, _ = resolve_chat_room_member(
+            self.request, self.kwargs.get("chat_room_uid")
+        )
+        queue_read_receipt(
+            user_id=self.request.user.id,
+            chat_room_id=chat_room.id,
+            up_to_message_id=self.message_ids[str(data["results"][0]["uid"])],
+        )
+
+
+class MessageExport(APIView):
+    """
+    Download the whole history of a chat room as gzipped NDJSON, or CSV
+    with `?file_format=csv`, streamed while it is read from the database.
+    """
+
+    permission_classes = [IsChatRoomActiveMember]
+
+    def get(self, request, chat_room_uid):
+        export_format = request.query_params.get("file_format", NDJSON)
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError(
+                f"file_format must be one of {', '.join(EXPORT_FORMATS)}."
+            )
+
+        chat_room, _ = resolve_chat_room_member(request, chat_room_uid)
+        if chat_room is None:
+            raise NotFound("Chat room not found with the given uid")
+
+        # Each server streams its own kind of iterator, WSGI would read an
+        # asynchronous one into memory before sending it
+        if isinstance(request._request, ASGIRequest):
+            chunks = aexport_chat_room(chat_room, export_format)
+        else:
+            chunks = export_chat_room(chat_room, export_format)
+
+        response = StreamingHttpResponse(chunks, content_type="application/gzip")
+        filename = get_export_filename(chat_room, export_format)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
 class MessageDetail(RetrieveUpdateDestroyAPIView):
     pass
@@ -0,0 +1,19 @@
+from rest_framework.response import Response
+
+from chat.rest.serializers.compiled import CompiledSerializer
+
+
+class CompiledListMixin:
+    """Serve list requests through the compiled form of the serializer class."""
+
+    def list(self, request, *args, **kwargs):
+        compiled = CompiledSerializer(
+            self.get_serializer_class(), self.get_serializer_context()
+        )
+        queryset = compiled.get_queryset(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.serialize_rows(page))
+
+        return Response(compiled.serialize_rows(queryset))
@@ -1,20 +1,48 @@
-from chat.models import Message
 from celery import shared_task
-from chat.rest.serializers.messages import MessageSerializer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+
+from chat.models import Message, ChatRoom, ChatRoomInvitation
+from chat.read_receipts import mark_chat_room_as_read, flush_pending_read_receipts
 
 
 @shared_task
 def update_message_read_by(message_ids, user_id):
-    from django.contrib.auth import get_user_model
-    from chat.models import Message
+    # Move the read watermark to the newest of the messages in each chat room
+    newest_messages = (
+        Message.objects.filter(id__in=message_ids)
+        .values("chat_room_id")
+        .annotate(newest_message_id=Max("id"))
+    )
+    for newest_message in newest_messages:
+        mark_chat_room_as_read(
+            user_id=user_id,
+            chat_room_id=newest_message["chat_room_id"],
+            up_to_message_id=newest_message["newest_message_id"],
+        )
+
+
+@shared_task
+def flush_read_receipts():
+    # Merge the receipts queued by every user into a single update
+    return flush_pending_read_receipts()
+
 
-    User = get_user_model()
+@shared_task(bind=True)
+def send_group_chat_invitations(self, chat_room_id, sender_id, receiver_ids):
+    # Invite the users batch by batch, the progress is reported between them
+    chat_room = ChatRoom.objects.get(pk=chat_room_id)
+    sender = get_user_model().objects.get(pk=sender_id)
+    batch_size = getattr(settings, "INVITATION_BATCH_SIZE", 500)
 
-    # Fetch the user and messages
-    user = User.objects.get(id=user_id)
-    messages = Message.objects.filter(id__in=message_ids)
+    progress = {"processed": 0, "total": len(receiver_ids), "invited": 0}
+    for start in range(0, len(receiver_ids), batch_size):
+        batch = receiver_ids[start : start + batch_size]
+        progress["invited"] += ChatRoomInvitation.send_group_chat_invitations(
+            chat_room=chat_room, sender=sender, receiver_ids=batch
+        )
+        progress["processed"] += len(batch)
+        self.update_state(state="PROGRESS", meta=progress)
 
-    # Update the read_by field for each message
-    for message in messages:
-        if user not in message.read_by.all():
-            message.read_by.add(user)
+    return progress
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+import fakeredis
+
+from chat import blocks
+from chat.models import BlockList
+from shared.cache_key import get_user_blocks_cache_key
+
+
+User = get_user_model()
+
+
+class BlockCacheTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        # Block changes also refresh the inboxes
+        for target in ("chat.blocks.get_redis_client", "chat.inbox.get_redis_client"):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        blocks.LOCAL_BLOCKS.clear()
+        self.addCleanup(blocks.LOCAL_BLOCKS.clear)
+
+        self.alice, self.bob, self.carol = [
+            User.objects.create_user(
+                email=f"{name}@example.com",
+                username=name,
+                first_name=name,
+                last_name=name,
+                password="password",
+            )
+            for name in ("alice", "bob", "carol")
+        ]
+
+    def block(self, user, blocked_by):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BlockList.objects.create(user=user, blocked_by=blocked_by)
+
+    def test_blocks_are_loaded_once(self):
+        self.block(self.bob, self.alice)
+
+        self.assertTrue(blocks.is_blocked(self.alice.id, self.bob.id))
+        blocks.LOCAL_BLOCKS.clear()
+        with self.assertNumQueries(0):
+            self.assertTrue(blocks.is_blocked(self.alice.id, self.bob.id))
+            self.assertFalse(blocks.is_blocked(self.alice.id, self.carol.id))
+
+    def test_users_without_blocks_are_cached(self):
+        blocks.get_blocks([self.carol.id])
+        blocks.LOCAL_BLOCKS.clear()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                blocks.get_blocks([self.carol.id]),
+                {self.carol.id: (frozenset(), frozenset())},
+            )
+
+    def test_changes_clear_the_cached_blocks(self):
+        self.assertFalse(blocks.is_blocked(self.alice.id, self.bob.id))
+
+        block = self.block(self.bob, self.alice)
+        self.assertTrue(blocks.is_blocked(self.alice.id, self.bob.id))
+        self.assertTrue(blocks.is_blocked(self.bob.id, self.alice.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            block.delete()
+        self.assertFalse(blocks.is_blocked(self.alice.id, self.bob.id))
+
+    def test_blocks_cleared_while_loading_are_not_stored(self):
+        load_blocks = blocks.load_blocks
+
+        def load_then_block(user_ids):
+            # The block commits after the stale sets were read
+            loaded = load_blocks(user_ids)
+            self.block(self.bob, self.alice)
+            return loaded
+
+        with mock.patch("chat.blocks.load_blocks", side_effect=load_then_block):
+            self.assertFalse(blocks.is_blocked(self.alice.id, self.bob.id))
+
+        self.assertFalse(self.redis.exists(get_user_blocks_cache_key(self.alice.id)))
+        self.assertTrue(blocks.is_blocked(self.alice.id, self.bob.id))
@@ -0,0 +1,150 @@
+from unittest import mock
+
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+
+from rest_framework.test import APIClient
+
+import fakeredis
+
+from chat.models import ChatRoom, ChatRoomMembership, Message
+
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ChatRoomListTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target in ("chat.inbox.get_redis_client", "chat.blocks.get_redis_client"):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+
+        self.alice, self.bob = [
+            User.objects.create_user(
+                email=f"{name}@example.com",
+                username=name,
+                first_name=name,
+                last_name=name,
+                password="password",
+            )
+            for name in ("alice", "bob")
+        ]
+        self.general, self.random, self.quiet = [
+            ChatRoom.objects.create(name=name, is_group_chat=True)
+            for name in ("general", "random", "quiet")
+        ]
+        for chat_room in (self.general, self.random, self.quiet):
+            for user in (self.alice, self.bob):
+                ChatRoomMembership.objects.create(user=user, chat_room=chat_room)
+
+    def send(self, sender, chat_room, *contents):
+        return Message.create_messages(
+            [
+                Message(content=content, sender=sender, chat_room=chat_room)
+                for content in contents
+            ]
+        )
+
+    def get(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get("/api/v1/chat-room")
+
+    def summaries(self, response):
+        return [
+            (
+                room["chat_room"]["name"],
+                room["last_message_by"],
+                room["last_message_content"],
+                room["unread_count"],
+            )
+            for room in response.data["results"]
+        ]
+
+    def test_new_messages_update_the_room_and_its_members(self):
+        self.send(self.alice, self.general, "hello", "anyone?")
+
+        self.general.refresh_from_db()
+        self.assertEqual(self.general.last_message.content, "anyone?")
+        self.assertEqual(
+            self.general.last_message_at, self.general.last_message.created_at
+        )
+        memberships = ChatRoomMembership.objects.filter(chat_room=self.general)
+        self.assertEqual(
+            {
+                membership.user.username: membership.unread_count
+                for membership in memberships
+            },
+            {"alice": 0, "bob": 2},
+        )
+
+    def test_inbox_lists_the_last_message_and_unread_count(self):
+        self.send(self.alice, self.general, "hello")
+        self.send(self.alice, self.random, "first", "second")
+
+        self.assertEqual(
+            self.summaries(self.get(self.bob)),
+            [
+                ("random", "alice", "second", 2),
+                ("general", "alice", "hello", 1),
+                ("quiet", None, None, 0),
+            ],
+        )
+
+    def test_built_inboxes_are_read_without_queries(self):
+        self.send(self.alice, self.general, "hello")
+        self.get(self.bob)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(self.bob)
+
+        self.assertFalse([query for query in queries if 'FROM "chat_' in query["sql"]])
+        self.assertEqual(
+            [room["chat_room"]["name"] for room in response.data["results"]],
+            ["general", "quiet", "random"],
+        )
+
+    def test_inboxes_are_updated_in_place(self):
+        (message,) = self.send(self.alice, self.general, "hello")
+        self.get(self.bob)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send(self.alice, self.quiet, "psst")
+        with self.captureOnCommitCallbacks(execute=True):
+            ChatRoomMembership.mark_as_read(self.bob.id, self.general.id, message.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.random.name = "off-topic"
+            self.random.save()
+
+        with mock.patch("chat.rest.views.chat_rooms.UserInbox.build") as build:
+            response = self.get(self.bob)
+
+        build.assert_not_called()
+        self.assertEqual(
+            self.summaries(response),
+            [
+                ("quiet", "alice", "psst", 1),
+                ("general", "alice", "hello", 0),
+                ("off-topic", None, None, 0),
+            ],
+        )
+
+    def test_deleted_rooms_leave_the_inbox(self):
+        self.get(self.bob)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.random.delete()
+
+        self.assertEqual(
+            [room["chat_room"]["name"] for room in self.get(self.bob).data["results"]],
+            ["quiet", "general"],
+        )
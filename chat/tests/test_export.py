@@ -0,0 +1,112 @@
+import csv
+import gzip
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from asgiref.sync import sync_to_async
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+import fakeredis
+
+from chat.models import ChatRoom, ChatRoomMembership, Message
+
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    EXPORT_CHUNK_SIZE=10,
+)
+class MessageExportTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target in ("chat.inbox.get_redis_client", "chat.blocks.get_redis_client"):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+
+        self.alice, self.bob = [
+            User.objects.create_user(
+                email=f"{name}@example.com",
+                username=name,
+                first_name=name,
+                last_name=name,
+                password="password",
+            )
+            for name in ("alice", "bob")
+        ]
+        self.chat_room = ChatRoom.objects.create(name="room", is_group_chat=True)
+        ChatRoomMembership.objects.create(user=self.alice, chat_room=self.chat_room)
+        Message.create_messages(
+            [
+                Message(
+                    content=f"message {index}",
+                    sender=self.alice,
+                    chat_room=self.chat_room,
+                )
+                for index in range(25)
+            ]
+        )
+        self.url = f"/api/v1/chat-room/{self.chat_room.uid}/messages/export"
+
+    def get(self, user, query=""):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(self.url + query)
+
+    def test_wsgi_requests_stream_a_synchronous_gzip(self):
+        response = self.get(self.alice)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="room.ndjson.gz"'
+        )
+        rows = [
+            json.loads(line)
+            for line in gzip.decompress(b"".join(response.streaming_content))
+            .decode()
+            .splitlines()
+        ]
+        self.assertEqual(
+            [row["content"] for row in rows],
+            [f"message {index}" for index in range(25)],
+        )
+        self.assertEqual([row["seq"] for row in rows], list(range(1, 26)))
+
+    async def test_asgi_requests_stream_an_asynchronous_gzip(self):
+        client = AsyncClient()
+        token = await sync_to_async(AccessToken.for_user)(self.alice)
+
+        response = await client.get(
+            self.url, headers={"Authorization": f"Bearer {token}"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        rows = gzip.decompress(content).decode().splitlines()
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(json.loads(rows[-1])["content"], "message 24")
+
+    def test_csv_export(self):
+        response = self.get(self.alice, "?file_format=csv")
+
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(lines.splitlines()))
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[0]["sender"], "alice")
+        self.assertEqual(rows[0]["content"], "message 0")
+
+    def test_unknown_formats_are_rejected(self):
+        self.assertEqual(self.get(self.alice, "?file_format=xml").status_code, 400)
+
+    def test_non_members_cannot_export(self):
+        self.assertEqual(self.get(self.bob).status_code, 403)
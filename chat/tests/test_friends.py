@@ -0,0 +1,133 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from rest_framework.test import APIClient
+
+import fakeredis
+
+from chat.choices import InvitationStatusChoices, UserRoleChoices
+from chat.models import BlockList, ChatRoom, ChatRoomInvitation, ChatRoomMembership
+from chat.presence import touch_connection
+
+
+User = get_user_model()
+
+
+class FriendListTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target in (
+            "chat.inbox.get_redis_client",
+            "chat.blocks.get_redis_client",
+            "chat.presence.get_redis_client",
+        ):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.users = {
+            name: User.objects.create_user(
+                email=f"{name}@example.com",
+                username=name,
+                first_name=name,
+                last_name=name,
+                password="password",
+            )
+            for name in ("alice", "Bob", "bonnie", "carol", "dave")
+        }
+
+    def befriend(self, sender, receiver, status=InvitationStatusChoices.ACCEPTED):
+        ChatRoomInvitation.objects.create(
+            chat_room=ChatRoom.objects.create(is_group_chat=False, creator=sender),
+            sender=sender,
+            receiver=receiver,
+            invitation_status=status,
+        )
+
+    def get(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(url)
+
+    def usernames(self, response):
+        return [user["username"] for user in response.data["results"]]
+
+    def test_add_friends_search_ignores_case(self):
+        alice = self.users["alice"]
+
+        for search in ("bo", "BO"):
+            response = self.get(alice, f"/api/v1/add-friends?search={search}")
+            self.assertEqual(self.usernames(response), ["Bob", "bonnie"])
+
+        response = self.get(alice, "/api/v1/add-friends?search=CAROL@EXAMPLE")
+        self.assertEqual(self.usernames(response), ["carol"])
+
+    def test_friends_are_listed_from_both_sides_of_accepted_invitations(self):
+        alice, bob, bonnie, carol, dave = self.users.values()
+        self.befriend(alice, bob)
+        self.befriend(carol, alice)
+        self.befriend(alice, bonnie, status=InvitationStatusChoices.PENDING)
+        # Members of a group chat are not friends
+        group_chat = ChatRoom.objects.create(name="group", is_group_chat=True)
+        ChatRoomMembership.objects.create(
+            user=alice, chat_room=group_chat, role=UserRoleChoices.ADMIN
+        )
+        ChatRoomInvitation.objects.create(
+            chat_room=group_chat,
+            sender=alice,
+            receiver=dave,
+            invitation_status=InvitationStatusChoices.ACCEPTED,
+        )
+        touch_connection(bob.id, "specific.worker!connection")
+
+        response = self.get(alice, "/api/v1/friends")
+
+        self.assertEqual(
+            [
+                (user["username"], user["is_online"])
+                for user in response.data["results"]
+            ],
+            [("Bob", True), ("carol", False)],
+        )
+
+    def test_friends_who_blocked_the_user_are_not_listed(self):
+        alice, bob, _, carol, _ = self.users.values()
+        self.befriend(alice, bob)
+        self.befriend(alice, carol)
+        BlockList.objects.create(user=alice, blocked_by=carol)
+
+        response = self.get(alice, "/api/v1/friends")
+
+        self.assertEqual(self.usernames(response), ["Bob"])
+
+    def test_add_friends_leave_out_friends_and_blockers_page_by_page(self):
+        alice, bob, _, carol, dave = self.users.values()
+        self.befriend(bob, alice)
+        BlockList.objects.create(user=alice, blocked_by=dave)
+
+        response = self.get(alice, "/api/v1/add-friends?page_size=1")
+        self.assertEqual(self.usernames(response), ["bonnie"])
+
+        response = self.get(alice, response.data["next"])
+        self.assertEqual(self.usernames(response), ["carol"])
+        self.assertIsNone(response.data["next"])
+
+    def test_suggestions_are_ranked_by_mutual_friends(self):
+        alice, bob, bonnie, carol, dave = self.users.values()
+        self.befriend(alice, bob)
+        self.befriend(carol, alice)
+        self.befriend(bob, bonnie)
+        self.befriend(dave, bob)
+        self.befriend(carol, bonnie)
+
+        response = self.get(alice, "/api/v1/friend-suggestions")
+
+        self.assertEqual(
+            [
+                (user["username"], user["mutual_friends"])
+                for user in response.data["results"]
+            ],
+            [("bonnie", 2), ("dave", 1)],
+        )
@@ -0,0 +1,127 @@
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from rest_framework.test import APIClient
+
+import fakeredis
+
+from chat.choices import UserRoleChoices
+from chat.models import ChatRoom, ChatRoomInvitation, ChatRoomMembership
+from chat.tasks import send_group_chat_invitations
+
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    INVITATION_BATCH_SIZE=2,
+    INVITATION_ASYNC_THRESHOLD=2,
+)
+class GroupChatInvitationTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target in ("chat.inbox.get_redis_client", "chat.blocks.get_redis_client"):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+
+        self.alice, self.bob, *self.users = [
+            User.objects.create_user(
+                email=f"{name}@example.com",
+                username=name,
+                first_name=name,
+                last_name=name,
+                password="password",
+            )
+            for name in ("alice", "bob", "user0", "user1", "user2", "user3", "user4")
+        ]
+        self.chat_room, self.other_chat_room = [
+            ChatRoom.objects.create(name=name, is_group_chat=True)
+            for name in ("group", "other group")
+        ]
+        for user in (self.alice, self.bob):
+            for chat_room in (self.chat_room, self.other_chat_room):
+                ChatRoomMembership.objects.create(
+                    user=user, chat_room=chat_room, role=UserRoleChoices.ADMIN
+                )
+
+    def api_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_task_reports_its_progress_after_every_batch(self):
+        # Members and users already invited are counted but not invited again
+        ChatRoomMembership.objects.create(user=self.users[0], chat_room=self.chat_room)
+        ChatRoomInvitation.objects.create(
+            chat_room=self.chat_room, sender=self.alice, receiver=self.users[1]
+        )
+        receiver_ids = [user.id for user in self.users]
+
+        # The states are copied like a result backend stores them
+        states = []
+        with mock.patch.object(
+            send_group_chat_invitations,
+            "update_state",
+            side_effect=lambda state, meta: states.append((state, dict(meta))),
+        ):
+            result = send_group_chat_invitations.apply(
+                args=(self.chat_room.id, self.alice.id, receiver_ids)
+            )
+
+        self.assertEqual(
+            states,
+            [
+                ("PROGRESS", {"processed": processed, "total": 5, "invited": invited})
+                for processed, invited in ((2, 0), (4, 2), (5, 3))
+            ],
+        )
+        self.assertEqual(result.get(), {"processed": 5, "total": 5, "invited": 3})
+        self.assertEqual(
+            ChatRoomInvitation.objects.filter(
+                chat_room=self.chat_room, sender=self.alice
+            ).count(),
+            4,
+        )
+
+    def test_only_the_sender_follows_the_task_from_its_chat_room(self):
+        task_id = str(uuid.uuid4())
+        url = f"/api/v1/chat-room/group-chat/{self.chat_room.uid}"
+
+        with mock.patch.object(
+            send_group_chat_invitations,
+            "delay",
+            return_value=SimpleNamespace(id=task_id),
+        ):
+            response = self.api_client(self.alice).post(
+                f"{url}/members",
+                {"users": [user.email for user in self.users]},
+                format="json",
+            )
+        self.assertEqual(response.data["task_id"], task_id)
+
+        progress = {"processed": 2, "total": 5, "invited": 2}
+        with mock.patch(
+            "chat.rest.views.chat_rooms.AsyncResult",
+            return_value=SimpleNamespace(id=task_id, state="PROGRESS", info=progress),
+        ):
+            response = self.api_client(self.alice).get(f"{url}/invitations/{task_id}")
+            self.assertEqual(
+                response.data, {"task_id": task_id, "state": "PROGRESS", **progress}
+            )
+
+            response = self.api_client(self.bob).get(f"{url}/invitations/{task_id}")
+            self.assertEqual(response.status_code, 404)
+
+            response = self.api_client(self.alice).get(
+                f"/api/v1/chat-room/group-chat/{self.other_chat_room.uid}"
+                f"/invitations/{task_id}"
+            )
+            self.assertEqual(response.status_code, 404)
@@ -0,0 +1,89 @@
+from collections import Counter
+
+from django.test import SimpleTestCase
+
+import fakeredis
+
+from chat.layers import HashRing, ShardedRedisChannelLayer
+
+
+HOSTS = [f"redis://shard{index}:6379" for index in range(4)]
+GROUPS = [f"room_{index}" for index in range(20000)]
+
+
+class HashRingTests(SimpleTestCase):
+    def test_values_are_spread_evenly(self):
+        ring = HashRing(HOSTS)
+        counts = Counter(ring.get_index(group) for group in GROUPS)
+
+        self.assertEqual(set(counts), {0, 1, 2, 3})
+        for count in counts.values():
+            self.assertAlmostEqual(count / len(GROUPS), 0.25, delta=0.04)
+
+    def test_placement_is_deterministic(self):
+        self.assertEqual(
+            [HashRing(HOSTS).get_index(group) for group in GROUPS[:1000]],
+            [HashRing(HOSTS).get_index(group) for group in GROUPS[:1000]],
+        )
+
+    def test_adding_a_node_only_moves_values_to_it(self):
+        ring = HashRing(HOSTS)
+        grown_ring = HashRing(HOSTS + ["redis://shard4:6379"])
+
+        moved = [
+            group
+            for group in GROUPS
+            if ring.get_index(group) != grown_ring.get_index(group)
+        ]
+
+        self.assertAlmostEqual(len(moved) / len(GROUPS), 0.2, delta=0.04)
+        self.assertEqual({grown_ring.get_index(group) for group in moved}, {4})
+
+    def test_reordering_nodes_moves_nothing(self):
+        ring = HashRing(HOSTS)
+        reordered_hosts = HOSTS[::-1]
+        reordered_ring = HashRing(reordered_hosts)
+
+        for group in GROUPS[:2000]:
+            self.assertEqual(
+                HOSTS[ring.get_index(group)],
+                reordered_hosts[reordered_ring.get_index(group)],
+            )
+
+
+class RebalanceTests(SimpleTestCase):
+    def setUp(self):
+        self.servers = [fakeredis.FakeServer() for _ in range(3)]
+
+    def get_channel_layer(self, shards):
+        channel_layer = ShardedRedisChannelLayer(hosts=HOSTS[:shards])
+        connections = [
+            fakeredis.aioredis.FakeRedis(server=server)
+            for server in self.servers[:shards]
+        ]
+        channel_layer.connection = lambda index: connections[index]
+        return channel_layer
+
+    async def get_members(self, channel_layer, group):
+        connection = channel_layer.connection(channel_layer.consistent_hash(group))
+        return await connection.zrange(channel_layer._group_key(group), 0, -1)
+
+    async def test_groups_move_to_their_new_shard(self):
+        channel_layer = self.get_channel_layer(2)
+        for index in range(200):
+            await channel_layer.group_add(f"room_{index}", f"specific.a!{index}")
+
+        grown_layer = self.get_channel_layer(3)
+        moved = await grown_layer.rebalance()
+
+        owners = [grown_layer.consistent_hash(f"room_{index}") for index in range(200)]
+        self.assertEqual(moved, owners.count(2))
+        self.assertGreater(moved, 0)
+        for index in range(200):
+            self.assertEqual(
+                await self.get_members(grown_layer, f"room_{index}"),
+                [f"specific.a!{index}".encode()],
+            )
+
+        # Every group is already on its owner
+        self.assertEqual(await grown_layer.rebalance(), 0)
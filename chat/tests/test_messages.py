@@ -0,0 +1,201 @@
+from unittest import mock
+
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+
+from rest_framework.test import APIClient
+
+import fakeredis
+
+from chat.models import ChatRoom, ChatRoomMembership, Message
+from chat.rest.views.messages import MessageList
+from chat.pagination import MessageCursorPagination
+from shared.cache_key import get_pending_read_receipts_cache_key
+
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class MessageListTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target in (
+            "chat.inbox.get_redis_client",
+            "chat.blocks.get_redis_client",
+            "chat.read_receipts.get_redis_client",
+        ):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch("chat.tasks.flush_read_receipts.apply_async")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+        self.alice, self.bob = [
+            User.objects.create_user(
+                email=f"{name}@example.com",
+                username=name,
+                first_name=name,
+                last_name=name,
+                password="password",
+            )
+            for name in ("alice", "bob")
+        ]
+        self.chat_room = ChatRoom.objects.create(name="room", is_group_chat=True)
+        for user in (self.alice, self.bob):
+            ChatRoomMembership.objects.create(user=user, chat_room=self.chat_room)
+        self.messages = Message.create_messages(
+            [
+                Message(
+                    content=f"message {index}",
+                    sender=self.alice,
+                    chat_room=self.chat_room,
+                )
+                for index in range(5)
+            ]
+        )
+        self.url = f"/api/v1/chat-room/{self.chat_room.uid}/messages"
+
+    def api_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def get(self, user, query=""):
+        return self.api_client(user).get(self.url + query)
+
+    def contents(self, response):
+        return [message["content"] for message in response.data["results"]]
+
+    def test_pages_walk_the_history_newest_first(self):
+        response = self.get(self.alice, "?page_size=2")
+        self.assertEqual(self.contents(response), ["message 4", "message 3"])
+        self.assertIsNone(response.data["previous"])
+
+        response = self.api_client(self.alice).get(response.data["next"])
+        self.assertEqual(self.contents(response), ["message 2", "message 1"])
+
+        response = self.api_client(self.alice).get(response.data["next"])
+        self.assertEqual(self.contents(response), ["message 0"])
+        self.assertIsNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_before_and_after_a_message(self):
+        anchor = self.messages[2].uid
+
+        response = self.get(self.alice, f"?before={anchor}&page_size=5")
+        self.assertEqual(self.contents(response), ["message 1", "message 0"])
+        self.assertIsNone(response.data["next"])
+
+        response = self.get(self.alice, f"?after={anchor}&page_size=1")
+        self.assertEqual(self.contents(response), ["message 3"])
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_around_a_message(self):
+        response = self.get(self.alice, f"?around={self.messages[2].uid}&page_size=3")
+
+        self.assertEqual(
+            self.contents(response), ["message 3", "message 2", "message 1"]
+        )
+        self.assertIsNotNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_bad_cursors_are_rejected(self):
+        anchor = self.messages[2].uid
+
+        self.assertEqual(self.get(self.alice, "?before=bad").status_code, 400)
+        self.assertEqual(self.get(self.alice, "?page_size=0").status_code, 400)
+        self.assertEqual(
+            self.get(self.alice, f"?before={anchor}&after={anchor}").status_code, 400
+        )
+        self.assertEqual(
+            self.get(self.alice, f"?before={self.alice.uid}").status_code, 404
+        )
+
+    def test_pages_are_cached_per_query(self):
+        self.assertEqual(self.get(self.alice)["X-Cache"], "MISS")
+        self.assertEqual(self.get(self.bob)["X-Cache"], "HIT")
+        self.assertEqual(self.get(self.bob, "?page_size=2")["X-Cache"], "MISS")
+
+        self.assertEqual(MessageList.get_cache_metrics(), {"hits": 1, "misses": 2})
+
+    def test_new_messages_invalidate_the_cached_pages(self):
+        self.get(self.alice)
+
+        Message.create_messages(
+            [Message(content="new", sender=self.bob, chat_room=self.chat_room)]
+        )
+
+        response = self.get(self.alice)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(self.contents(response)[0], "new")
+        self.assertEqual(self.get(self.alice)["X-Cache"], "HIT")
+
+    def test_cached_pages_show_the_current_readers(self):
+        self.get(self.alice)
+
+        ChatRoomMembership.mark_as_read(
+            self.bob.id, self.chat_room.id, self.messages[4].id
+        )
+
+        response = self.get(self.alice)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertCountEqual(
+            [user["username"] for user in response.data["results"][0]["read_by"]],
+            ["alice", "bob"],
+        )
+
+    def test_read_by_follows_messages_deleted_while_rendered(self):
+        ChatRoomMembership.mark_as_read(
+            self.bob.id, self.chat_room.id, self.messages[2].id
+        )
+        paginate_queryset = MessageCursorPagination.paginate_queryset
+        deleted = self.messages[3]
+
+        def paginate_then_delete(pagination, *args, **kwargs):
+            page = paginate_queryset(pagination, *args, **kwargs)
+            Message.objects.filter(id=deleted.id).delete()
+            return page
+
+        with mock.patch.object(
+            MessageCursorPagination, "paginate_queryset", paginate_then_delete
+        ):
+            response = self.get(self.alice)
+
+        self.assertEqual(
+            [
+                (message["content"], [user["username"] for user in message["read_by"]])
+                for message in response.data["results"]
+            ],
+            [
+                ("message 4", ["alice"]),
+                ("message 2", ["alice", "bob"]),
+                ("message 1", ["alice", "bob"]),
+                ("message 0", ["alice", "bob"]),
+            ],
+        )
+
+    def test_cached_pages_queue_the_read_receipt_without_querying_messages(self):
+        self.get(self.bob)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(self.bob)
+
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertFalse(
+            [query for query in queries if '"chat_message"' in query["sql"]]
+        )
+        self.assertEqual(
+            self.redis.zscore(
+                get_pending_read_receipts_cache_key(),
+                f"{self.bob.id}:{self.chat_room.id}",
+            ),
+            self.messages[4].id,
+        )
@@ -0,0 +1,223 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+import fakeredis
+
+from chat import metrics
+from chat.layers import HybridChannelLayer, ShardedRedisChannelLayer
+from chat.admission import HandshakeAdmission
+from chat.ephemeral import EphemeralCoalescer
+from chat.jwt_middleware import JWTAuthMiddleware
+
+
+@override_settings(WORKER_METRICS_INTERVAL=10)
+class WorkerMetricsTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "chat.metrics.get_redis_client", return_value=fakeredis.FakeRedis()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def publish(self, worker, local_deliveries, remote_deliveries):
+        deliveries = {
+            "local_deliveries": local_deliveries,
+            "remote_deliveries": remote_deliveries,
+        }
+        with mock.patch("chat.metrics.WORKER_ID", worker):
+            metrics.publish_metrics({"channel_layer": deliveries})
+
+    def test_every_worker_is_read_back(self):
+        self.publish("web-1:10", 30, 10)
+        self.publish("web-2:20", 0, 40)
+
+        workers = metrics.get_worker_metrics()
+
+        self.assertEqual(set(workers), {"web-1:10", "web-2:20"})
+        self.assertEqual(workers["web-1:10"]["channel_layer"]["local_deliveries"], 30)
+
+    def test_stopped_workers_are_dropped(self):
+        with mock.patch("time.time", return_value=time.time() - 31):
+            self.publish("web-1:10", 30, 10)
+        self.publish("web-2:20", 0, 40)
+
+        self.assertEqual(set(metrics.get_worker_metrics()), {"web-2:20"})
+
+    def test_command_shows_the_totals(self):
+        self.publish("web-1:10", 30, 10)
+        self.publish("web-2:20", 0, 40)
+
+        stdout = StringIO()
+        call_command("worker_metrics", stdout=stdout)
+
+        self.assertIn(
+            "total: 30 local deliveries, 50 through redis (37.5% local)",
+            stdout.getvalue(),
+        )
+
+    def test_command_shows_the_outbox_queues(self):
+        outbox = {
+            "connections": 10,
+            "queued_frames": 25,
+            "max_depth": 40,
+            "dropped_frames": 3,
+            "slow_disconnects": 1,
+        }
+        for worker in ("web-1:10", "web-2:20"):
+            with mock.patch("chat.metrics.WORKER_ID", worker):
+                metrics.publish_metrics({"outbox": outbox})
+
+        stdout = StringIO()
+        call_command("worker_metrics", stdout=stdout)
+
+        self.assertIn(
+            "total: 50 frames queued for 20 connections (deepest 40), "
+            "6 dropped frames, 2 slow disconnects",
+            stdout.getvalue(),
+        )
+
+    def test_channel_layer_deliveries_are_collected(self):
+        channel_layer = HybridChannelLayer(hosts=["redis://localhost:6379"])
+        channel_layer.delivery_metrics["local_deliveries"] = 3
+
+        with mock.patch("chat.metrics.get_channel_layer", return_value=channel_layer):
+            collected = metrics.collect_metrics()
+
+        self.assertEqual(collected["channel_layer"]["local_deliveries"], 3)
+        self.assertIn("dropped_frames", collected["outbox"])
+
+    def test_authentication_counters_are_collected(self):
+        counters = {
+            **JWTAuthMiddleware.metrics,
+            "token_cache_hits": 3,
+            "token_cache_misses": 1,
+            "handshakes": 4,
+            "handshake_seconds": 0.02,
+        }
+
+        with mock.patch.dict(JWTAuthMiddleware.metrics, counters):
+            collected = metrics.collect_metrics()
+
+        self.assertEqual(collected["authentication"]["token_cache_hits"], 3)
+        self.assertEqual(collected["authentication"]["token_cache_misses"], 1)
+        self.assertAlmostEqual(
+            collected["authentication"]["handshake_average_seconds"], 0.005
+        )
+
+    def test_command_shows_the_handshakes(self):
+        for worker, slowest in (("web-1:10", 0.03), ("web-2:20", 0.05)):
+            authentication = {
+                "token_cache_hits": 3,
+                "token_cache_misses": 1,
+                "handshakes": 4,
+                "handshake_seconds": 0.04,
+                "handshake_max_seconds": slowest,
+            }
+            with mock.patch("chat.metrics.WORKER_ID", worker):
+                metrics.publish_metrics({"authentication": authentication})
+
+        stdout = StringIO()
+        call_command("worker_metrics", stdout=stdout)
+
+        self.assertIn(
+            "total: 8 handshakes, 10.00ms average (slowest 50.00ms), "
+            "75.0% token cache hits",
+            stdout.getvalue(),
+        )
+
+    def test_rejected_handshakes_are_collected(self):
+        admission = HandshakeAdmission(rate=1, burst=1, max_concurrency=1)
+        admission.acquire()
+        admission.acquire()
+
+        with mock.patch("chat.metrics.get_handshake_admission", return_value=admission):
+            collected = metrics.collect_metrics()
+
+        self.assertEqual(collected["admission"], {"rejected": 1, "in_flight": 1})
+
+    def test_command_shows_the_rejected_handshakes(self):
+        for worker, rejected in (("web-1:10", 5), ("web-2:20", 7)):
+            with mock.patch("chat.metrics.WORKER_ID", worker):
+                metrics.publish_metrics(
+                    {"admission": {"rejected": rejected, "in_flight": 2}}
+                )
+
+        stdout = StringIO()
+        call_command("worker_metrics", stdout=stdout)
+
+        self.assertIn("total: 12 handshakes rejected, 4 in flight", stdout.getvalue())
+
+    def test_ephemeral_counters_are_collected(self):
+        counters = {"coalesced_events": 4, "rate_limited_events": 2}
+
+        with mock.patch.dict(EphemeralCoalescer.metrics, counters):
+            collected = metrics.collect_metrics()
+
+        self.assertEqual(collected["ephemeral"]["coalesced_events"], 4)
+        self.assertEqual(collected["ephemeral"]["rate_limited_events"], 2)
+
+    def test_command_shows_the_ephemeral_events(self):
+        ephemeral = {
+            "received_events": 10,
+            "rate_limited_events": 1,
+            "coalesced_events": 6,
+            "broadcasts": 3,
+        }
+        for worker in ("web-1:10", "web-2:20"):
+            with mock.patch("chat.metrics.WORKER_ID", worker):
+                metrics.publish_metrics({"ephemeral": ephemeral})
+
+        stdout = StringIO()
+        call_command("worker_metrics", stdout=stdout)
+
+        self.assertIn(
+            "total: 20 ephemeral events, 12 coalesced, 2 dropped by the rate limit, "
+            "6 broadcasts",
+            stdout.getvalue(),
+        )
+
+    def test_shard_counters_are_collected(self):
+        channel_layer = HybridChannelLayer(
+            hosts=["redis://shard0:6379", "redis://shard1:6379"]
+        )
+        channel_layer.shard_metrics[1]["operations"] = 7
+
+        with mock.patch("chat.metrics.get_channel_layer", return_value=channel_layer):
+            collected = metrics.collect_metrics()
+
+        self.assertEqual(
+            [shard["host"] for shard in collected["channel_layer_shards"]],
+            ["redis://shard0:6379", "redis://shard1:6379"],
+        )
+        self.assertEqual(collected["channel_layer_shards"][1]["operations"], 7)
+
+    def test_shards_command_sums_the_workers(self):
+        hosts = ["redis://shard0:6379", "redis://shard1:6379"]
+        for worker, operations in (("web-1:10", 30), ("web-2:20", 12)):
+            shards = [
+                {"host": host, "operations": operations, "errors": 1, "seconds": 0.21}
+                for host in hosts
+            ]
+            with mock.patch("chat.metrics.WORKER_ID", worker):
+                metrics.publish_metrics({"channel_layer_shards": shards})
+
+        channel_layer = ShardedRedisChannelLayer(hosts=hosts)
+        connections = [fakeredis.aioredis.FakeRedis() for _ in hosts]
+        channel_layer.connection = lambda index: connections[index]
+
+        stdout = StringIO()
+        with mock.patch(
+            "chat.management.commands.channel_layer_shards.get_channel_layer",
+            return_value=channel_layer,
+        ):
+            call_command("channel_layer_shards", stdout=stdout)
+
+        self.assertIn("redis://shard1:6379: healthy", stdout.getvalue())
+        self.assertIn(
+            "42 operations from 2 worker(s), 2 errors, 10.00ms average",
+            stdout.getvalue(),
+        )
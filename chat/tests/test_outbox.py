@@ -0,0 +1,104 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from chat.consumers.outbox import Outbox, COALESCE, DROP_OLDEST
+
+
+class ClientStub:
+    """Websocket that records the written frames and counts them like a consumer."""
+
+    def __init__(self):
+        self.frames = []
+        self.outbox = None
+        self.closed_with = None
+
+    async def write(self, frame):
+        self.outbox.sent_frames += 1
+        self.frames.append(frame)
+
+    async def close(self, code=None):
+        self.closed_with = code
+
+
+class OutboxWindowTests(SimpleTestCase):
+    def get_outbox(self, **kwargs):
+        client = ClientStub()
+        client.outbox = Outbox(client.write, client.close, **kwargs)
+        return client, client.outbox
+
+    async def drain(self):
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    async def push(self, outbox, frames):
+        # The writer gets to run between two frames, like between two events
+        for frame in frames:
+            outbox.push(frame)
+            await self.drain()
+
+    async def test_clients_that_never_acknowledge_are_held_then_closed(self):
+        client, outbox = self.get_outbox(
+            max_size=4, window=2, policy=DROP_OLDEST, ack_timeout=0.05
+        )
+
+        await self.push(outbox, range(20))
+
+        # Two frames on the wire and two queued, whatever was pushed
+        self.assertEqual(client.frames, [0, 1])
+        self.assertEqual([frame for _, frame in outbox.entries], [18, 19])
+
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(client.closed_with, 4008)
+        self.assertTrue(outbox.closed)
+        self.assertEqual(len(outbox), 0)
+        self.assertFalse(outbox.push(20))
+
+    async def test_writes_wait_for_the_acknowledgements(self):
+        client, outbox = self.get_outbox(max_size=10, window=2)
+
+        await self.push(outbox, range(5))
+
+        self.assertEqual(client.frames, [0, 1])
+        self.assertEqual(outbox.depth, 5)
+
+        outbox.acknowledge(1)
+        await self.drain()
+
+        self.assertEqual(client.frames, [0, 1, 2])
+        self.assertEqual(outbox.unacknowledged, 2)
+        outbox.shutdown()
+
+    async def test_unacknowledged_frames_fill_the_queue(self):
+        client, outbox = self.get_outbox(max_size=4, window=2, policy=DROP_OLDEST)
+
+        await self.push(outbox, range(6))
+
+        # Two frames are on the wire, so only two more are kept
+        self.assertEqual([frame for _, frame in outbox.entries], [4, 5])
+
+        outbox.acknowledge(2)
+        await self.drain()
+
+        self.assertEqual(client.frames, [0, 1, 4, 5])
+        outbox.shutdown()
+
+    async def test_a_slow_client_is_told_what_it_missed(self):
+        client, outbox = self.get_outbox(max_size=4, window=2, policy=COALESCE)
+
+        await self.push(outbox, range(6))
+        outbox.acknowledge(2)
+        await self.drain()
+
+        self.assertEqual(client.frames[2], {"type": "missed_messages", "count": 2})
+        self.assertGreaterEqual(Outbox.get_metrics()["dropped_frames"], 2)
+        outbox.shutdown()
+
+    async def test_acknowledging_unsent_frames_is_ignored(self):
+        _, outbox = self.get_outbox(window=2)
+
+        outbox.acknowledge(3)
+
+        self.assertEqual(outbox.received_frames, 0)
+        outbox.shutdown()
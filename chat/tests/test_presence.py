@@ -0,0 +1,179 @@
+import time
+import asyncio
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from channels.layers import get_channel_layer
+
+import fakeredis
+
+from chat.models import ChatRoom, ChatRoomInvitation
+from chat.choices import InvitationStatusChoices
+from chat.utils import get_user_group_name
+from chat.presence import (
+    PresenceFanout,
+    touch_connection,
+    remove_connection,
+    get_connection_count,
+    is_online,
+)
+from chat.rest.serializers.friends import FriendSerializer
+
+User = get_user_model()
+
+
+def create_user(username):
+    return User.objects.create_user(
+        email=f"{username}@example.com",
+        username=username,
+        first_name=username,
+        last_name=username,
+        password="password",
+    )
+
+
+class PresenceTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch("chat.presence.get_redis_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_friends(self, sender, receiver):
+        chat_room = ChatRoom.objects.create(
+            name=f"private_room_{sender.id}_{receiver.id}"
+        )
+        ChatRoomInvitation.objects.create(
+            chat_room=chat_room,
+            sender=sender,
+            receiver=receiver,
+            invitation_status=InvitationStatusChoices.ACCEPTED,
+        )
+
+
+@override_settings(PRESENCE_TTL=90)
+class ConnectionTests(PresenceTestMixin, TestCase):
+    def test_user_stays_online_until_the_last_tab_disconnects(self):
+        self.assertTrue(touch_connection(1, "tab-1"))
+        self.assertFalse(touch_connection(1, "tab-2"))
+        self.assertEqual(get_connection_count(1), 2)
+
+        self.assertFalse(remove_connection(1, "tab-1"))
+        self.assertEqual(is_online([1]), {1: True})
+
+        self.assertTrue(remove_connection(1, "tab-2"))
+        self.assertEqual(is_online([1]), {1: False})
+
+    def test_heartbeat_keeps_the_connection_alive(self):
+        now = time.time()
+        touch_connection(1, "tab-1")
+
+        with mock.patch("time.time", return_value=now + 60):
+            self.assertFalse(touch_connection(1, "tab-1"))
+
+        with mock.patch("time.time", return_value=now + 120):
+            self.assertEqual(is_online([1]), {1: True})
+            self.assertEqual(get_connection_count(1), 1)
+
+    def test_connection_expires_without_heartbeat(self):
+        now = time.time()
+        touch_connection(1, "crashed-worker")
+
+        with mock.patch("time.time", return_value=now + 91):
+            self.assertEqual(is_online([1]), {1: False})
+            self.assertEqual(get_connection_count(1), 0)
+            # The next connection brings the user online again
+            self.assertTrue(touch_connection(1, "tab-1"))
+
+    def test_expired_tab_does_not_keep_the_user_online(self):
+        now = time.time()
+        touch_connection(1, "crashed-worker")
+
+        with mock.patch("time.time", return_value=now + 60):
+            touch_connection(1, "tab-1")
+
+        with mock.patch("time.time", return_value=now + 100):
+            self.assertTrue(remove_connection(1, "tab-1"))
+            self.assertEqual(is_online([1]), {1: False})
+
+
+class IsOnlineTests(PresenceTestMixin, TestCase):
+    def test_bulk_lookup_in_one_round_trip(self):
+        touch_connection(1, "tab-1")
+        touch_connection(3, "tab-1")
+
+        with mock.patch.object(self.redis, "mget", wraps=self.redis.mget) as mget:
+            online = is_online([1, 2, 3, 4])
+
+        self.assertEqual(online, {1: True, 2: False, 3: True, 4: False})
+        self.assertEqual(mget.call_count, 1)
+
+    def test_empty_lookup_skips_redis(self):
+        with mock.patch.object(self.redis, "mget") as mget:
+            self.assertEqual(is_online([]), {})
+        mget.assert_not_called()
+
+    def test_friend_list_presence_is_looked_up_for_every_friend(self):
+        users = [create_user(f"user{index}") for index in range(3)]
+        touch_connection(users[1].id, "tab-1")
+        touch_connection(users[2].id, "tab-1")
+
+        data = FriendSerializer(users, many=True).data
+
+        self.assertEqual([user["is_online"] for user in data], [False, True, True])
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    PRESENCE_FANOUT_DELAY=0.05,
+)
+class PresenceFanoutTests(PresenceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = create_user("alice")
+        self.bob = create_user("bob")
+        self.carol = create_user("carol")
+        self.make_friends(self.alice, self.carol)
+        self.make_friends(self.carol, self.bob)
+        touch_connection(self.carol.id, "tab-1")
+
+    async def receive_all(self, channel_layer, channel_name):
+        events = []
+        while True:
+            try:
+                events.append(
+                    await asyncio.wait_for(channel_layer.receive(channel_name), 0.2)
+                )
+            except asyncio.TimeoutError:
+                return events
+
+    async def test_changes_within_the_delay_are_sent_once(self):
+        channel_layer = get_channel_layer()
+        channel_name = await channel_layer.new_channel()
+        await channel_layer.group_add(get_user_group_name(self.carol.id), channel_name)
+
+        await asyncio.to_thread(touch_connection, self.alice.id, "tab-1")
+        fanout = PresenceFanout()
+        fanout.add(self.alice.id, "alice")
+        fanout.add(self.bob.id, "bob")
+        fanout.add(self.alice.id, "alice")
+
+        events = await self.receive_all(channel_layer, channel_name)
+
+        self.assertEqual(
+            events,
+            [{"type": "presence_update", "users": {"alice": True, "bob": False}}],
+        )
+
+    async def test_offline_friends_receive_nothing(self):
+        channel_layer = get_channel_layer()
+        channel_name = await channel_layer.new_channel()
+        await channel_layer.group_add(get_user_group_name(self.bob.id), channel_name)
+
+        fanout = PresenceFanout()
+        fanout.add(self.carol.id, "carol")
+
+        self.assertEqual(await self.receive_all(channel_layer, channel_name), [])
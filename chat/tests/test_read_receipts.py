@@ -0,0 +1,156 @@
+from unittest import mock
+
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+
+import fakeredis
+
+from chat import read_receipts
+from chat.models import ChatRoom, ChatRoomMembership, Message
+
+
+User = get_user_model()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ReadReceiptTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        for target in (
+            "chat.inbox.get_redis_client",
+            "chat.read_receipts.get_redis_client",
+        ):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch("chat.tasks.flush_read_receipts.apply_async")
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+        self.alice, self.bob, self.carol = [
+            User.objects.create_user(
+                email=f"{name}@example.com",
+                username=name,
+                first_name=name,
+                last_name=name,
+                password="password",
+            )
+            for name in ("alice", "bob", "carol")
+        ]
+        self.chat_room = ChatRoom.objects.create(name="room", is_group_chat=True)
+        for user in (self.alice, self.bob, self.carol):
+            ChatRoomMembership.objects.create(user=user, chat_room=self.chat_room)
+        self.messages = Message.create_messages(
+            [
+                Message(
+                    content=f"message {index}",
+                    sender=self.alice,
+                    chat_room=self.chat_room,
+                )
+                for index in range(5)
+            ]
+        )
+
+    def get_membership(self, user):
+        return ChatRoomMembership.objects.get(user=user, chat_room=self.chat_room)
+
+    def queue(self, user, message):
+        read_receipts.queue_read_receipt(user.id, self.chat_room.id, message.id)
+
+    def test_receipts_are_merged_until_the_flush(self):
+        self.queue(self.bob, self.messages[3])
+        self.queue(self.bob, self.messages[1])
+        self.queue(self.carol, self.messages[2])
+
+        # One flush is scheduled for every receipt queued within the delay
+        self.apply_async.assert_called_once()
+        self.assertEqual(
+            sorted(read_receipts.pop_pending_read_receipts()),
+            [
+                (self.bob.id, self.chat_room.id, self.messages[3].id),
+                (self.carol.id, self.chat_room.id, self.messages[2].id),
+            ],
+        )
+        self.assertEqual(read_receipts.pop_pending_read_receipts(), [])
+
+    def test_flush_moves_every_watermark_with_one_update(self):
+        self.queue(self.bob, self.messages[3])
+        self.queue(self.carol, self.messages[2])
+
+        # Without the inbox refresh, which reads the updated members
+        with mock.patch("chat.models.refresh_inboxes"):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(read_receipts.flush_pending_read_receipts(), 2)
+
+        # Plans explained by django-silk for a previous request are left out
+        self.assertEqual(
+            [
+                query["sql"].split()[0]
+                for query in queries
+                if not query["sql"].startswith("EXPLAIN")
+            ],
+            ["UPDATE"],
+        )
+        self.assertEqual(
+            self.get_membership(self.bob).last_read_message_id, self.messages[3].id
+        )
+        self.assertEqual(
+            self.get_membership(self.carol).last_read_message_id, self.messages[2].id
+        )
+
+    def test_flush_releases_the_schedule_lock(self):
+        self.queue(self.bob, self.messages[3])
+        read_receipts.flush_pending_read_receipts()
+        self.queue(self.bob, self.messages[4])
+
+        self.assertEqual(self.apply_async.call_count, 2)
+
+    def test_watermarks_only_move_forward(self):
+        ChatRoomMembership.mark_as_read(
+            self.bob.id, self.chat_room.id, self.messages[3].id
+        )
+
+        self.assertEqual(
+            ChatRoomMembership.mark_as_read(
+                self.bob.id, self.chat_room.id, self.messages[1].id
+            ),
+            0,
+        )
+        membership = self.get_membership(self.bob)
+        self.assertEqual(membership.last_read_message_id, self.messages[3].id)
+        self.assertTrue(membership.has_read(self.messages[1]))
+        self.assertFalse(membership.has_read(self.messages[4]))
+
+    def test_watermarks_count_the_unread_messages(self):
+        self.assertEqual(self.get_membership(self.bob).unread_count, 5)
+
+        ChatRoomMembership.mark_as_read(
+            self.bob.id, self.chat_room.id, self.messages[2].id
+        )
+
+        membership = self.get_membership(self.bob)
+        self.assertEqual(membership.unread_count, 2)
+        self.assertTrue(membership.has_unread_messages())
+        # Senders have read up to their own messages
+        self.assertEqual(self.get_membership(self.alice).unread_count, 0)
+
+    def test_only_members_with_a_watermark_have_read_messages(self):
+        ChatRoomMembership.mark_as_read(
+            self.bob.id, self.chat_room.id, self.messages[0].id
+        )
+
+        self.assertEqual(
+            {
+                membership.user.username
+                for membership in ChatRoomMembership.get_read_watermarks(
+                    self.chat_room.id
+                )
+            },
+            {"alice", "bob"},
+        )
@@ -30,10 +30,16 @@ def generate_private_room_name(sender, receiver):
 
 def validate_token(token):
     """Validate the token and return the user_id"""
+    claims = get_token_claims(token)
+    if claims is None:
+        return None
+    return claims.get("user_id")
+
+
+def get_token_claims(token):
+    """Verify the token signature and expiry and return its claims."""
     try:
-        access_token = AccessToken(token)
-        user_id = access_token.payload["user_id"]
-        return user_id
+        return AccessToken(token).payload
     except Exception as e:
         return None
 
@@ -55,3 +61,8 @@ def get_token_from_scope(scope):
             return parts[1]
     else:
         return None
+
+
+def get_user_group_name(user_id):
+    """Channel layer group that reaches every connection of a user."""
+    return f"user_{user_id}"
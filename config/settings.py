@@ -145,15 +145,26 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# The tests upload their files to a temporary media root
+TEST_RUNNER = "shared.test_runner.TestRunner"
+
 
 APPEND_SLASH = False
 
 # Setups for Django Channels layers
+# Redis nodes of the channel layer, comma separated, groups are spread over
+# them by consistent hashing. Run `channel_layer_shards --rebalance` after
+# adding or removing a node.
+CHANNEL_LAYER_HOSTS = os.environ.get(
+    "CHANNEL_LAYER_HOSTS", "redis://127.0.0.1:6379"
+).split(",")
+
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        # Members attached to the same process are reached without Redis
+        "BACKEND": "chat.layers.HybridChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": CHANNEL_LAYER_HOSTS,
         },
     },
 }
@@ -186,6 +197,83 @@ CELERY_TIMEZONE = 'Asia/Dhaka'
 
 CACHE_TTL = 60 * 15  # 15 minutes
 
+# Delay in seconds used to batch read receipts before they are written
+READ_RECEIPTS_FLUSH_DELAY = 2
+
+# Websocket messages are saved in batches every few milliseconds or N messages
+MESSAGE_BUFFER_FLUSH_INTERVAL = 0.005
+MESSAGE_BUFFER_MAX_SIZE = 100
+
+# Websocket connections refresh the presence of their user every interval,
+# users whose connections all missed their heartbeats for the TTL are offline
+PRESENCE_HEARTBEAT_INTERVAL = 30
+PRESENCE_TTL = 90
+# Delay in seconds used to batch presence changes sent to friends
+PRESENCE_FANOUT_DELAY = 0.5
+
+# Verified websocket tokens are kept per worker until they expire or the TTL
+JWT_TOKEN_CACHE_SIZE = 10000
+JWT_TOKEN_CACHE_TTL = 60 * 5
+
+# Websocket handshakes admitted per second and per worker, with the burst
+# allowed above the rate and the number resolving their chat room at once
+HANDSHAKE_RATE = 200
+HANDSHAKE_BURST = 400
+HANDSHAKE_MAX_CONCURRENCY = 50
+# Receiver and room of the private chats opened on each worker
+PRIVATE_CHAT_CACHE_SIZE = 10000
+PRIVATE_CHAT_CACHE_TTL = 60 * 5
+# Seconds between two checks of the room access of a group chat connection
+ROOM_ACCESS_RECHECK_INTERVAL = 5
+
+# Group events whose JSON is at least this many bytes go compressed through
+# the channel layer, 0 disables the compression
+BROADCAST_COMPRESSION_THRESHOLD = 4096
+
+# Frames queued for each websocket, and what happens to a slow client
+# once they are exceeded: coalesce, drop_oldest or disconnect
+OUTBOX_MAX_SIZE = 100
+OUTBOX_POLICY = "coalesce"
+# Frames sent ahead of the acknowledgements of the frames received by each
+# client, which count in the queue above, and the seconds a client with a
+# full window has to acknowledge before it is disconnected
+OUTBOX_ACK_WINDOW = 50
+OUTBOX_ACK_TIMEOUT = 30
+
+# Typing and read cursor events each connection may send per second, and
+# the seconds during which they are merged into one broadcast per room
+EPHEMERAL_RATE = 5
+EPHEMERAL_BURST = 10
+EPHEMERAL_INTERVAL = 0.3
+
+# Missed messages sent per frame to a reconnecting client, and the most it
+# is sent before being told to reload the history
+RESUME_BATCH_SIZE = 200
+RESUME_MAX_MESSAGES = 1000
+# Seconds after a resume during which the messages broadcast before the
+# connection joined its room may still be saved, and sent once they are
+RESUME_CATCH_UP_DELAY = 1
+
+# Messages read per query by the chat room history export
+EXPORT_CHUNK_SIZE = 2000
+
+# Blocked and blocked by sets of the users are kept in redis for the TTL and
+# in every worker, which picks up the changes of other workers after its TTL
+BLOCK_CACHE_TTL = 60 * 60 * 24
+BLOCK_LOCAL_CACHE_SIZE = 10000
+BLOCK_LOCAL_CACHE_TTL = 30
+
+# Group chat invitations inserted per query, and the number of users above
+# which they are sent by a celery worker instead of the request
+INVITATION_BATCH_SIZE = 500
+INVITATION_ASYNC_THRESHOLD = 100
+# Seconds during which the sender can follow the progress of such a task
+INVITATION_TASK_TTL = 60 * 60 * 24
+
+# Seconds between two writes of the counters of each websocket worker to
+# redis, where the worker_metrics command reads them
+WORKER_METRICS_INTERVAL = 10
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
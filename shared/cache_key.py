@@ -2,5 +2,69 @@ def get_user_chat_room_cache_key(user_id):
     return f"user_chat_rooms_{user_id}"
 
 
+def get_user_chat_room_summaries_cache_key(user_id):
+    return f"user_chat_room_summaries_{user_id}"
+
+
+def get_user_chat_room_built_cache_key(user_id):
+    return f"user_chat_rooms_built_{user_id}"
+
+
 def get_chat_room_messages_cache_key(chat_room_uid):
     return f"chat_room_messages_{chat_room_uid}"
+
+
+def get_message_payload_cache_key(message_uid, version):
+    return f"message_payload_{message_uid}_v{version}"
+
+
+def get_pending_read_receipts_cache_key():
+    return "pending_read_receipts"
+
+
+def get_read_receipts_flush_lock_cache_key():
+    return "read_receipts_flush_scheduled"
+
+
+def get_cache_version_cache_key(scope):
+    return f"cache_version_{scope}"
+
+
+def get_cache_metric_cache_key(name, metric):
+    return f"cache_metrics_{name}_{metric}"
+
+
+def get_user_presence_cache_key(user_id):
+    return f"presence_online_{user_id}"
+
+
+def get_user_presence_connections_cache_key(user_id):
+    return f"presence_connections_{user_id}"
+
+
+def get_chat_room_access_cache_key(chat_room_name, user_id):
+    return f"chat_room_access_{chat_room_name}_{user_id}"
+
+
+def get_chat_room_member_cache_key(chat_room_uid, user_id):
+    return f"chat_room_member_{chat_room_uid}_{user_id}"
+
+
+def get_user_blocks_cache_key(user_id):
+    return f"user_blocks_{user_id}"
+
+
+def get_user_blocked_by_cache_key(user_id):
+    return f"user_blocked_by_{user_id}"
+
+
+def get_worker_metrics_cache_key():
+    return "worker_metrics"
+
+
+def get_user_blocks_generation_cache_key(user_id):
+    return f"user_blocks_generation_{user_id}"
+
+
+def get_invitation_task_cache_key(task_id):
+    return f"invitation_task_{task_id}"
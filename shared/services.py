@@ -1,21 +1,54 @@
+import json
+import time
+import hashlib
+
+from collections import OrderedDict
+
+from urllib.parse import urlencode
+
 from django.core.cache import cache
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import never_cache
 from django.conf import settings
 
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from shared.cache_key import get_cache_version_cache_key, get_cache_metric_cache_key
+
 
 class CachedQuerysetMixin:
     """
-    Mixin that provides caching for querysets in Django views.
+    Mixin that caches the serialized list responses of Django views.
+
+    Every page is cached on its own, keyed by the view, a cache scope, the
+    pagination query params and the page size, and holds the JSON of the
+    response rather than ORM objects. Entries are invalidated by bumping the
+    version counter of the scope, which orphans every cached page at once.
     """
 
     cache_timeout = 600
 
+    def get_cache_scope(self):
+        """
+        Return the scope the cached pages belong to.
+        Pages of the same scope are invalidated together.
+        """
+        return self.__class__.__name__
+
     def get_cache_key(self):
         """
-        Generate a unique cache key
+        Generate a unique cache key for the requested page
         """
-        return f"{self.__class__.__name__}_queryset"
+        scope = self.get_cache_scope()
+        version = get_cache_version(scope)
+        page_size = (
+            self.paginator.get_page_size(self.request) if self.paginator else None
+        )
+        query_params = urlencode(sorted(self.request.query_params.lists()), doseq=True)
+        query_hash = hashlib.md5(query_params.encode()).hexdigest()
+
+        return f"{self.__class__.__name__}_{scope}_v{version}_{page_size}_{query_hash}"
 
     def get_cache_timeout(self):
         """
@@ -25,19 +58,7 @@ class CachedQuerysetMixin:
         return getattr(settings, "DEFAULT_CACHE_TIMEOUT", self.cache_timeout)
 
     def get_queryset(self):
-        """
-        Retrieve the queryset from the cache or fetch from the database if not cached.
-        """
-        cache_key = self.get_cache_key()
-        cached_queryset = cache.get(cache_key)
-
-        if cached_queryset is None:
-            # Fetch the queryset from the database and cache it
-            queryset = self.fetch_queryset()
-            cache.set(cache_key, queryset, timeout=self.get_cache_timeout())
-            return queryset
-
-        return cached_queryset
+        return self.fetch_queryset()
 
     def fetch_queryset(self):
         """
@@ -46,6 +67,54 @@ class CachedQuerysetMixin:
         """
         raise NotImplementedError("You must implement the `fetch_queryset` method.")
 
+    def list(self, request, *args, **kwargs):
+        """
+        Return the cached page or render and cache it on a miss.
+        """
+        cache_key = self.get_cache_key()
+        cached_data = cache.get(cache_key)
+
+        if cached_data is None:
+            record_cache_metric(self.__class__.__name__, "misses")
+            response = super().list(request, *args, **kwargs)
+            data = self.get_cacheable_data(response.data)
+            cache.set(
+                cache_key,
+                json.dumps(data, cls=JSONEncoder),
+                timeout=self.get_cache_timeout(),
+            )
+            response["X-Cache"] = "MISS"
+        else:
+            record_cache_metric(self.__class__.__name__, "hits")
+            data = json.loads(cached_data)
+            response = Response()
+            response["X-Cache"] = "HIT"
+
+        response.data = self.finalize_list(data)
+        self.after_list(response.data)
+        return response
+
+    def get_cacheable_data(self, data):
+        """
+        Override this method to leave out of the cached page the parts that
+        change too often to be cached, they are put back by `finalize_list`.
+        """
+        return data
+
+    def finalize_list(self, data):
+        """
+        Override this method to fill in the parts of the page that are not
+        cached, on every list request.
+        """
+        return data
+
+    def after_list(self, data):
+        """
+        Override this method for side effects that must run on every list
+        request, whether the page came from the cache or not.
+        """
+        pass
+
     def perform_create(self, serializer):
         """
         Override this method to handle cache invalidation when a new instance is created.
@@ -53,18 +122,113 @@ class CachedQuerysetMixin:
         # Save the new instance
         instance = serializer.save()
 
-        # Invalidate the cache after creating the new instance
-        cache_key = self.get_cache_key()
-        cache.delete(cache_key)
+        # Invalidate the cached pages after creating the new instance
+        bump_cache_version(self.get_cache_scope())
 
         return instance
 
+    @classmethod
+    def get_cache_metrics(cls):
+        """Return the cache hits and misses recorded for the view."""
+        return get_cache_metrics(cls.__name__)
+
     @method_decorator(never_cache)
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
 
 
+def get_cache_version(scope):
+    """Return the current cache version of a scope."""
+    cache_key = get_cache_version_cache_key(scope)
+    version = cache.get(cache_key)
+    if version is None:
+        # Start from the current time so a lost counter never reuses old keys
+        cache.add(cache_key, time.time_ns(), timeout=None)
+        version = cache.get(cache_key)
+    return version
+
+
+def bump_cache_version(scope):
+    """Invalidate every cached entry of a scope."""
+    cache_key = get_cache_version_cache_key(scope)
+    try:
+        return cache.incr(cache_key)
+    except ValueError:
+        cache.add(cache_key, time.time_ns(), timeout=None)
+
+
+def record_cache_metric(name, metric):
+    cache_key = get_cache_metric_cache_key(name, metric)
+    try:
+        cache.incr(cache_key)
+    except ValueError:
+        cache.add(cache_key, 1, timeout=None)
+
+
+def get_cache_metrics(name):
+    hits_key = get_cache_metric_cache_key(name, "hits")
+    misses_key = get_cache_metric_cache_key(name, "misses")
+    metrics = cache.get_many([hits_key, misses_key])
+    return {
+        "hits": metrics.get(hits_key, 0),
+        "misses": metrics.get(misses_key, 0),
+    }
+
+
+class ExpiringLRUCache:
+    """
+    In-process LRU cache whose entries also expire after a TTL.
+
+    Used for small per-worker caches on hot paths where a network round
+    trip to the shared cache would cost as much as the lookup it saves.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self.entries[key]
+            return default
+
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, expires_at=None):
+        """Store a value until the TTL, or the given expiry if it is sooner."""
+        ttl_expires_at = time.time() + self.ttl
+        if expires_at is None or expires_at > ttl_expires_at:
+            expires_at = ttl_expires_at
+
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
 
 class CacheMethod:
     def clear_cache(self, cache_key):
-        cache.delete(cache_key)
\ No newline at end of file
+        cache.delete(cache_key)
+
+
+def get_redis_client(alias="default"):
+    """Return the raw redis client behind the given django-redis cache alias."""
+    from django_redis import get_redis_connection
+
+    return get_redis_connection(alias)